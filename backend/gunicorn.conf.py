@@ -0,0 +1,36 @@
+"""
+gunicorn settings for production (read from the working directory).
+
+    DJANGO_SETTINGS_MODULE=invoice_backend.settings_production gunicorn invoice_backend.wsgi
+
+The app is loaded and warmed once in the master (``preload_app`` with
+``INVOICE_PRELOAD``, see invoices/warmup.py), so forking a worker costs
+no imports; each worker then opens its database connection before it
+accepts requests. For the Server-Sent Events feed, serve
+``invoice_backend.asgi`` with ``GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker``.
+"""
+import multiprocessing
+import os
+
+from decouple import config
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_backend.settings_production')
+
+bind = config('GUNICORN_BIND', default='0.0.0.0:' + config('PORT', default='8000'))
+workers = config('WEB_CONCURRENCY', default=multiprocessing.cpu_count() * 2 + 1, cast=int)
+worker_class = config('GUNICORN_WORKER_CLASS', default='sync')
+timeout = config('GUNICORN_TIMEOUT', default=30, cast=int)
+# Recycle workers now and then, staggered so they don't all restart at once
+max_requests = config('GUNICORN_MAX_REQUESTS', default=5000, cast=int)
+max_requests_jitter = max_requests // 10
+preload_app = True
+
+
+def post_worker_init(worker):
+    if worker_class != 'sync':
+        # Other worker classes serve requests on other threads, whose
+        # connections this one wouldn't warm (see warm_connections)
+        return
+    from invoices.warmup import warm_connections
+
+    warm_connections()
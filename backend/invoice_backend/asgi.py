@@ -2,6 +2,8 @@
 ASGI config for invoice_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+With ``INVOICE_PRELOAD`` on (invoice_backend.settings_production), the app
+is also warmed here, before gunicorn forks its workers (gunicorn.conf.py).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -9,8 +11,14 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_backend.settings')
 
 application = get_asgi_application()
+
+if settings.INVOICE_PRELOAD:
+    from invoices.warmup import preload
+
+    preload()
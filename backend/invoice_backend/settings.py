@@ -47,11 +47,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'invoices.middleware.RequestSummaryMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'invoices.middleware.TenantMiddleware',
+    'invoices.middleware.AdmissionControlMiddleware',
+    'invoices.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -136,14 +140,170 @@ CORS_ALLOWED_ORIGINS = [
 
 # REST Framework settings
 REST_FRAMEWORK = {
+    # Members act for their own companies, staff for any; see invoices/permissions.py
+    # for requests no membership applies to
     'DEFAULT_PERMISSION_CLASSES': [
-        'rest_framework.permissions.AllowAny',
+        'invoices.permissions.TenantMember',
     ],
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
 }
 
+# Typeahead endpoints (/api/clients/suggest/, /api/companies/suggest/):
+# default and maximum matches returned, and seconds responses are cached
+INVOICE_SUGGEST_LIMIT = config('INVOICE_SUGGEST_LIMIT', default=10, cast=int)
+INVOICE_SUGGEST_MAX_LIMIT = 50
+INVOICE_SUGGEST_CACHE_TTL = config('INVOICE_SUGGEST_CACHE_TTL', default=30, cast=int)
+
+# Currencies (see invoices/currency.py): stats and reports are converted
+# to the base currency, which new invoices also default to. Each worker
+# keeps exchange rates in memory and rereads them after this many seconds,
+# or as soon as load_exchange_rates changes them.
+INVOICE_BASE_CURRENCY = config('INVOICE_BASE_CURRENCY', default='USD').upper()
+INVOICE_RATE_CACHE_TTL = config('INVOICE_RATE_CACHE_TTL', default=3600, cast=int)
+
+# Invoice table partitioning (see invoices/partitioning.py)
+INVOICE_PARTITION_INTERVAL = config('INVOICE_PARTITION_INTERVAL', default='month')
+INVOICE_PARTITIONS_AHEAD = config('INVOICE_PARTITIONS_AHEAD', default=3, cast=int)
+INVOICE_ARCHIVE_AFTER_MONTHS = config('INVOICE_ARCHIVE_AFTER_MONTHS', default=24, cast=int)
+INVOICE_ARCHIVE_DIR = config('INVOICE_ARCHIVE_DIR', default=str(BASE_DIR / 'archive'))
+
+# Purging soft-deleted invoices (see invoices/deletion.py): age before an
+# invoice is purged, invoices per transaction, pause between transactions,
+# and the local time window purge_invoices works in ('' for any time)
+INVOICE_PURGE_AFTER_DAYS = config('INVOICE_PURGE_AFTER_DAYS', default=30, cast=int)
+INVOICE_PURGE_BATCH_SIZE = config('INVOICE_PURGE_BATCH_SIZE', default=500, cast=int)
+INVOICE_PURGE_PAUSE = config('INVOICE_PURGE_PAUSE', default=0.5, cast=float)
+INVOICE_PURGE_WINDOW = config('INVOICE_PURGE_WINDOW', default='01:00-05:00')
+
+# Maximum ids + invoice numbers accepted by /api/invoices/batch-get/
+INVOICE_BATCH_GET_MAX = config('INVOICE_BATCH_GET_MAX', default=500, cast=int)
+
+# Maximum payloads accepted by /api/invoices/validate-batch/
+INVOICE_VALIDATE_BATCH_MAX = config('INVOICE_VALIDATE_BATCH_MAX', default=10000, cast=int)
+
+# Server-side invoice numbering (see invoices/numbering.py)
+INVOICE_NUMBER_FORMAT = config('INVOICE_NUMBER_FORMAT', default='INV-{YYYY}-{seq:05d}')
+
+# Background job queue (see invoices/jobs.py)
+JOB_WORKERS = config('JOB_WORKERS', default=2, cast=int)
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=1.0, cast=float)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=5, cast=int)
+JOB_RETRY_BACKOFF = config('JOB_RETRY_BACKOFF', default=10, cast=int)
+JOB_RETRY_MAX_DELAY = config('JOB_RETRY_MAX_DELAY', default=3600, cast=int)
+JOB_LEASE_TIMEOUT = config('JOB_LEASE_TIMEOUT', default=900, cast=int)
+# Workers renew a running job's lease this often; keep it well below JOB_LEASE_TIMEOUT
+JOB_HEARTBEAT_INTERVAL = config('JOB_HEARTBEAT_INTERVAL', default=60, cast=int)
+
+# Outbound email (point EMAIL_PORT at a local debugging SMTP server in development)
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=25, cast=int)
+EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
+EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=False, cast=bool)
+EMAIL_TIMEOUT = config('EMAIL_TIMEOUT', default=30, cast=int)
+DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='invoices@localhost')
+INVOICE_EMAIL_BATCH_SIZE = config('INVOICE_EMAIL_BATCH_SIZE', default=100, cast=int)
+INVOICE_EMAIL_CONCURRENCY = config('INVOICE_EMAIL_CONCURRENCY', default=4, cast=int)
+
+# Webhook delivery (see invoices/webhooks.py)
+WEBHOOK_BATCH_SIZE = config('WEBHOOK_BATCH_SIZE', default=100, cast=int)
+WEBHOOK_TIMEOUT = config('WEBHOOK_TIMEOUT', default=10, cast=int)
+WEBHOOK_MAX_ATTEMPTS = config('WEBHOOK_MAX_ATTEMPTS', default=8, cast=int)
+WEBHOOK_RETRY_BACKOFF = config('WEBHOOK_RETRY_BACKOFF', default=30, cast=int)
+WEBHOOK_RETRY_MAX_DELAY = config('WEBHOOK_RETRY_MAX_DELAY', default=6 * 3600, cast=int)
+WEBHOOK_POLL_INTERVAL = config('WEBHOOK_POLL_INTERVAL', default=2.0, cast=float)
+# Endpoints may not resolve to private, loopback or link-local addresses;
+# allow them for local receivers such as webhook_receiver
+WEBHOOK_ALLOW_PRIVATE_URLS = config('WEBHOOK_ALLOW_PRIVATE_URLS', default=False, cast=bool)
+
+# Server-Sent Events change feed (see invoices/events.py)
+EVENT_STREAM_KEEPALIVE = config('EVENT_STREAM_KEEPALIVE', default=15, cast=int)
+EVENT_STREAM_QUEUE_SIZE = config('EVENT_STREAM_QUEUE_SIZE', default=1000, cast=int)
+EVENT_STREAM_REPLAY_LIMIT = config('EVENT_STREAM_REPLAY_LIMIT', default=1000, cast=int)
+EVENT_STREAM_RETRY_MS = config('EVENT_STREAM_RETRY_MS', default=3000, cast=int)
+
+# Store the rendered PDF with each issued invoice's snapshot (see invoices/snapshots.py)
+INVOICE_SNAPSHOT_PDF = config('INVOICE_SNAPSHOT_PDF', default=True, cast=bool)
+
+# PDF ZIP downloads (see invoices/pdf_archive.py): render processes per web
+# worker (0 renders in the request thread) and invoices per archive
+INVOICE_PDF_WORKERS = config('INVOICE_PDF_WORKERS', default=2, cast=int)
+INVOICE_PDF_ARCHIVE_MAX = config('INVOICE_PDF_ARCHIVE_MAX', default=5000, cast=int)
+
+# Primary keys for Company, Client, Invoice and InvoiceItem: 7 for
+# time-ordered uuid7 (see invoices/ids.py), 4 for random uuid4
+INVOICE_ID_VERSION = config('INVOICE_ID_VERSION', default=7, cast=int)
+
+# Structured logging for the invoices app (see invoices/logs.py)
+INVOICE_LOG_LEVEL = config('INVOICE_LOG_LEVEL', default='INFO')
+# One summary record per request under this path prefix
+INVOICE_LOG_SUMMARY = config('INVOICE_LOG_SUMMARY', default=True, cast=bool)
+INVOICE_LOG_SUMMARY_PATH = '/api/'
+# Fraction of records written per event name; unlisted events are always written.
+# Warnings and errors in request summaries are never sampled out.
+INVOICE_LOG_SAMPLING = {
+    'request.summary': config('INVOICE_LOG_SUMMARY_SAMPLE_RATE', default=1.0, cast=float),
+    'invoice.form_received': config('INVOICE_LOG_FORM_SAMPLE_RATE', default=0.1, cast=float),
+}
+
+# Opt-in request profiling for staff (see invoices/profiling.py); keep off in production
+INVOICE_PROFILING_ENABLED = config('INVOICE_PROFILING_ENABLED', default=False, cast=bool)
+INVOICE_PROFILING_HEADER = 'X-Profile'
+INVOICE_PROFILING_DIR = config('INVOICE_PROFILING_DIR', default=str(BASE_DIR / 'profiles'))
+
+# Tenant scoping by company (see invoices/tenancy.py and invoices/permissions.py)
+INVOICE_TENANT_HEADER = 'X-Company-Id'
+INVOICE_TENANT_PATH = '/api/'
+# Members are always scoped. Off, requests no membership applies to are
+# unscoped (single company); on, they are refused and staff name a tenant too
+INVOICE_TENANT_REQUIRED = config('INVOICE_TENANT_REQUIRED', default=False, cast=bool)
+INVOICE_STATS_CACHE_TTL = config('INVOICE_STATS_CACHE_TTL', default=60, cast=int)
+# /api/reports/ responses, also dropped on the tenant's next invoice change
+INVOICE_REPORT_CACHE_TTL = config('INVOICE_REPORT_CACHE_TTL', default=300, cast=int)
+
+# Point CACHE_BACKEND at a shared cache (e.g. django.core.cache.backends.redis.RedisCache)
+# so invalidations reach every worker; the default cache is per process
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='invoices'),
+    }
+}
+
+# Admission control for write requests (see invoices/admission.py)
+INVOICE_ADMISSION_PATH = '/api/'
+# Token bucket per API client: sustained requests per second and burst size
+INVOICE_RATE_LIMIT_ENABLED = config('INVOICE_RATE_LIMIT_ENABLED', default=True, cast=bool)
+INVOICE_RATE_LIMIT_RATE = config('INVOICE_RATE_LIMIT_RATE', default=2.0, cast=float)
+INVOICE_RATE_LIMIT_BURST = config('INVOICE_RATE_LIMIT_BURST', default=30, cast=int)
+# Write requests in flight across all workers; 0 disables the cap.
+# Keep it below the database's connection limit.
+INVOICE_WRITE_CONCURRENCY = config('INVOICE_WRITE_CONCURRENCY', default=16, cast=int)
+INVOICE_SHED_RETRY_AFTER = config('INVOICE_SHED_RETRY_AFTER', default=1, cast=int)
+# Reverse proxies in front of the app that append to X-Forwarded-For
+INVOICE_TRUSTED_PROXIES = config('INVOICE_TRUSTED_PROXIES', default=0, cast=int)
+
+# Warm the app when wsgi.py/asgi.py load it (see invoices/warmup.py); on in
+# settings_production, off here so runserver's reloader stays quick
+INVOICE_PRELOAD = config('INVOICE_PRELOAD', default=False, cast=bool)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '{asctime} {levelname} {name} {message}', 'style': '{'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+    },
+    'loggers': {
+        'invoices': {'handlers': ['console'], 'level': INVOICE_LOG_LEVEL, 'propagate': False},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
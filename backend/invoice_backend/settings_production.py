@@ -0,0 +1,57 @@
+"""
+Production settings for invoice_backend.
+
+Use with ``DJANGO_SETTINGS_MODULE=invoice_backend.settings_production``
+(see gunicorn.conf.py). Everything in settings.py applies, except:
+
+- secrets, hosts and CORS origins come from the environment;
+- the app is preloaded and database connections are kept between requests;
+- apps and middleware an API worker never uses are left out, so each
+  worker imports less at boot and every request runs fewer middleware.
+  The admin (with the messages and static files apps it needs) is only
+  installed with ``INVOICE_ADMIN_ENABLED``, and CORS only when
+  ``CORS_ALLOWED_ORIGINS`` is set.
+"""
+from decouple import Csv, config
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, INSTALLED_APPS, MIDDLEWARE, TEMPLATES
+
+DEBUG = False
+SECRET_KEY = config('SECRET_KEY')
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', cast=Csv())
+CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', default='', cast=Csv())
+
+INVOICE_PRELOAD = config('INVOICE_PRELOAD', default=True, cast=bool)
+
+# Reuse connections across requests, so a warmed connection is still
+# there for the first request. Set 0 under ASGI, where requests don't
+# run on a fixed thread.
+DATABASES['default']['CONN_MAX_AGE'] = config('CONN_MAX_AGE', default=600, cast=int)
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+INVOICE_ADMIN_ENABLED = config('INVOICE_ADMIN_ENABLED', default=False, cast=bool)
+
+_unused_apps = set()
+_unused_middleware = set()
+if not INVOICE_ADMIN_ENABLED:
+    _unused_apps |= {'django.contrib.admin', 'django.contrib.messages', 'django.contrib.staticfiles'}
+    _unused_middleware.add('django.contrib.messages.middleware.MessageMiddleware')
+if not CORS_ALLOWED_ORIGINS:
+    # The frontend is served from the same origin
+    _unused_apps.add('corsheaders')
+    _unused_middleware.add('corsheaders.middleware.CorsMiddleware')
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in _unused_apps]
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in _unused_middleware]
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        'OPTIONS': {
+            'context_processors': [
+                processor for processor in TEMPLATES[0]['OPTIONS']['context_processors']
+                if processor.rsplit('.', 2)[0] not in _unused_apps
+            ],
+        },
+    },
+]
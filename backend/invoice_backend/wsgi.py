@@ -2,6 +2,8 @@
 WSGI config for invoice_backend project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+With ``INVOICE_PRELOAD`` on (invoice_backend.settings_production), the app
+is also warmed here, before gunicorn forks its workers (gunicorn.conf.py).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
@@ -9,8 +11,14 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invoice_backend.settings')
 
 application = get_wsgi_application()
+
+if settings.INVOICE_PRELOAD:
+    from invoices.warmup import preload
+
+    preload()
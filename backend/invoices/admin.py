@@ -1,3 +1,242 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.forms.models import BaseInlineFormSet
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .currency import rates_changed
+from .deletion import soft_delete
+from .models import (
+    Client, Company, ExchangeRate, Invoice, InvoiceItem, Membership, Product, RecurringInvoice, RecurringInvoiceItem,
+)
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the row count of an unfiltered changelist from the
+    planner statistics (``pg_class.reltuples``, summed over partitions)
+    instead of running ``COUNT(*)``. Filtered lists, small tables and
+    other databases still get an exact count. The default manager's own
+    filter (e.g. hiding deleted invoices) doesn't count as filtered.
+    """
+    exact_count_below = 10_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where == queryset.model._default_manager.all().query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= self.exact_count_below:
+                return estimate
+        return super().count
+
+
+def estimated_row_count(model, using='default'):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT SUM(GREATEST(c.reltuples, 0))::bigint
+            FROM pg_class c
+            WHERE c.oid = %s::regclass
+               OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)
+            """,
+            [model._meta.db_table, model._meta.db_table],
+        )
+        return cursor.fetchone()[0]
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skip the second, unfiltered COUNT(*) shown next to filtered results
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class PaginatedInlineFormSet(BaseInlineFormSet):
+    """Inline formset that edits one page of the related rows at a time"""
+    per_page = 50
+    page_param = 'items_page'
+    request = None
+
+    def get_queryset(self):
+        if not hasattr(self, 'page'):
+            queryset = super().get_queryset()
+            if not queryset.ordered:
+                # Pages of an unordered queryset can overlap or skip rows;
+                # ids are time-ordered (UUIDv7), so this is creation order
+                queryset = queryset.order_by('pk')
+            number = self.request.GET.get(self.page_param) if self.request else None
+            self.page = Paginator(queryset, self.per_page).get_page(number)
+            self._queryset = list(self.page.object_list)
+            for obj in self._queryset:
+                # Rows print their parent (e.g. InvoiceItem.__str__); don't fetch it per row
+                setattr(obj, self.fk.name, self.instance)
+        return self._queryset
+
+
+class InvoiceItemInline(admin.TabularInline):
+    model = InvoiceItem
+    formset = PaginatedInlineFormSet
+    template = 'admin/invoices/paginated_tabular.html'
+    fields = ['description', 'quantity', 'rate', 'amount']
+    readonly_fields = ['amount']
+    extra = 0
+
+    def get_formset(self, request, obj=None, **kwargs):
+        formset = super().get_formset(request, obj, **kwargs)
+        formset.request = request
+        return formset
+
+    # Items of issued invoices are frozen (see invoices/snapshots.py)
+    def has_add_permission(self, request, obj=None):
+        return super().has_add_permission(request, obj) and not (obj and obj.issued)
+
+    def has_change_permission(self, request, obj=None):
+        return super().has_change_permission(request, obj) and not (obj and obj.issued)
+
+    def has_delete_permission(self, request, obj=None):
+        return super().has_delete_permission(request, obj) and not (obj and obj.issued)
+
+
+class MembershipInline(admin.TabularInline):
+    model = Membership
+    fields = ['user', 'created_at']
+    readonly_fields = ['created_at']
+    raw_id_fields = ['user']
+    extra = 0
+
+
+class InvoiceOwnerAdmin(LargeTableAdmin):
+    """
+    Admin for a model whose rows own invoices (``invoice_field`` on Invoice).
+
+    Deleting a row would cascade over all its invoices, items and
+    snapshots in one transaction, so it is refused while the row has any
+    invoice, deleted or not. Delete the invoices first and let
+    ``purge_invoices`` remove them in small batches (see invoices/deletion.py).
+    """
+    invoice_field = None
+
+    def get_deleted_objects(self, objs, request):
+        owners = [obj for obj in objs if Invoice.all_objects.filter(**{self.invoice_field: obj}).exists()]
+        if owners:
+            # Shown as protected objects: the admin then refuses to delete
+            return [], {}, set(), [
+                f"{obj} still has invoices; delete them and wait for purge_invoices to remove them"
+                for obj in owners
+            ]
+        return super().get_deleted_objects(objs, request)
+
+
+@admin.register(Company)
+class CompanyAdmin(InvoiceOwnerAdmin):
+    list_display = ['name', 'city', 'country', 'email', 'created_at']
+    search_fields = ['^name']
+    ordering = ['name']
+    inlines = [MembershipInline]
+    invoice_field = 'company'
+
+
+@admin.register(Client)
+class ClientAdmin(InvoiceOwnerAdmin):
+    list_display = ['name', 'city', 'country', 'email', 'created_at']
+    search_fields = ['^name']
+    ordering = ['name']
+    invoice_field = 'client'
+
+
+@admin.register(Invoice)
+class InvoiceAdmin(LargeTableAdmin):
+    list_display = ['invoice_number', 'company', 'client', 'invoice_date', 'due_date', 'status', 'total', 'currency']
+    list_select_related = ['company', 'client']
+    list_filter = ['status', 'currency']
+    date_hierarchy = 'invoice_date'
+    ordering = ['-invoice_date']
+    search_fields = ['=invoice_number']
+    autocomplete_fields = ['company', 'client']
+    readonly_fields = ['created_at', 'updated_at']
+    inlines = [InvoiceItemInline]
+
+    def get_readonly_fields(self, request, obj=None):
+        # Only the status of an issued invoice can change (see invoices/snapshots.py)
+        if obj is not None and obj.issued:
+            return [field.name for field in obj._meta.fields if field.name != 'status']
+        return super().get_readonly_fields(request, obj)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Exact match so the lookup uses the index on invoice_number
+        if search_term:
+            return queryset.filter(invoice_number=search_term.strip()), False
+        return queryset, False
+
+    # Deleting from the admin soft-deletes too (see invoices/deletion.py)
+    def delete_model(self, request, obj):
+        soft_delete(Invoice.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        soft_delete(queryset)
+
+
+@admin.register(Product)
+class ProductAdmin(LargeTableAdmin):
+    list_display = ['name', 'company', 'created_at']
+    list_select_related = ['company']
+    search_fields = ['^name']
+    autocomplete_fields = ['company']
+    readonly_fields = ['key', 'created_at']
+    ordering = ['name']
+
+
+@admin.register(InvoiceItem)
+class InvoiceItemAdmin(LargeTableAdmin):
+    list_display = ['description', 'invoice', 'invoice_date', 'quantity', 'rate', 'amount']
+    list_select_related = ['invoice']
+    raw_id_fields = ['invoice', 'product']
+    readonly_fields = ['amount', 'invoice_date']
+    ordering = ['-invoice_date']
+
+    def has_change_permission(self, request, obj=None):
+        return super().has_change_permission(request, obj) and not (obj and obj.invoice.issued)
+
+    def has_delete_permission(self, request, obj=None):
+        return super().has_delete_permission(request, obj) and not (obj and obj.invoice.issued)
+
+
+class RecurringInvoiceItemInline(admin.TabularInline):
+    model = RecurringInvoiceItem
+    fields = ['position', 'description', 'quantity', 'rate']
+    extra = 0
+
+
+@admin.register(RecurringInvoice)
+class RecurringInvoiceAdmin(LargeTableAdmin):
+    list_display = ['client', 'company', 'cadence', 'next_run_date', 'run_count', 'active']
+    list_select_related = ['company', 'client']
+    list_filter = ['active', 'cadence']
+    autocomplete_fields = ['company', 'client']
+    readonly_fields = ['run_count', 'last_run_date', 'created_at', 'updated_at']
+    inlines = [RecurringInvoiceItemInline]
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ['currency', 'date', 'rate']
+    list_filter = ['currency']
+    date_hierarchy = 'date'
+    ordering = ['currency', '-date']
+
+    # Workers reload their rate tables after any change (see invoices/currency.py)
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rates_changed()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rates_changed()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        rates_changed()
@@ -0,0 +1,166 @@
+"""
+Admission control for write requests.
+
+``AdmissionControlMiddleware`` (invoices.middleware) puts two checks in
+front of every POST/PUT/PATCH/DELETE under ``INVOICE_ADMISSION_PATH``:
+
+1. A token bucket per API client (the authenticated user, else the client
+   IP): ``INVOICE_RATE_LIMIT_BURST`` requests at once, refilled at
+   ``INVOICE_RATE_LIMIT_RATE`` per second. Buckets live in
+   ``RateLimitBucket`` and are taken with one upsert, so the limit holds
+   across worker processes and hosts.
+2. At most ``INVOICE_WRITE_CONCURRENCY`` write requests in flight across
+   all workers. Slots are PostgreSQL advisory locks, released when the
+   request ends or its connection drops. Requests over the cap are shed
+   right away instead of queueing for a database connection.
+
+Rejected requests get 429 with ``Retry-After``. On other databases (local
+development) buckets use row locks and the cap is per process.
+"""
+import math
+import random
+import threading
+import zlib
+from collections import Counter
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import RateLimitBucket
+
+# First key of the advisory locks used as write slots
+ADVISORY_NAMESPACE = zlib.crc32(b'invoices.admission') & 0x7FFFFFFF
+
+_REFILLED = (
+    "LEAST(%(burst)s, bucket.tokens + %(rate)s * EXTRACT(EPOCH FROM now() - bucket.updated_at)::float8)"
+)
+
+_counters = Counter()
+_counters_lock = threading.Lock()
+
+
+def count(outcome):
+    with _counters_lock:
+        _counters[outcome] += 1
+
+
+@dataclass
+class Decision:
+    admitted: bool
+    retry_after: int = 0
+
+
+def client_key(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{client_ip(request)}"
+
+
+def client_ip(request):
+    """REMOTE_ADDR, or the address ``INVOICE_TRUSTED_PROXIES`` hops back in X-Forwarded-For"""
+    proxies = settings.INVOICE_TRUSTED_PROXIES
+    if proxies:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', 'unknown')
+
+
+def _retry_after(tokens, rate):
+    return max(1, math.ceil((1 - tokens) / rate))
+
+
+def take_token(key, rate=None, burst=None):
+    """Take one token from ``key``'s bucket"""
+    rate = rate or settings.INVOICE_RATE_LIMIT_RATE
+    burst = burst or settings.INVOICE_RATE_LIMIT_BURST
+    if connection.vendor == 'postgresql':
+        # One round trip. A throttled request leaves tokens and updated_at
+        # alone, which is how it is told apart in RETURNING.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {RateLimitBucket._meta.db_table} AS bucket (key, tokens, updated_at, admitted, throttled)
+                VALUES (%(key)s, %(burst)s - 1, now(), 1, 0)
+                ON CONFLICT (key) DO UPDATE SET
+                    tokens = CASE WHEN {_REFILLED} >= 1 THEN {_REFILLED} - 1 ELSE bucket.tokens END,
+                    updated_at = CASE WHEN {_REFILLED} >= 1 THEN now() ELSE bucket.updated_at END,
+                    admitted = bucket.admitted + CASE WHEN {_REFILLED} >= 1 THEN 1 ELSE 0 END,
+                    throttled = bucket.throttled + CASE WHEN {_REFILLED} >= 1 THEN 0 ELSE 1 END
+                RETURNING updated_at = now(), tokens, EXTRACT(EPOCH FROM now() - updated_at)::float8
+                """,
+                {'key': key, 'rate': rate, 'burst': burst},
+            )
+            admitted, tokens, idle = cursor.fetchone()
+        if admitted:
+            return Decision(True)
+        return Decision(False, _retry_after(min(burst, tokens + rate * idle), rate))
+
+    now = timezone.now()
+    with transaction.atomic():
+        bucket, _ = RateLimitBucket.objects.select_for_update().get_or_create(
+            key=key, defaults={'tokens': burst, 'updated_at': now},
+        )
+        tokens = min(burst, bucket.tokens + rate * (now - bucket.updated_at).total_seconds())
+        if tokens >= 1:
+            bucket.tokens, bucket.updated_at = tokens - 1, now
+            bucket.admitted += 1
+        else:
+            bucket.throttled += 1
+        bucket.save()
+    return Decision(True) if tokens >= 1 else Decision(False, _retry_after(tokens, rate))
+
+
+class WriteSlots:
+    """Global cap on concurrent write requests; ``acquire()`` returns a slot or None"""
+
+    def __init__(self, size):
+        self.size = size
+        self.local = threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        if connection.vendor != 'postgresql':
+            return 0 if self.local.acquire(blocking=False) else None
+        # Try the slots from a random start so requests don't all contend
+        # for slot 0; LIMIT 1 stops at the first lock taken
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT (%(start)s + n) %% %(size)s FROM generate_series(0, %(size)s - 1) AS n
+                WHERE pg_try_advisory_lock(%(namespace)s, (%(start)s + n) %% %(size)s)
+                LIMIT 1
+                """,
+                {'start': random.randrange(self.size), 'size': self.size, 'namespace': ADVISORY_NAMESPACE},
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def release(self, slot):
+        if connection.vendor != 'postgresql':
+            self.local.release()
+            return
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s, %s)", [ADVISORY_NAMESPACE, slot])
+        except DatabaseError:
+            # A broken connection has already dropped its locks
+            pass
+
+
+def metrics(top=20):
+    """Admission counters of this process, plus per-client totals shared by all workers"""
+    with _counters_lock:
+        process = {outcome: _counters[outcome] for outcome in ('admitted', 'throttled', 'shed')}
+    totals = RateLimitBucket.objects.aggregate(admitted=Sum('admitted'), throttled=Sum('throttled'))
+    clients = RateLimitBucket.objects.filter(throttled__gt=0).order_by('-throttled').values(
+        'key', 'admitted', 'throttled', 'updated_at',
+    )[:top]
+    return {
+        'process': process,
+        'clients': {key: value or 0 for key, value in totals.items()},
+        'most_throttled': list(clients),
+    }
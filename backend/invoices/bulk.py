@@ -0,0 +1,44 @@
+"""
+Lean write paths for trusted, already-validated data.
+
+These skip per-row ``save()`` and application-side re-validation and rely
+on the model CHECK constraints instead: one INSERT per call, with any
+violation surfaced as a ``ValidationError`` carrying the usual field
+messages (see ``invoices.constraints``).
+"""
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from .catalog import link_products
+from .constraints import violation_errors
+from .models import InvoiceItem
+
+
+def build_invoice_items(invoice, items_data):
+    """Unsaved items for ``invoice``, with the derived fields ``save()`` would set
+
+    Products are linked separately, for all items of a write at once
+    (``invoices.catalog.link_products``).
+    """
+    items = []
+    for item_data in items_data:
+        item_data = dict(item_data)
+        item_data.pop('id', None)
+        item = InvoiceItem(invoice=invoice, **item_data)
+        item.amount = item.quantity * item.rate
+        item.invoice_date = invoice.invoice_date
+        items.append(item)
+    return items
+
+
+def create_invoice_items(invoice, items_data):
+    """Insert all of an invoice's items in one statement"""
+    items = link_products(build_invoice_items(invoice, items_data))
+    try:
+        with transaction.atomic():
+            return InvoiceItem.objects.bulk_create(items)
+    except IntegrityError as e:
+        errors = violation_errors(e)
+        if errors is None:
+            raise
+        raise serializers.ValidationError(errors)
@@ -0,0 +1,95 @@
+"""
+Product catalog matching.
+
+Item descriptions are free text repeated on every invoice. A ``Product``
+is a company's catalog entry. Items reference it through an integer
+``product_id``, so reports group by a small indexed key instead of by
+description. Items and products are matched on ``product_key``, which
+ignores case, repeated whitespace and leading or trailing punctuation:
+"Web design." and "web  design" both match the product "Web Design".
+
+- ``link_products(items)`` links unsaved items before they are inserted,
+  with one query for the whole batch. Every write path calls it.
+- ``match_existing_items`` backfills items written before their product
+  existed, in batches. With ``create``, it first adds a product for every
+  description that has none.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+
+from django.db import transaction
+
+from .models import InvoiceItem, Product, product_key
+
+
+def _product_ids(keys):
+    """``{(company_id, key): product id}`` for the products among ``keys``"""
+    if not keys:
+        return {}
+    products = Product.all_objects.filter(
+        company_id__in={company_id for company_id, _ in keys},
+        key__in={key for _, key in keys},
+    ).values_list('company_id', 'key', 'id')
+    return {(company_id, key): product_id for company_id, key, product_id in products}
+
+
+def link_products(items):
+    """Point unsaved items without a product at their company's matching product"""
+    pending = [(item, (item.invoice.company_id, product_key(item.description))) for item in items if item.product_id is None]
+    products = _product_ids({key for _, key in pending})
+    for item, key in pending:
+        item.product_id = products.get(key)
+    return items
+
+
+@dataclass
+class MatchResult:
+    items: int
+    linked: int
+    created: int
+    last_id: object
+
+
+def _match_batch(after, batch_size, create):
+    items = InvoiceItem.objects.filter(product__isnull=True).order_by('id')
+    if after is not None:
+        items = items.filter(id__gt=after)
+    rows = list(items.values_list('id', 'description', 'invoice__company_id')[:batch_size])
+    if not rows:
+        return MatchResult(0, 0, 0, after)
+    names = {}
+    for _, description, company_id in rows:
+        names.setdefault((company_id, product_key(description)), description.strip())
+    products = _product_ids(set(names))
+    created = 0
+    if create:
+        missing = [
+            Product(company_id=company_id, name=names[(company_id, key)], key=key)
+            for company_id, key in names if (company_id, key) not in products
+        ]
+        # A parallel run may add the same product; keep whichever landed first
+        created = len(Product.all_objects.bulk_create(missing, ignore_conflicts=True))
+        if missing:
+            products = _product_ids(set(names))
+    # One UPDATE per product rather than per item
+    by_product = defaultdict(list)
+    for item_id, description, company_id in rows:
+        product_id = products.get((company_id, product_key(description)))
+        if product_id is not None:
+            by_product[product_id].append(item_id)
+    for product_id, item_ids in by_product.items():
+        InvoiceItem.objects.filter(id__in=item_ids).update(product_id=product_id)
+    linked = sum(len(item_ids) for item_ids in by_product.values())
+    return MatchResult(len(rows), linked, created, rows[-1][0])
+
+
+def match_existing_items(batch_size=5000, create=False):
+    """Link unlinked items to products, one transaction per batch; yields a ``MatchResult`` per batch"""
+    after = None
+    while True:
+        with transaction.atomic():
+            result = _match_batch(after, batch_size, create)
+        if not result.items:
+            return
+        yield result
+        after = result.last_id
@@ -0,0 +1,62 @@
+"""
+Mapping of database CHECK constraint violations back to validation errors.
+
+The invariants the serializers enforce are also declared as CHECK
+constraints on ``Invoice`` and ``InvoiceItem``, so paths that skip the
+serializers (bulk inserts, management commands) are still protected by
+PostgreSQL. When a write trips one of them, ``violation_errors`` turns
+the ``IntegrityError`` into the same field -> messages shape DRF uses.
+"""
+from .models import Invoice, InvoiceItem
+
+# Field each constraint reports against; cross-field checks use the field
+# the serializer would have blamed
+CONSTRAINT_FIELDS = {
+    'invoice_number_not_blank': 'invoice_number',
+    'invoice_currency_code': 'currency',
+    'invoice_due_date_after_invoice_date': 'due_date',
+    'invoice_subtotal_nonnegative': 'subtotal',
+    'invoice_tax_rate_nonnegative': 'tax_rate',
+    'invoice_tax_rate_max': 'tax_rate',
+    'invoice_tax_amount_nonnegative': 'tax_amount',
+    'invoice_total_nonnegative': 'total',
+    'invoice_tax_amount_matches_rate': 'tax_amount',
+    'invoice_total_matches': 'total',
+    'item_description_not_blank': 'description',
+    'item_quantity_positive': 'quantity',
+    'item_quantity_max': 'quantity',
+    'item_rate_nonnegative': 'rate',
+    'item_amount_matches': 'amount',
+}
+
+CONSTRAINT_MESSAGES = {
+    constraint.name: constraint.get_violation_error_message()
+    for model in (Invoice, InvoiceItem)
+    for constraint in model._meta.constraints
+    if constraint.name in CONSTRAINT_FIELDS
+}
+
+
+def violated_constraint(error):
+    """Name of the CHECK constraint behind an ``IntegrityError``, if it is one of ours"""
+    diag = getattr(error.__cause__, 'diag', None)
+    name = getattr(diag, 'constraint_name', None)
+    if name in CONSTRAINT_FIELDS:
+        return name
+    # Other backends only name the constraint in the message
+    message = str(error)
+    for name in CONSTRAINT_FIELDS:
+        if name in message:
+            return name
+    return None
+
+
+def violation_errors(error):
+    """``{field: [message]}`` for a constraint violation, or None for other integrity errors"""
+    name = violated_constraint(error)
+    if name is None:
+        return None
+    field = CONSTRAINT_FIELDS[name]
+    if name.startswith('item_'):
+        return {'items': [{field: [CONSTRAINT_MESSAGES[name]]}]}
+    return {field: [CONSTRAINT_MESSAGES[name]]}
@@ -0,0 +1,161 @@
+"""
+Currencies and exchange rates.
+
+Each invoice is billed in its own ``currency``. Stats and reports are in
+``INVOICE_BASE_CURRENCY``, converted with ``ExchangeRate`` rows that
+``python manage.py load_exchange_rates`` imports from a CSV file, never
+from the network. A rate is what one unit of a currency is worth in the
+base currency from its date until the next rate of that currency.
+
+Reports sum amounts in SQL per currency and bucket (a month, or the
+report's period) and convert each sum once, at the rate in effect on the
+bucket's first day, instead of converting row by row. A day before a
+currency's first rate uses that first rate. A currency without any rate
+is left out of converted totals and reported unconverted instead.
+
+Every worker keeps the whole rate table in memory, as sorted dates per
+currency searched with ``bisect``. It rereads the table after
+``INVOICE_RATE_CACHE_TTL`` seconds, or once ``load_exchange_rates`` bumps
+the version kept in the shared cache.
+"""
+import bisect
+import datetime
+import threading
+import time
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import ExchangeRate
+from .reconcile import CENT
+
+VERSION_KEY = 'invoices:exchange_rates:version'
+ONE = Decimal(1)
+
+
+class RateTable:
+    """Exchange rates by currency, each as parallel lists of dates and rates sorted by date"""
+
+    def __init__(self, rows, version):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.dates = defaultdict(list)
+        self.rates = defaultdict(list)
+        # rows are ordered by currency, date
+        for currency, date, rate in rows:
+            self.dates[currency].append(date)
+            self.rates[currency].append(rate)
+
+    def stale(self, version):
+        return version != self.version or time.monotonic() - self.loaded_at > settings.INVOICE_RATE_CACHE_TTL
+
+    def rate(self, currency, date):
+        """Base currency value of one unit of ``currency`` on ``date``, or None without rates"""
+        if currency == settings.INVOICE_BASE_CURRENCY:
+            return ONE
+        dates = self.dates.get(currency)
+        if not dates:
+            return None
+        index = bisect.bisect_right(dates, date) - 1
+        return self.rates[currency][max(index, 0)]
+
+    def convert(self, amount, currency, date):
+        """``amount`` of ``currency`` in the base currency, rounded to cents, or None"""
+        rate = self.rate(currency, date)
+        if rate is None:
+            return None
+        return (amount * rate).quantize(CENT, ROUND_HALF_UP)
+
+
+_table = None
+_lock = threading.Lock()
+
+
+def rates_version():
+    return cache.get_or_set(VERSION_KEY, 1, timeout=None)
+
+
+def rate_table():
+    """This process's ``RateTable``, reloaded when stale"""
+    global _table
+    version = rates_version()
+    table = _table
+    if table is None or table.stale(version):
+        with _lock:
+            table = _table
+            if table is None or table.stale(version):
+                rows = ExchangeRate.objects.order_by('currency', 'date').values_list('currency', 'date', 'rate')
+                table = _table = RateTable(rows.iterator(chunk_size=10_000), version)
+    return table
+
+
+def rates_changed():
+    """Make every worker reload its rate table on next use"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, timeout=None)
+
+
+def to_base(sums):
+    """Convert ``(currency, date, amount)`` sums once each.
+
+    Returns the total in the base currency and ``{currency: amount}`` of
+    the currencies that have no rate.
+    """
+    table = rate_table()
+    total = Decimal(0)
+    unconverted = defaultdict(Decimal)
+    for currency, date, amount in sums:
+        if amount is None:
+            continue
+        converted = table.convert(amount, currency, date)
+        if converted is None:
+            unconverted[currency] += amount
+        else:
+            total += converted
+    return total, dict(unconverted)
+
+
+def parse_rate(row, line):
+    """``ExchangeRate`` from a CSV row with date, currency and rate columns"""
+    try:
+        currency = row['currency'].strip().upper()
+        rate = Decimal(row['rate'].strip())
+        date = datetime.date.fromisoformat(row['date'].strip())
+    except (KeyError, AttributeError, InvalidOperation, ValueError):
+        raise ValueError(f"Line {line}: expected date (YYYY-MM-DD), currency and rate, got {row}")
+    if len(currency) != 3 or not currency.isascii() or not currency.isalpha():
+        raise ValueError(f"Line {line}: {currency!r} is not a three-letter currency code")
+    if not rate.is_finite() or rate <= 0:
+        raise ValueError(f"Line {line}: rate must be a positive number")
+    return ExchangeRate(currency=currency, date=date, rate=rate)
+
+
+def load_rates(rows, batch_size=1000):
+    """Insert or update rates from CSV rows in one transaction; returns how many were read"""
+    count = 0
+    with transaction.atomic():
+        # By (currency, date): one upsert can't touch a row twice, so a
+        # repeated row replaces the earlier one
+        batch = {}
+        # Line 1 is the header
+        for line, row in enumerate(rows, start=2):
+            rate = parse_rate(row, line)
+            batch[rate.currency, rate.date] = rate
+            count += 1
+            if len(batch) >= batch_size:
+                _upsert(batch.values())
+                batch = {}
+        _upsert(batch.values())
+        transaction.on_commit(rates_changed)
+    return count
+
+
+def _upsert(rates):
+    ExchangeRate.objects.bulk_create(
+        list(rates), update_conflicts=True, unique_fields=['currency', 'date'], update_fields=['rate'],
+    )
@@ -0,0 +1,74 @@
+"""
+Soft deletion of invoices.
+
+Deleting an invoice only sets its ``deleted_at``: one small UPDATE, where
+a hard delete would cascade over its items, snapshot and deliveries while
+holding their locks. ``Invoice.objects`` hides deleted invoices, so
+lists, lookups, stats and reports treat them as gone. The partial
+``(company_id, ...)`` indexes only cover live invoices. A deleted invoice
+keeps its number and recurring run, so neither is issued again, and it
+can be restored until it is purged.
+
+``purge_deleted`` hard-deletes invoices deleted before a cutoff, a small
+batch per transaction, so each batch holds its locks only briefly.
+``python manage.py purge_invoices`` runs it during quiet hours.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Invoice
+from .outbox import INVOICE_DELETED, INVOICE_RESTORED, record_events
+
+
+def soft_delete(invoices):
+    """Mark the live invoices of a queryset deleted; returns how many were"""
+    now = timezone.now()
+    with transaction.atomic():
+        invoices = list(invoices.filter(deleted_at__isnull=True).select_for_update())
+        if not invoices:
+            return 0
+        Invoice.all_objects.filter(id__in=[invoice.id for invoice in invoices]).update(deleted_at=now, updated_at=now)
+        for invoice in invoices:
+            invoice.deleted_at = invoice.updated_at = now
+        record_events(invoices, event_type=INVOICE_DELETED)
+    return len(invoices)
+
+
+def restore(invoices):
+    """Undo ``soft_delete`` for the deleted invoices of a queryset; returns how many"""
+    now = timezone.now()
+    with transaction.atomic():
+        invoices = list(invoices.filter(deleted_at__isnull=False).select_for_update())
+        if not invoices:
+            return 0
+        Invoice.all_objects.filter(id__in=[invoice.id for invoice in invoices]).update(deleted_at=None, updated_at=now)
+        for invoice in invoices:
+            invoice.deleted_at, invoice.updated_at = None, now
+        record_events(invoices, event_type=INVOICE_RESTORED)
+    return len(invoices)
+
+
+def purge_batch(before, batch_size):
+    """Hard-delete up to ``batch_size`` invoices deleted before ``before``; returns how many"""
+    with transaction.atomic():
+        # Oldest first, from invoice_deleted_idx. Rows being restored right
+        # now are locked and left for the next run.
+        ids = list(
+            Invoice.all_objects.filter(deleted_at__lt=before)
+            .order_by('deleted_at')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if ids:
+            # Items, snapshots and deliveries go with them, one statement each
+            Invoice.all_objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def purge_deleted(before, batch_size=500):
+    """Purge in batches; yields the size of each batch"""
+    while True:
+        purged = purge_batch(before, batch_size)
+        if not purged:
+            return
+        yield purged
@@ -0,0 +1,176 @@
+"""
+Batched invoice email dispatch.
+
+Each batch renders its messages (body from ``templates/invoices/email``,
+PDF from ``invoices.snapshots.invoice_pdf``) and sends them over a single SMTP connection,
+recording one ``InvoiceDelivery`` per invoice. Draft invoices that were
+delivered are flipped to ``sent`` with one UPDATE per batch.
+
+A delivery is marked ``sent`` as soon as its message is accepted, and a
+batch skips invoices that already have a ``sent`` delivery. A retried
+job therefore doesn't email anyone twice. It still flips those invoices
+to ``sent`` if the earlier attempt stopped before doing so.
+
+Any SMTP server works for local testing, e.g. ``python -m aiosmtpd -n -l
+localhost:1025`` with ``EMAIL_PORT=1025``.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connections, transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Invoice, InvoiceDelivery
+from .outbox import record_events
+from .snapshots import capture_on_commit, invoice_pdf
+
+logger = logging.getLogger(__name__)
+
+
+def chunked(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def build_message(invoice, connection=None):
+    context = {'invoice': invoice}
+    subject = ' '.join(render_to_string('invoices/email/invoice_subject.txt', context).split())
+    body = render_to_string('invoices/email/invoice_body.txt', context)
+    message = EmailMessage(
+        subject, body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[invoice.client.email],
+        reply_to=[invoice.company.email] if invoice.company.email else None,
+        connection=connection,
+    )
+    message.attach(
+        f"{invoice.invoice_number}.pdf",
+        invoice_pdf(invoice),
+        'application/pdf',
+    )
+    return message
+
+
+def send_invoice_batch(invoice_ids):
+    """Email one batch of invoices over a single SMTP connection"""
+    invoices = list(
+        Invoice.objects.filter(id__in=invoice_ids)
+        .select_related('company', 'client')
+        .prefetch_related('items')
+    )
+    # Delivered by an earlier attempt of this batch
+    already_sent = set(
+        InvoiceDelivery.objects.filter(invoice_id__in=[invoice.id for invoice in invoices], status='sent')
+        .values_list('invoice_id', flat=True)
+    )
+    pending = [invoice for invoice in invoices if invoice.id not in already_sent]
+    deliveries = InvoiceDelivery.objects.bulk_create([
+        InvoiceDelivery(invoice=invoice, recipient=invoice.client.email) for invoice in pending
+    ])
+    sent_ids = []
+    if deliveries:
+        sent_ids = _deliver(pending, deliveries)
+
+    marked_sent = mark_sent([*already_sent, *sent_ids])
+    failed = len(deliveries) - len(sent_ids)
+    logger.info(
+        f"Emailed {len(sent_ids)} invoice(s), {failed} failed, {len(already_sent)} already sent, "
+        f"{marked_sent} marked sent"
+    )
+    return {
+        'sent': len(sent_ids),
+        'failed': failed,
+        'already_sent': len(already_sent),
+        'marked_sent': marked_sent,
+        'missing': len(set(map(str, invoice_ids)) - {str(invoice.id) for invoice in invoices}),
+    }
+
+
+def _fail(deliveries, error):
+    for delivery in deliveries:
+        delivery.status = 'failed'
+        delivery.error = error
+
+
+def _deliver(invoices, deliveries):
+    """Send each invoice's message over one connection; returns the ids delivered"""
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Could not open mail connection for {len(invoices)} invoice(s): {e}")
+        _fail(deliveries, f"Mail server unavailable: {e}")
+        InvoiceDelivery.objects.bulk_update(deliveries, ['status', 'error'])
+        raise
+
+    sent_ids = []
+    try:
+        for index, (invoice, delivery) in enumerate(zip(invoices, deliveries)):
+            if not delivery.recipient:
+                _fail([delivery], "Client has no email address")
+                continue
+            try:
+                build_message(invoice, connection).send()
+            except Exception as e:
+                logger.warning(f"Failed to email invoice {invoice.invoice_number} to {delivery.recipient}: {e}")
+                _fail([delivery], str(e))
+                # A failed send can leave the SMTP session unusable; start a fresh one
+                try:
+                    connection.close()
+                    connection.open()
+                except Exception as e:
+                    # Fail the rest rather than the job, whose retry would resend
+                    # what this batch already delivered
+                    logger.error(f"Could not reopen mail connection, failing {len(deliveries) - index - 1} invoice(s): {e}")
+                    _fail(deliveries[index + 1:], f"Mail server unavailable: {e}")
+                    break
+                continue
+            delivery.status = 'sent'
+            delivery.sent_at = timezone.now()
+            # Recorded at once, so a retry skips it even if this worker dies mid-batch
+            delivery.save(update_fields=['status', 'sent_at'])
+            sent_ids.append(invoice.id)
+    finally:
+        connection.close()
+        InvoiceDelivery.objects.bulk_update(deliveries, ['status', 'error', 'sent_at'])
+    return sent_ids
+
+
+def mark_sent(invoice_ids):
+    """Flip delivered drafts to sent in bulk, with their outbox events"""
+    now = timezone.now()
+    with transaction.atomic():
+        drafts = list(
+            Invoice.objects.select_for_update()
+            .filter(id__in=invoice_ids, status='draft')
+        )
+        Invoice.objects.filter(id__in=[invoice.id for invoice in drafts]).update(status='sent', updated_at=now)
+        for invoice in drafts:
+            invoice.status = 'sent'
+            invoice.updated_at = now
+        record_events(drafts, previous_status='draft')
+        capture_on_commit(invoice.id for invoice in drafts)
+    return len(drafts)
+
+
+def _send_batch_in_thread(invoice_ids):
+    try:
+        return send_invoice_batch(invoice_ids)
+    finally:
+        connections.close_all()
+
+
+def send_invoices(invoice_ids, batch_size=None, concurrency=None):
+    """Email invoices in batches, with at most ``concurrency`` SMTP connections open at once"""
+    batch_size = batch_size or settings.INVOICE_EMAIL_BATCH_SIZE
+    concurrency = concurrency or settings.INVOICE_EMAIL_CONCURRENCY
+    totals = {'sent': 0, 'failed': 0, 'already_sent': 0, 'marked_sent': 0, 'missing': 0}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for result in executor.map(_send_batch_in_thread, chunked(invoice_ids, batch_size)):
+            for key, value in result.items():
+                totals[key] += value
+    return totals
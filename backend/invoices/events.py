@@ -0,0 +1,237 @@
+"""
+Server-Sent Events feed of invoice changes.
+
+Each outbox insert fires ``pg_notify('invoice_events', ...)`` (see
+migration 0007). Every server process keeps one dedicated ``LISTEN``
+connection, shared by all of its subscribers, and fans notifications out
+to per-client queues. Idle clients cost no database work. A reconnecting
+client sends ``Last-Event-ID`` and is first replayed the events it missed
+from the outbox table.
+
+Like the rest of the API, the stream needs a logged-in user and only
+carries the events of the company they act for (see
+invoices/permissions.py). ``EventSource`` can't send headers, so the
+company may also be named with ``?company=<id>``. Staff without a company
+get every company's events.
+
+The endpoint streams indefinitely, so serve it from an ASGI server
+(``invoice_backend.asgi:application``).
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .models import OutboxEvent
+from .outbox import INVOICE_CREATED, INVOICE_DELETED, INVOICE_RESTORED
+from .permissions import tenant_for
+from .tenancy import current_tenant
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'invoice_events'
+
+
+# Events that add an invoice to the stats (1) or take it out (-1)
+COUNTED = {INVOICE_CREATED: 1, INVOICE_RESTORED: 1, INVOICE_DELETED: -1}
+
+
+def stats_delta(event):
+    """How an event changes the ``/api/stats/`` counters, as far as its payload tells"""
+    data = event.get('data') or {}
+    status, previous = data.get('status'), data.get('previous_status')
+    sign = COUNTED.get(event.get('type'))
+    if sign is None and previous in (None, status):
+        return {}
+    total = Decimal(data.get('total') or 0)
+    delta = {}
+    if sign is not None:
+        delta['total_invoices'] = sign
+    for counter, value in (('draft_invoices', 'draft'), ('paid_invoices', 'paid')):
+        if sign is not None:
+            change = sign * (status == value)
+        else:
+            change = (status == value) - (previous == value)
+        if change:
+            delta[counter] = change
+    if 'paid_invoices' in delta:
+        currency = data.get('currency') or settings.INVOICE_BASE_CURRENCY
+        if currency == settings.INVOICE_BASE_CURRENCY:
+            delta['total_revenue'] = float(total * delta['paid_invoices'])
+        else:
+            # Converting needs the rate table, which the stream doesn't
+            # load; clients refetch /api/stats/ for the converted total
+            delta['revenue_by_currency'] = {currency: float(total * delta['paid_invoices'])}
+    return delta
+
+
+def event_record(event):
+    return {
+        'id': event.id,
+        'type': event.event_type,
+        'created_at': event.created_at.isoformat(),
+        'data': event.payload,
+    }
+
+
+def events_after(last_id, limit, company_id=None):
+    """Events after ``last_id``, of one company unless ``company_id`` is None"""
+    events = OutboxEvent.objects.filter(id__gt=last_id)
+    if company_id is not None:
+        events = events.filter(company_id=company_id)
+    return [event_record(event) for event in events.order_by('id')[:limit]]
+
+
+class EventBroker:
+    """Owns this process's LISTEN connection and the subscriber queues it feeds"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=settings.EVENT_STREAM_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name='invoice-events', daemon=True)
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            loop.call_soon_threadsafe(self._offer, queue, event)
+
+    def _offer(self, queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: end the stream; the client reconnects with
+            # Last-Event-ID and catches up from the outbox table
+            self.unsubscribe(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+
+    def _listen(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+            try:
+                self._listen_once()
+            except Exception as e:
+                logger.warning(f"Invoice event listener failed, reconnecting: {e}")
+                time.sleep(1)
+
+    def _listen_once(self):
+        listener = connection.get_new_connection(connection.get_connection_params())
+        listener.autocommit = True
+        try:
+            listener.cursor().execute(f"LISTEN {CHANNEL}")
+            logger.info("Listening for invoice events")
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        return
+                if select.select([listener], [], [], 5) == ([], [], []):
+                    continue
+                listener.poll()
+                while listener.notifies:
+                    notify = listener.notifies.pop(0)
+                    self.publish(json.loads(notify.payload))
+        finally:
+            listener.close()
+
+
+broker = EventBroker()
+
+
+def format_event(event):
+    data = dict(event.get('data') or {})
+    data['stats_delta'] = stats_delta(event)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(data)}\n\n"
+
+
+def _error(message, status):
+    return JsonResponse({"success": False, "message": message}, status=status)
+
+
+async def event_stream(request):
+    """Stream invoice events as text/event-stream"""
+    company_id = current_tenant()
+    if company_id is None and request.GET.get('company'):
+        try:
+            company_id = uuid.UUID(request.GET['company'])
+        except ValueError:
+            return _error("Invalid company", 400)
+    company_id, denied = await sync_to_async(tenant_for)(request.user, company_id)
+    if denied:
+        return _error(denied, 403)
+    # The tenant's events as JSON strings, as the payloads carry them
+    company = str(company_id) if company_id else None
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0)
+    except ValueError:
+        last_id = 0
+    # Subscribe before replaying so nothing committed in between is lost
+    queue = broker.subscribe()
+
+    async def stream():
+        sent_id = last_id
+        try:
+            yield f"retry: {settings.EVENT_STREAM_RETRY_MS}\n\n"
+            if last_id:
+                limit = settings.EVENT_STREAM_REPLAY_LIMIT
+                missed = await sync_to_async(events_after)(last_id, limit + 1, company_id)
+                if len(missed) > limit:
+                    # Too far behind to replay; the client should reload its data
+                    yield "event: reset\ndata: {}\n\n"
+                    missed = []
+                for event in missed:
+                    sent_id = event['id']
+                    yield format_event(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.EVENT_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    return
+                if event['id'] <= sent_id:
+                    continue
+                if 'type' not in event:
+                    # Oversized notification carried only the id
+                    loaded = await sync_to_async(events_after)(event['id'] - 1, 1, company_id)
+                    if not loaded or loaded[0]['id'] != event['id']:
+                        continue
+                    event = loaded[0]
+                elif company and (event.get('data') or {}).get('company') != company:
+                    continue
+                sent_id = event['id']
+                yield format_event(event)
+        finally:
+            broker.unsubscribe(queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
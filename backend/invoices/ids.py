@@ -0,0 +1,54 @@
+"""
+Primary key generation.
+
+Random ``uuid4`` keys scatter inserts across the whole primary key and
+foreign key B-trees. ``uuid7`` keys (RFC 9562) start with a millisecond
+Unix timestamp, so new rows land on the right-most index pages like a
+sequence would, while staying globally unique and unguessable enough to
+expose in URLs. ``INVOICE_ID_VERSION`` selects which one ``new_id`` makes.
+"""
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+    """
+    A version 7 UUID. Within one millisecond, ``rand_a`` holds a counter
+    seeded randomly, so ids made by this process stay strictly increasing.
+    """
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # Counter exhausted: borrow the next millisecond
+                _last_ms += 1
+                _counter = 0
+        timestamp, counter = _last_ms, _counter
+    rand_b = int.from_bytes(os.urandom(8), 'big') & 0x3FFF_FFFF_FFFF_FFFF
+    value = (timestamp & 0xFFFF_FFFF_FFFF) << 80 | 0x7 << 76 | counter << 64 | 0b10 << 62 | rand_b
+    return uuid.UUID(int=value)
+
+
+def uuid7_time(value):
+    """Creation time of a uuid7, in seconds since the epoch"""
+    return (value.int >> 80) / 1000
+
+
+def new_id():
+    """Default for the invoice models' primary keys"""
+    if settings.INVOICE_ID_VERSION == 4:
+        return uuid.uuid4()
+    return uuid7()
@@ -0,0 +1,220 @@
+"""
+Database-backed background jobs.
+
+Tasks are plain functions registered with ``@task`` in an app's
+``tasks.py`` and called with the job payload as keyword arguments::
+
+    @task('send_invoice_emails')
+    def send_invoice_emails(invoice_ids):
+        ...
+
+    enqueue('send_invoice_emails', {'invoice_ids': [...]}, priority=5)
+
+Workers (``manage.py run_workers``) claim jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` so any number of them can poll the
+same table without blocking each other. Failed jobs are retried with
+exponential backoff until ``max_attempts`` is reached. A job queued while
+a tenant is active belongs to that company and runs with it active, so
+its task only sees that company's invoices.
+
+While a job runs, its worker renews ``locked_at`` every
+``JOB_HEARTBEAT_INTERVAL`` seconds. ``requeue_stale`` only takes back
+jobs whose lease went ``JOB_LEASE_TIMEOUT`` seconds without a renewal,
+meaning their worker died. Such a job is queued again, or failed once it
+has used up its attempts.
+"""
+import datetime
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import Job
+from .tenancy import activate, current_tenant
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class UnknownTaskError(Exception):
+    pass
+
+
+def task(name=None):
+    """Register a function as a job task"""
+    def decorator(func):
+        _registry[name or func.__name__] = func
+        return func
+    return decorator
+
+
+def registered_tasks():
+    return dict(_registry)
+
+
+def discover_tasks():
+    autodiscover_modules('tasks')
+
+
+def enqueue(task_name, payload=None, priority=0, run_at=None, max_attempts=None):
+    """Queue a job for the active tenant; runs after the surrounding transaction commits, if any"""
+    return Job.all_objects.create(
+        company_id=current_tenant(),
+        task=task_name,
+        payload=payload or {},
+        priority=priority,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def retry_delay(attempts):
+    """Exponential backoff after the given number of failed attempts"""
+    delay = settings.JOB_RETRY_BACKOFF * 2 ** max(attempts - 1, 0)
+    return datetime.timedelta(seconds=min(delay, settings.JOB_RETRY_MAX_DELAY))
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker_id):
+    """Lock the next runnable job for ``worker_id`` or return None"""
+    now = timezone.now()
+    with transaction.atomic():
+        job = (
+            Job.all_objects.select_for_update(skip_locked=True)
+            .filter(status='queued', run_at__lte=now)
+            .order_by('-priority', 'run_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.save(update_fields=['status', 'attempts', 'locked_by', 'locked_at', 'updated_at'])
+    return job
+
+
+def _renew_lease(job, stopped, interval):
+    try:
+        while not stopped.wait(interval):
+            renewed = Job.all_objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+                locked_at=timezone.now(),
+            )
+            if not renewed:
+                logger.warning(f"Job {job.id} ({job.task}) lost its lease to {job.locked_by} while running")
+                return
+    except DatabaseError:
+        logger.exception(f"Could not renew the lease of job {job.id} ({job.task})")
+    finally:
+        # This thread's own connection
+        connection.close()
+
+
+@contextmanager
+def lease(job, interval=None):
+    """Keep renewing a claimed job's lease from a background thread while the block runs"""
+    interval = settings.JOB_HEARTBEAT_INTERVAL if interval is None else interval
+    stopped = threading.Event()
+    heartbeat = threading.Thread(
+        target=_renew_lease, args=(job, stopped, interval), name=f"job-heartbeat-{job.id}", daemon=True,
+    )
+    heartbeat.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        heartbeat.join()
+
+
+def execute(job):
+    """Run a claimed job and record its outcome"""
+    started = time.monotonic()
+    worker_id = job.locked_by
+    try:
+        func = _registry.get(job.task)
+        if func is None:
+            raise UnknownTaskError(f"No task registered as '{job.task}'")
+        with lease(job), activate(job.company_id):
+            result = func(**job.payload)
+    except Exception as e:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts and not isinstance(e, UnknownTaskError):
+            job.status = 'queued'
+            job.run_at = timezone.now() + retry_delay(job.attempts)
+            logger.warning(f"Job {job.id} ({job.task}) failed on attempt {job.attempts}, retrying at {job.run_at}: {e}")
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+            logger.error(f"Job {job.id} ({job.task}) failed permanently after {job.attempts} attempt(s): {e}")
+    else:
+        job.status = 'succeeded'
+        job.result = result
+        job.last_error = ''
+        job.finished_at = timezone.now()
+        logger.info(f"Job {job.id} ({job.task}) succeeded in {time.monotonic() - started:.3f}s")
+    job.locked_by = ''
+    job.locked_at = None
+    # Only while the lease is still ours, so a requeued job's new run isn't overwritten
+    recorded = Job.all_objects.filter(pk=job.pk, status='running', locked_by=worker_id).update(
+        status=job.status, result=job.result, last_error=job.last_error, run_at=job.run_at,
+        finished_at=job.finished_at, locked_by='', locked_at=None, updated_at=timezone.now(),
+    )
+    if not recorded:
+        logger.warning(f"Job {job.id} ({job.task}) finished after losing its lease; outcome not recorded")
+    return job
+
+
+def requeue_stale(timeout=None):
+    """Queue again, or fail once out of attempts, jobs whose worker stopped renewing their lease"""
+    timeout = settings.JOB_LEASE_TIMEOUT if timeout is None else timeout
+    now = timezone.now()
+    stale = Job.all_objects.filter(status='running', locked_at__lt=now - datetime.timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', locked_by='', locked_at=None, finished_at=now, updated_at=now,
+        last_error="Worker stopped responding on the last attempt",
+    )
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(
+        status='queued', locked_by='', locked_at=None, run_at=now, updated_at=now,
+    )
+    if failed:
+        logger.error(f"Failed {failed} stale job(s) that had no attempts left")
+    if requeued:
+        logger.warning(f"Requeued {requeued} stale job(s)")
+    return requeued + failed
+
+
+def work(worker_id=None, stop_event=None, poll_interval=None, burst=False):
+    """Claim and run jobs until ``stop_event`` is set (or the queue drains in burst mode)"""
+    worker_id = worker_id or default_worker_id()
+    poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    discover_tasks()
+    processed = 0
+    while not (stop_event and stop_event.is_set()):
+        close_old_connections()
+        job = claim(worker_id)
+        if job is None:
+            if burst:
+                break
+            if stop_event:
+                stop_event.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        execute(job)
+        processed += 1
+    close_old_connections()
+    return processed
@@ -0,0 +1,118 @@
+"""
+Structured logging for the invoices app.
+
+``log_event(name, level, **fields)`` emits one record for a named event.
+Nothing is formatted unless a handler actually writes the record: the
+level is checked first, then the event's sampling rate from
+``INVOICE_LOG_SAMPLING``, and the ``name key=value ...`` message is only
+rendered when a handler formats it. The fields are also attached to the
+record as ``record.event`` / ``record.fields`` for structured handlers.
+
+``RequestSummaryMiddleware`` (invoices.middleware) opens a summary for
+every API request. Views add to it with ``annotate()`` and ``timed()``,
+and it is written as a single ``request.summary`` record when the
+response goes out, instead of a log line per step.
+"""
+import contextvars
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger('invoices.events')
+
+_summary = contextvars.ContextVar('invoices_request_summary', default=None)
+
+
+def _render(value):
+    if isinstance(value, str):
+        return value if value and ' ' not in value and '"' not in value else json.dumps(value)
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, default=str, separators=(',', ':'))
+    return str(value)
+
+
+class Event:
+    """A log message that renders itself only when a handler asks for it"""
+    __slots__ = ('name', 'fields')
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def __str__(self):
+        if not self.fields:
+            return self.name
+        return self.name + ' ' + ' '.join(f"{key}={_render(value)}" for key, value in self.fields.items())
+
+
+def log_enabled(name, level=logging.INFO):
+    """Whether an event would be written; check this before computing costly fields"""
+    if not logger.isEnabledFor(level):
+        return False
+    rate = settings.INVOICE_LOG_SAMPLING.get(name, 1.0)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def log_event(name, level=logging.INFO, **fields):
+    if log_enabled(name, level):
+        _emit(name, level, fields)
+
+
+def _emit(name, level, fields):
+    logger.log(level, Event(name, fields), extra={'event': name, 'fields': fields})
+
+
+class RequestSummary:
+    __slots__ = ('fields', 'timings', 'started')
+
+    def __init__(self):
+        self.fields = {}
+        self.timings = {}
+        self.started = time.perf_counter()
+
+
+def begin_request():
+    summary = RequestSummary()
+    _summary.set(summary)
+    return summary
+
+
+def annotate(**fields):
+    """Add fields to the current request's summary record"""
+    summary = _summary.get()
+    if summary is not None:
+        summary.fields.update(fields)
+
+
+@contextmanager
+def timed(step):
+    """Record how long the block took, in ms, under ``timings.<step>`` of the summary"""
+    summary = _summary.get()
+    if summary is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        summary.timings[step] = round((time.perf_counter() - started) * 1000, 3)
+
+
+def end_request(summary, **fields):
+    """Close a request's summary and write it; 4xx/5xx responses are never sampled out"""
+    _summary.set(None)
+    status_code = fields.get('status', 0)
+    level = logging.ERROR if status_code >= 500 else logging.WARNING if status_code >= 400 else logging.INFO
+    if level == logging.INFO and not log_enabled('request.summary', level):
+        return
+    if not logger.isEnabledFor(level):
+        return
+    fields['duration_ms'] = round((time.perf_counter() - summary.started) * 1000, 3)
+    fields.update(summary.fields)
+    if summary.timings:
+        fields['timings'] = summary.timings
+    _emit('request.summary', level, fields)
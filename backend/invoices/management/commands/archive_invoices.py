@@ -0,0 +1,52 @@
+import datetime
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.partitioning import (
+    PartitioningError, add_intervals, detach_period, export_partition, partitions_before,
+)
+
+
+class Command(BaseCommand):
+    help = "Archive invoice partitions older than a cutoff by detaching them or exporting them to gzip'd CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=datetime.date.fromisoformat, default=None,
+                            help="Archive partitions ending on or before this date (YYYY-MM-DD)")
+        parser.add_argument('--months', type=int, default=settings.INVOICE_ARCHIVE_AFTER_MONTHS,
+                            help="Archive partitions older than this many months when --before is not given")
+        parser.add_argument('--mode', choices=['detach', 'export'], default='detach',
+                            help="detach: keep old partitions as standalone tables; "
+                                 "export: write them to compressed files and drop them")
+        parser.add_argument('--output-dir', default=settings.INVOICE_ARCHIVE_DIR)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        cutoff = options['before'] or add_intervals(datetime.date.today(), 'month', -options['months'])
+        try:
+            periods = partitions_before(cutoff)
+        except PartitioningError as e:
+            raise CommandError(str(e))
+
+        if not periods:
+            self.stdout.write(f"No partitions end on or before {cutoff}")
+            return
+
+        for lower, upper, invoice_partition, item_partition in periods:
+            label = f"[{lower}, {upper}) {invoice_partition}"
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {label}")
+                continue
+
+            if options['mode'] == 'export':
+                directory = os.path.join(options['output_dir'], f"{lower:%Y_%m}")
+                for partition in filter(None, (invoice_partition, item_partition)):
+                    path = export_partition(partition, directory)
+                    self.stdout.write(f"Exported {partition} to {path}")
+                detach_period(invoice_partition, item_partition, drop=True)
+                self.stdout.write(self.style.SUCCESS(f"Archived and dropped {label}"))
+            else:
+                detach_period(invoice_partition, item_partition)
+                self.stdout.write(self.style.SUCCESS(f"Detached {label}"))
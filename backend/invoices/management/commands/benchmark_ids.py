@@ -0,0 +1,72 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from psycopg2.extras import execute_values
+
+from invoices.ids import uuid7
+
+GENERATORS = {'uuid4': uuid.uuid4, 'uuid7': uuid7}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare insert rate and index size of uuid4 and uuid7 keys on a scratch "
+        "table shaped like invoices_invoiceitem (PostgreSQL only)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help="Rows to insert per key type (use 10000000 for the billing-run size)")
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--invoices', type=int, default=50_000,
+                            help="Distinct invoice ids the rows reference")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("benchmark_ids needs PostgreSQL")
+        for name, generate in GENERATORS.items():
+            self.run(name, generate, options)
+
+    def run(self, name, generate, options):
+        table = f"bench_ids_{name}"
+        invoice_ids = [generate() for _ in range(options['invoices'])]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(
+                f"CREATE UNLOGGED TABLE {table} ("
+                "id uuid PRIMARY KEY, invoice_id uuid NOT NULL, "
+                "description varchar(500) NOT NULL, amount numeric(10, 2) NOT NULL)"
+            )
+            cursor.execute(f"CREATE INDEX {table}_invoice_idx ON {table} (invoice_id)")
+
+        # Items of one invoice arrive together, as they do in billing runs
+        per_invoice = max(options['rows'] // len(invoice_ids), 1)
+        inserted, elapsed = 0, 0.0
+        while inserted < options['rows']:
+            count = min(options['batch_size'], options['rows'] - inserted)
+            rows = [
+                (generate(), invoice_ids[(inserted + offset) // per_invoice % len(invoice_ids)],
+                 'Consulting hours', 180)
+                for offset in range(count)
+            ]
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                execute_values(cursor, f"INSERT INTO {table} VALUES %s", rows, page_size=count)
+            elapsed += time.perf_counter() - started
+            inserted += count
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_relation_size(%s), pg_relation_size(%s), pg_relation_size(%s)",
+                [table, f"{table}_pkey", f"{table}_invoice_idx"],
+            )
+            heap, pkey, fk_index = cursor.fetchone()
+            cursor.execute(f"DROP TABLE {table}")
+
+        mb = 1024 * 1024
+        self.stdout.write(
+            f"{name}: {inserted / elapsed:,.0f} rows/s   heap {heap / mb:,.1f} MB   "
+            f"pkey {pkey / mb:,.1f} MB   invoice_id index {fk_index / mb:,.1f} MB"
+        )
@@ -0,0 +1,54 @@
+import logging
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+
+from invoices.management.commands.benchmark_validation import invoice_payload
+
+
+class Command(BaseCommand):
+    help = (
+        "Time POST /api/invoices/create-from-form/ at different log levels. "
+        "Each request runs in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=200, help="Items per invoice (default: 200)")
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per log level")
+        parser.add_argument('--levels', nargs='+', default=['DEBUG', 'INFO', 'WARNING'])
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST='localhost')
+        payload = invoice_payload(options['items'])
+        invoices_logger = logging.getLogger('invoices')
+        saved = invoices_logger.level, invoices_logger.handlers
+        # Records are still formatted and written, just not to the terminal
+        devnull = open(os.devnull, 'w')
+        handler = logging.StreamHandler(devnull)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+        invoices_logger.handlers = [handler]
+        try:
+            for level in options['levels']:
+                invoices_logger.setLevel(level)
+                runs = []
+                for _ in range(options['repeat'] + 1):
+                    with transaction.atomic():
+                        started = time.perf_counter()
+                        response = client.post('/api/invoices/create-from-form/', payload, content_type='application/json')
+                        runs.append(time.perf_counter() - started)
+                        transaction.set_rollback(True)
+                    if response.status_code != 201:
+                        raise SystemExit(f"Request failed ({response.status_code}): {response.content[:500]}")
+                runs = runs[1:]
+                self.stdout.write(
+                    f"{level:<8} {options['items']} items   median {statistics.median(runs) * 1000:8.2f} ms   "
+                    f"min {min(runs) * 1000:8.2f} ms"
+                )
+        finally:
+            invoices_logger.setLevel(saved[0])
+            invoices_logger.handlers = saved[1]
+            devnull.close()
@@ -0,0 +1,70 @@
+import datetime
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from invoices.models import Client, Company, RecurringInvoice, RecurringInvoiceItem
+from invoices.recurring import generate_due_invoices
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Time generate_recurring over many due schedules, then roll everything back"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedules', type=int, default=100_000)
+        parser.add_argument('--items', type=int, default=3, help="Items per schedule")
+        parser.add_argument('--clients', type=int, default=1000)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        today = datetime.date.today()
+        tag = uuid.uuid4().hex[:8]
+        company = Company.objects.create(
+            name=f"Benchmark {tag}", address='1 Main St', city='Springfield', state='IL', zip_code='62701',
+            country='US', email='billing@bench.test', phone='555-0100',
+            invoice_number_format=f"REC-{tag}-{{YYYY}}-{{seq:06d}}",
+        )
+        clients = Client.objects.bulk_create([
+            Client(name=f"Client {index}", address='2 Side St', city='Shelbyville', state='IL',
+                   zip_code='62565', country='US', email=f"client{index}@bench.test", phone='555-0101')
+            for index in range(options['clients'])
+        ])
+        # Every schedule is due exactly once today
+        templates = RecurringInvoice.objects.bulk_create([
+            RecurringInvoice(company=company, client=clients[index % len(clients)], start_date=today,
+                             next_run_date=today, tax_rate=10)
+            for index in range(options['schedules'])
+        ], batch_size=5000)
+        RecurringInvoiceItem.objects.bulk_create([
+            RecurringInvoiceItem(template=template, description=f"Subscription line {position + 1}",
+                                 quantity='1.00', rate='49.50', position=position)
+            for template in templates for position in range(options['items'])
+        ], batch_size=5000)
+
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            processed, created = generate_due_invoices(today, options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f"{processed:,} schedules -> {created:,} invoices in {elapsed:.2f}s "
+            f"({created / elapsed:,.0f} invoices/s, {len(queries)} queries)"
+        )
+
+        started = time.perf_counter()
+        processed, created = generate_due_invoices(today, options['chunk_size'])
+        self.stdout.write(f"Re-run: {created} invoices from {processed} schedules in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,134 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter under ``python -X importtime``; prints the
+# milliseconds spent per boot phase as JSON on its last line
+CHILD = """
+import json, sys, time
+preload, warm, path = json.loads(sys.argv[1])
+phases = {}
+started = time.perf_counter()
+
+def step(name):
+    global started
+    now = time.perf_counter()
+    phases[name] = (now - started) * 1000
+    started = now
+
+import django
+from django.conf import settings
+settings.INSTALLED_APPS
+step('settings')
+django.setup(set_prefix=False)
+step('setup')
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+step('application')
+if preload:
+    from invoices.warmup import preload as preload_app
+    preload_app()
+    step('preload')
+if warm:
+    from invoices.warmup import warm_connections
+    warm_connections()
+    step('connections')
+if path:
+    from django.test import Client
+    host = next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+    Client(HTTP_HOST=host).get(path)
+    step('first_request')
+print(json.dumps(phases))
+"""
+
+PHASES = ('settings', 'setup', 'application', 'preload', 'connections', 'first_request')
+
+
+def parse_importtime(stderr):
+    """``[(module, depth, self_us, cumulative_us)]`` from ``-X importtime`` output"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Time how long a web worker takes to boot, cold and with the app "
+        "preloaded, and report import time per module. Each run is a fresh "
+        "interpreter using this command's settings (pass --settings)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Boots per mode (default: 5)")
+        parser.add_argument('--top', type=int, default=25, help="Modules to list by import time (default: 25)")
+        parser.add_argument('--request', metavar='PATH', help="Also time a first GET of PATH, e.g. /api/stats/")
+        parser.add_argument('--no-db', action='store_true', help="Don't connect to the database")
+
+    def boot(self, preload, warm, path):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', CHILD, json.dumps([preload, warm, path])],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Worker failed to boot:\n{result.stderr[-2000:]}")
+        return json.loads(result.stdout.strip().splitlines()[-1]), parse_importtime(result.stderr)
+
+    def handle(self, *args, **options):
+        warm = not options['no_db']
+        path = None if options['no_db'] else options['request']
+        cold, preloaded = defaultdict(list), defaultdict(list)
+        self_times, cumulative_times, depths = defaultdict(list), defaultdict(list), {}
+        for _ in range(options['repeat']):
+            phases, _ = self.boot(True, warm, path)
+            for name, value in phases.items():
+                preloaded[name].append(value)
+            phases, imports = self.boot(False, False, path)
+            for name, value in phases.items():
+                cold[name].append(value)
+            for module, depth, self_us, cumulative_us in imports:
+                self_times[module].append(self_us)
+                cumulative_times[module].append(cumulative_us)
+                depths[module] = depth
+
+        def median(runs, name):
+            return statistics.median(runs[name]) if name in runs else None
+
+        def cell(value):
+            return f"{value:10.1f}" if value is not None else f"{'-':>10}"
+
+        self.stdout.write(f"Boot phases, median of {options['repeat']} runs (ms)")
+        self.stdout.write(f"  {'phase':<16}{'cold':>10}{'preloaded':>10}")
+        for name in PHASES:
+            if name in cold or name in preloaded:
+                self.stdout.write(f"  {name:<16}{cell(median(cold, name))}{cell(median(preloaded, name))}")
+        cold_total = sum(median(cold, name) for name in cold)
+        # With preload_app, everything up to and including 'preload' runs once in the master
+        after_fork = sum(median(preloaded, name) for name in ('connections', 'first_request') if name in preloaded)
+        self.stdout.write(f"  {'worker total':<16}{cell(cold_total)}{cell(after_fork)}   (preloaded: after fork)")
+
+        self.stdout.write("\nSlowest imports, cold boot (ms, median)")
+        self.stdout.write(f"  {'cumulative':>10}{'self':>10}  module")
+        slowest = sorted(cumulative_times, key=lambda module: statistics.median(cumulative_times[module]), reverse=True)
+        for module in slowest[:options['top']]:
+            self.stdout.write(
+                f"  {statistics.median(cumulative_times[module]) / 1000:10.1f}"
+                f"{statistics.median(self_times[module]) / 1000:10.1f}  {'  ' * depths[module]}{module}"
+            )
+
+        packages = defaultdict(float)
+        for module, runs in self_times.items():
+            packages[module.split('.')[0]] += statistics.median(runs) / 1000
+        self.stdout.write("\nImport time per top-level package (ms, sum of self times)")
+        for package, total in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options['top']]:
+            self.stdout.write(f"  {total:10.1f}  {package}")
@@ -0,0 +1,87 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from invoices.models import Invoice
+from invoices.preflight import validate_batch
+from invoices.serializers import ClientSerializer, CompanySerializer, InvoiceCreateSerializer
+
+
+def invoice_payload(item_count):
+    items = [
+        {'description': f"Consulting hours, week {index + 1}", 'quantity': '1.50', 'rate': '120.00', 'amount': '180.00'}
+        for index in range(item_count)
+    ]
+    subtotal = 180 * item_count
+    return {
+        'company_name': 'Acme Consulting', 'company_city': 'Springfield', 'company_country': 'US',
+        'client_name': 'Globex', 'client_city': 'Shelbyville', 'client_country': 'US',
+        'invoice_date': '2024-01-01', 'due_date': '2024-01-31',
+        'subtotal': f"{subtotal:.2f}", 'tax_rate': '10.00',
+        'tax_amount': f"{subtotal / 10:.2f}", 'total': f"{subtotal * 1.1:.2f}",
+        'items': items,
+    }
+
+
+PARTY = {
+    'name': 'Acme Consulting', 'address': '1 Main St', 'city': 'Springfield', 'state': 'IL',
+    'zip_code': '62701', 'country': 'US', 'email': 'billing@acme.test', 'phone': '555-0100',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Time serializer is_valid() on large invoice payloads (no database access), "
+        "or with --batch, validate-batch over many payloads"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=500, help="Items per invoice (default: 500)")
+        parser.add_argument('--repeat', type=int, default=50, help="Timed runs per serializer")
+        parser.add_argument('--batch', type=int, help="Time validate-batch over this many payloads instead (e.g. 10000)")
+
+    def timed(self, label, serializer_class, payload, repeat):
+        runs = []
+        for _ in range(repeat + 1):
+            serializer = serializer_class(data=payload)
+            started = time.perf_counter()
+            valid = serializer.is_valid()
+            runs.append(time.perf_counter() - started)
+            if not valid:
+                raise SystemExit(f"{label} payload did not validate: {serializer.errors}")
+        runs = runs[1:]  # the first run builds field caches
+        self.stdout.write(
+            f"{label:<28} median {statistics.median(runs) * 1000:8.3f} ms   "
+            f"min {min(runs) * 1000:8.3f} ms"
+        )
+
+    def handle(self, *args, **options):
+        if options['batch']:
+            return self.batch(options['batch'], min(options['items'], 5))
+        repeat = options['repeat']
+        self.timed(f"InvoiceCreate ({options['items']} items)", InvoiceCreateSerializer,
+                   invoice_payload(options['items']), repeat)
+        self.timed("Company", CompanySerializer, PARTY, repeat * 20)
+        self.timed("Client", ClientSerializer, PARTY, repeat * 20)
+
+    def batch(self, count, item_count):
+        payloads = [{**invoice_payload(item_count), 'invoice_number': f"PREFLIGHT-{index:06d}"} for index in range(count)]
+
+        started = time.perf_counter()
+        for payload in payloads:
+            InvoiceCreateSerializer(data=payload).is_valid()
+            Invoice.objects.filter(invoice_number=payload['invoice_number']).exists()
+        one_by_one = time.perf_counter() - started
+
+        started = time.perf_counter()
+        errors = validate_batch(payloads)
+        batched = time.perf_counter() - started
+        if errors:
+            raise SystemExit(f"{len(errors)} payload(s) did not validate, e.g. {next(iter(errors.values()))}")
+
+        for label, elapsed in (("one by one + exists()", one_by_one), ("validate_batch", batched)):
+            self.stdout.write(
+                f"{label:<28} {count} payloads ({item_count} items) in {elapsed:6.2f} s   "
+                f"{count / elapsed:10,.0f} payloads/s"
+            )
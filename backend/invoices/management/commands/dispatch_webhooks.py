@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from invoices.webhooks import dispatch
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox events to webhook endpoints (once, or continuously with --loop)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new events")
+        parser.add_argument('--interval', type=float, default=settings.WEBHOOK_POLL_INTERVAL,
+                            help="Seconds to sleep between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            fanned, delivered = dispatch()
+            if fanned or delivered or not options['loop']:
+                self.stdout.write(f"Fanned out {fanned} event(s), delivered {delivered}")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
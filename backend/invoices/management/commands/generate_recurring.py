@@ -0,0 +1,19 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from invoices.recurring import generate_due_invoices
+
+
+class Command(BaseCommand):
+    help = "Create the invoices of all recurring schedules that are due (safe to re-run or run in parallel)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=datetime.date.fromisoformat,
+                            help="Generate as of this date (YYYY-MM-DD, default today)")
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help="Schedules handled per transaction")
+
+    def handle(self, *args, **options):
+        processed, created = generate_due_invoices(options['date'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Created {created} invoice(s) from {processed} schedule(s)"))
@@ -0,0 +1,25 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.currency import load_rates
+
+
+class Command(BaseCommand):
+    help = (
+        "Import exchange rates from a CSV file with date (YYYY-MM-DD), currency and rate columns, "
+        "where rate is the value of one unit of the currency in INVOICE_BASE_CURRENCY. "
+        "Existing rates for the same currency and date are replaced."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV file, with a header row")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rates per INSERT")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='', encoding='utf-8') as source:
+                count = load_rates(csv.DictReader(source), options['batch_size'])
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(f"Loaded {count} exchange rate(s)"))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from invoices.catalog import match_existing_items
+
+
+class Command(BaseCommand):
+    help = (
+        "Link invoice items without a product to the catalog product matching their description, "
+        "in batches. With --create, add a product for every description that has none."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Items per query and transaction")
+        parser.add_argument('--create', action='store_true', help="Create missing products from descriptions")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        items = linked = created = 0
+        for batch in match_existing_items(options['batch_size'], options['create']):
+            items += batch.items
+            linked += batch.linked
+            created += batch.created
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{items} item(s) checked, {linked} linked")
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Linked {linked} of {items} unlinked item(s) and created {created} product(s) in {elapsed:.1f}s"
+        ))
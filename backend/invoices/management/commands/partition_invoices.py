@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from invoices.partitioning import (
+    INTERVALS, PARTITIONED_TABLES, PartitioningError, convert_to_partitioned,
+    ensure_future_partitions, is_partitioned, list_partitions,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Partition invoices and items by invoice_date and create upcoming partitions. "
+        "Run with --convert once, then regularly (e.g. daily from cron) without it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help="Rebuild the existing tables as partitioned tables")
+        parser.add_argument('--accept-schema-changes', action='store_true',
+                            help="Confirm --convert may drop foreign keys into invoices_invoice and add "
+                                 "invoice_date to its keys (see invoices/partitioning.py)")
+        parser.add_argument('--interval', choices=INTERVALS, default=None,
+                            help="Partition width (default: INVOICE_PARTITION_INTERVAL)")
+        parser.add_argument('--ahead', type=int, default=None,
+                            help="Number of future intervals to keep ready (default: INVOICE_PARTITIONS_AHEAD)")
+        parser.add_argument('--list', action='store_true', help="List existing partitions")
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.INVOICE_PARTITION_INTERVAL
+        try:
+            if options['convert']:
+                dropped = convert_to_partitioned(
+                    interval=interval, ahead=options['ahead'], accept_schema_changes=options['accept_schema_changes'],
+                )
+                self.stdout.write(self.style.SUCCESS(f"Converted {', '.join(PARTITIONED_TABLES)} to {interval} partitions"))
+                for source, name in dropped:
+                    self.stdout.write(self.style.WARNING(f"Dropped foreign key {name} on {source}"))
+            else:
+                created = ensure_future_partitions(ahead=options['ahead'], interval=interval)
+                self.stdout.write(f"Created {len(created)} partition(s)")
+                for name in created:
+                    self.stdout.write(f"  {name}")
+        except PartitioningError as e:
+            raise CommandError(str(e))
+
+        if options['list']:
+            with connection.cursor() as cursor:
+                for table in PARTITIONED_TABLES:
+                    if not is_partitioned(cursor, table):
+                        continue
+                    self.stdout.write(f"{table}:")
+                    for name, lower, upper in list_partitions(cursor, table):
+                        self.stdout.write(f"  {name}  [{lower}, {upper})")
@@ -0,0 +1,55 @@
+import io
+import pstats
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.profiling import artifact_dir, load_artifacts
+
+
+class Command(BaseCommand):
+    help = "Summarize profiled requests (see INVOICE_PROFILING_ENABLED), slowest first"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24, help="Only requests from the last N hours (default: 24)")
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--path', default=None, help="Only requests whose path starts with this")
+        parser.add_argument('--show', metavar='ID', default=None,
+                            help="Print the top functions and slowest SQL of one profiled request")
+
+    def handle(self, *args, **options):
+        if options['show']:
+            return self.show(options['show'])
+
+        artifacts = load_artifacts(since=time.time() - options['hours'] * 3600)
+        if options['path']:
+            artifacts = [meta for meta in artifacts if meta['path'].startswith(options['path'])]
+        if not artifacts:
+            self.stdout.write(f"No profiled requests in {artifact_dir()}")
+            return
+        artifacts.sort(key=lambda meta: meta['duration_ms'], reverse=True)
+        self.stdout.write(f"{'total ms':>10} {'sql ms':>9} {'queries':>7}  status  request / id")
+        for meta in artifacts[:options['limit']]:
+            self.stdout.write(
+                f"{meta['duration_ms']:>10.1f} {meta['sql_ms']:>9.1f} {meta['sql_count']:>7}  "
+                f"{meta['status']:>6}  {meta['method']} {meta['path']}\n{'':>38}{meta['id']}"
+            )
+
+    def show(self, artifact_id):
+        directory = artifact_dir() / artifact_id
+        if not (directory / 'meta.json').exists():
+            raise CommandError(f"No profile {artifact_id} in {artifact_dir()}")
+        meta = next(meta for meta in load_artifacts() if Path(meta['directory']) == directory)
+        self.stdout.write(
+            f"{meta['method']} {meta['path']} -> {meta['status']} in {meta['duration_ms']:.1f} ms, "
+            f"{meta['sql_count']} queries taking {meta['sql_ms']:.1f} ms\n"
+        )
+        self.stdout.write("Slowest SQL:")
+        for query in meta['slowest_sql']:
+            self.stdout.write(f"  {query['ms']:>8.3f} ms  {query['origin']}\n      {query['sql'][:300]}")
+        out = io.StringIO()
+        pstats.Stats(str(directory / 'profile.pstats'), stream=out).sort_stats('cumulative').print_stats(25)
+        self.stdout.write("\nTop functions by cumulative time:")
+        self.stdout.write(out.getvalue())
+        self.stdout.write(f"Full SQL log: {directory / 'sql.log'}")
@@ -0,0 +1,69 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from invoices.deletion import purge_batch
+from invoices.models import Invoice
+
+
+def parse_window(value):
+    """``"HH:MM-HH:MM"`` as a pair of times; the window may wrap past midnight"""
+    try:
+        start, end = (datetime.time.fromisoformat(part.strip()) for part in value.split('-'))
+    except ValueError:
+        raise CommandError(f"Invalid window {value!r}, expected HH:MM-HH:MM")
+    return start, end
+
+
+def in_window(window, now):
+    start, end = window
+    if start <= end:
+        return start <= now < end
+    return now >= start or now < end
+
+
+class Command(BaseCommand):
+    help = (
+        "Hard-delete soft-deleted invoices (with their items, snapshots and deliveries) "
+        "in small batches, during the quiet-hours window. Run from cron at the window's start."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=settings.INVOICE_PURGE_AFTER_DAYS,
+                            help="Only invoices deleted at least this many days ago")
+        parser.add_argument('--batch-size', type=int, default=settings.INVOICE_PURGE_BATCH_SIZE,
+                            help="Invoices per transaction")
+        parser.add_argument('--pause', type=float, default=settings.INVOICE_PURGE_PAUSE,
+                            help="Seconds to wait between batches")
+        parser.add_argument('--window', default=settings.INVOICE_PURGE_WINDOW,
+                            help="Local time window to work in, HH:MM-HH:MM (empty: any time)")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be purged")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - datetime.timedelta(days=options['older_than'])
+        if options['dry_run']:
+            count = Invoice.all_objects.filter(deleted_at__lt=before).count()
+            self.stdout.write(f"{count} invoice(s) deleted before {before:%Y-%m-%d %H:%M} would be purged")
+            return
+
+        window = parse_window(options['window']) if options['window'] else None
+        started = time.perf_counter()
+        purged = batches = 0
+        while True:
+            if window and not in_window(window, timezone.localtime().time()):
+                self.stdout.write(f"Outside the purge window {options['window']}, stopping")
+                break
+            count = purge_batch(before, options['batch_size'])
+            if not count:
+                break
+            purged += count
+            batches += 1
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"Batch {batches}: purged {count} invoice(s)")
+            time.sleep(options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {purged} invoice(s) in {batches} batch(es), {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,42 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from invoices.reconcile import reconcile_totals
+
+
+class Command(BaseCommand):
+    help = "Check stored invoice subtotal, tax and total against the items, and optionally repair them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10_000, help="Invoices per query and transaction")
+        parser.add_argument('--tolerance', type=Decimal, default=Decimal('0.01'),
+                            help="Allowed difference for tax and total (0 for an exact check)")
+        parser.add_argument('--repair', action='store_true', help="Rewrite mismatched totals of drafts from the items (issued invoices are only listed)")
+        parser.add_argument('--show', type=int, default=50, help="Mismatches to list")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        invoices = items = mismatched = repaired = 0
+        for chunk in reconcile_totals(options['chunk_size'], options['tolerance'], options['repair']):
+            invoices += chunk.invoices
+            items += chunk.items
+            repaired += chunk.repaired
+            for mismatch in chunk.mismatches:
+                if mismatched < options['show']:
+                    self.stdout.write(
+                        f"{mismatch.invoice_number} ({mismatch.invoice_id}, {mismatch.status}): "
+                        f"stored {'/'.join(map(str, mismatch.stored))}, "
+                        f"expected {'/'.join(map(str, mismatch.expected))}"
+                    )
+                mismatched += 1
+        elapsed = time.perf_counter() - started
+        outcome = f"{mismatched} of {invoices} invoice(s) mismatched"
+        if options['repair']:
+            outcome += f", {repaired} draft(s) repaired, {mismatched - repaired} issued invoice(s) left unchanged"
+        style = self.style.WARNING if mismatched > repaired else self.style.SUCCESS
+        self.stdout.write(style(
+            f"{outcome}; {items} item(s) in {elapsed:.1f}s "
+            f"({items / elapsed * 60 if elapsed else 0:,.0f} items/min)"
+        ))
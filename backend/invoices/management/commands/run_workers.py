@@ -0,0 +1,69 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from invoices.jobs import default_worker_id, requeue_stale, work
+
+
+def _worker_main(index, stop_event, poll_interval, burst):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    work(f"{default_worker_id()}/{index}", stop_event, poll_interval, burst)
+
+
+class Command(BaseCommand):
+    help = "Run background job workers that process the database job queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.JOB_WORKERS,
+                            help="Number of worker processes (default: JOB_WORKERS)")
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+                            help="Seconds to wait when the queue is empty")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once the queue is empty instead of polling forever")
+
+    def handle(self, *args, **options):
+        # Workers are forked so they inherit the configured Django process;
+        # never share an open database connection across the fork
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        stop_event = context.Event()
+        worker_args = (stop_event, options['poll_interval'], options['burst'])
+
+        def start(index):
+            process = context.Process(target=_worker_main, args=(index, *worker_args), daemon=True)
+            process.start()
+            return process
+
+        def shutdown(signum, frame):
+            self.stdout.write("Stopping workers...")
+            stop_event.set()
+
+        signal.signal(signal.SIGINT, shutdown)
+        signal.signal(signal.SIGTERM, shutdown)
+
+        processes = {index: start(index) for index in range(options['workers'])}
+        self.stdout.write(f"Started {len(processes)} worker(s)")
+
+        next_requeue = 0
+        while processes and not stop_event.is_set():
+            if time.monotonic() >= next_requeue:
+                requeue_stale()
+                connections.close_all()
+                next_requeue = time.monotonic() + settings.JOB_LEASE_TIMEOUT / 10
+            stop_event.wait(1)
+            for index, process in list(processes.items()):
+                if process.is_alive():
+                    continue
+                if options['burst'] or process.exitcode == 0:
+                    del processes[index]
+                else:
+                    self.stderr.write(f"Worker {index} exited with {process.exitcode}; restarting")
+                    processes[index] = start(index)
+
+        for process in processes.values():
+            process.join()
+        self.stdout.write(self.style.SUCCESS("Workers stopped"))
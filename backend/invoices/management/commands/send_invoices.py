@@ -0,0 +1,55 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from invoices.emailing import chunked, send_invoices
+from invoices.jobs import enqueue
+from invoices.models import Invoice
+
+
+class Command(BaseCommand):
+    help = "Email invoices to their clients in batches, reusing one SMTP connection per batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ids', nargs='+', default=None, help="Invoice ids to send")
+        parser.add_argument('--status', default='draft',
+                            help="Send invoices with this status when --ids is not given (default: draft)")
+        parser.add_argument('--from', dest='date_from', type=datetime.date.fromisoformat, default=None,
+                            help="Only invoices dated on or after this date")
+        parser.add_argument('--to', dest='date_to', type=datetime.date.fromisoformat, default=None,
+                            help="Only invoices dated on or before this date")
+        parser.add_argument('--batch-size', type=int, default=settings.INVOICE_EMAIL_BATCH_SIZE)
+        parser.add_argument('--concurrency', type=int, default=settings.INVOICE_EMAIL_CONCURRENCY,
+                            help="Maximum number of SMTP connections open at once")
+        parser.add_argument('--enqueue', action='store_true',
+                            help="Queue one background job per batch instead of sending now")
+
+    def handle(self, *args, **options):
+        if options['ids']:
+            invoices = Invoice.objects.filter(id__in=options['ids'])
+        else:
+            invoices = Invoice.objects.filter(status=options['status'])
+        if options['date_from']:
+            invoices = invoices.filter(invoice_date__gte=options['date_from'])
+        if options['date_to']:
+            invoices = invoices.filter(invoice_date__lte=options['date_to'])
+        invoice_ids = [str(pk) for pk in invoices.order_by('invoice_date').values_list('id', flat=True)]
+
+        if not invoice_ids:
+            self.stdout.write("No invoices to send")
+            return
+
+        if options['enqueue']:
+            jobs = [
+                enqueue('send_invoice_emails', {'invoice_ids': batch})
+                for batch in chunked(invoice_ids, options['batch_size'])
+            ]
+            self.stdout.write(self.style.SUCCESS(f"Queued {len(invoice_ids)} invoice(s) in {len(jobs)} job(s)"))
+            return
+
+        totals = send_invoices(invoice_ids, options['batch_size'], options['concurrency'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {totals['sent']}, failed {totals['failed']}, skipped {totals['already_sent']} already sent, "
+            f"marked {totals['marked_sent']} as sent"
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from invoices.emailing import chunked
+from invoices.models import Invoice
+from invoices.snapshots import capture_snapshots
+
+
+class Command(BaseCommand):
+    help = "Capture snapshots of non-draft invoices that have none (e.g. issued before snapshots existed)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.exclude(status='draft').filter(snapshot__isnull=True)
+        invoice_ids = list(invoices.values_list('id', flat=True).iterator())
+        written = 0
+        for batch in chunked(invoice_ids, options['batch_size']):
+            written += capture_snapshots(batch)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} snapshot(s) for {len(invoice_ids)} invoice(s)"))
@@ -0,0 +1,52 @@
+import json
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+from invoices.webhooks import SIGNATURE_HEADER, verify_signature
+
+
+class Command(BaseCommand):
+    help = "Run a local stand-in webhook receiver that verifies signatures and prints events"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--secret', default='', help="Endpoint secret to verify signatures with")
+        parser.add_argument('--fail-rate', type=float, default=0.0,
+                            help="Fraction of requests to answer with 500, to exercise retries")
+
+    def handle(self, *args, **options):
+        command = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if options['secret'] and not verify_signature(
+                    options['secret'], self.headers.get(SIGNATURE_HEADER, ''), body
+                ):
+                    command.stderr.write("Rejected request with a bad signature")
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+                if random.random() < options['fail_rate']:
+                    command.stdout.write("Simulating a failure")
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                for event in json.loads(body).get('events', []):
+                    command.stdout.write(f"#{event['id']} {event['type']} {event['data'].get('invoice_number')}")
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), Handler)
+        self.stdout.write(f"Listening on http://127.0.0.1:{options['port']}/")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,222 @@
+import cProfile
+import time
+import uuid
+from contextlib import ExitStack
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from .admission import WriteSlots, client_key, count, take_token
+from .logs import annotate, begin_request, end_request
+from .tenancy import activate
+from .profiling import QueryRecorder, write_artifact
+
+
+class RequestSummaryMiddleware(MiddlewareMixin):
+    """Write one ``request.summary`` log record per API request"""
+
+    def process_request(self, request):
+        if settings.INVOICE_LOG_SUMMARY and request.path.startswith(settings.INVOICE_LOG_SUMMARY_PATH):
+            request._log_summary = begin_request()
+
+    def process_response(self, request, response):
+        summary = getattr(request, '_log_summary', None)
+        if summary is not None:
+            del request._log_summary
+            end_request(
+                summary,
+                method=request.method,
+                path=request.path,
+                status=response.status_code,
+                remote_addr=request.META.get('REMOTE_ADDR', 'unknown'),
+            )
+        return response
+
+
+class TenantMiddleware:
+    """
+    Activate the company named by the ``INVOICE_TENANT_HEADER`` header for
+    the request, scoping invoice and client queries to it (see
+    invoices/tenancy.py). Invalid ids get 400. Whether the user may act
+    for the company, or without one, is checked by ``TenantMember``
+    (invoices.permissions), once DRF has authenticated the request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.INVOICE_TENANT_HEADER.upper().replace('-', '_')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def resolve(self, request):
+        """Return (company id or None, error response or None)"""
+        value = request.META.get(self.header)
+        if not value:
+            return None, None
+        try:
+            company_id = uuid.UUID(value)
+        except ValueError:
+            return None, self.error(f"Invalid {settings.INVOICE_TENANT_HEADER} header")
+        annotate(tenant=str(company_id))
+        return company_id, None
+
+    def error(self, message):
+        return JsonResponse({"success": False, "message": message}, status=400)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        company_id, error = self.resolve(request)
+        if error is not None:
+            return error
+        with activate(company_id):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        company_id, error = self.resolve(request)
+        if error is not None:
+            return error
+        with activate(company_id):
+            return await self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Profile a request when ``INVOICE_PROFILING_ENABLED`` is on and a staff
+    user sends the ``INVOICE_PROFILING_HEADER`` header or ``?profile=1``.
+    The artifact id is returned in ``X-Profile-Id``. Removed from the
+    middleware chain entirely when profiling is disabled.
+
+    Under ASGI a profiled request runs the rest of the chain from a worker
+    thread, so the sync view it ends in runs in that same thread, where
+    the profiler and query recorders are installed.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.INVOICE_PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.header = 'HTTP_' + settings.INVOICE_PROFILING_HEADER.upper().replace('-', '_')
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def flagged(self, request):
+        return bool(request.META.get(self.header)) or request.GET.get('profile') == '1'
+
+    def is_staff(self, request):
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.flagged(request) or not self.is_staff(request):
+            return self.get_response(request)
+        return self.profile(request, self.get_response)
+
+    async def __acall__(self, request):
+        # request.user loads the session and user, so check it off the event loop
+        if not self.flagged(request) or not await sync_to_async(self.is_staff)(request):
+            return await self.get_response(request)
+        return await sync_to_async(self.profile)(request, async_to_sync(self.get_response))
+
+    def profile(self, request, get_response):
+        recorders = [QueryRecorder(alias) for alias in connections]
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for recorder in recorders:
+                stack.enter_context(connections[recorder.alias].execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                response = get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - started
+        response['X-Profile-Id'] = write_artifact(request, response, profiler, recorders, duration)
+        return response
+
+
+class AdmissionControlMiddleware:
+    """
+    Rate-limit write requests per client and cap how many run at once
+    (see invoices/admission.py). Over-limit requests get 429 with
+    ``Retry-After``. Reads pass straight through.
+
+    Under ASGI the checks run through ``sync_to_async``. Django runs all
+    of a request's thread-sensitive calls in one thread, so the view and
+    the slot release use the connection holding the slot's advisory lock.
+    """
+    sync_capable = True
+    async_capable = True
+    write_methods = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+
+    def __init__(self, get_response):
+        if not settings.INVOICE_RATE_LIMIT_ENABLED and not settings.INVOICE_WRITE_CONCURRENCY:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slots = WriteSlots(settings.INVOICE_WRITE_CONCURRENCY) if settings.INVOICE_WRITE_CONCURRENCY else None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def applies(self, request):
+        return request.method in self.write_methods and request.path.startswith(settings.INVOICE_ADMISSION_PATH)
+
+    def admit(self, request):
+        """Return (429 response, None), or (None, the slot taken or None)"""
+        if settings.INVOICE_RATE_LIMIT_ENABLED:
+            client = client_key(request)
+            decision = take_token(client)
+            if not decision.admitted:
+                return self.reject('throttled', decision.retry_after, client=client), None
+
+        slot = self.slots.acquire() if self.slots else None
+        if self.slots and slot is None:
+            return self.reject('shed', settings.INVOICE_SHED_RETRY_AFTER), None
+        count('admitted')
+        return None, slot
+
+    def release(self, slot):
+        if slot is not None:
+            self.slots.release(slot)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.applies(request):
+            return self.get_response(request)
+        rejection, slot = self.admit(request)
+        if rejection is not None:
+            return rejection
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(slot)
+
+    async def __acall__(self, request):
+        if not self.applies(request):
+            return await self.get_response(request)
+        rejection, slot = await sync_to_async(self.admit)(request)
+        if rejection is not None:
+            return rejection
+        try:
+            return await self.get_response(request)
+        finally:
+            await sync_to_async(self.release)(slot)
+
+    def reject(self, outcome, retry_after, **fields):
+        count(outcome)
+        annotate(admission=outcome, retry_after=retry_after, **fields)
+        response = JsonResponse(
+            {"success": False, "message": "Too many requests, retry later"}, status=429,
+        )
+        response['Retry-After'] = str(retry_after)
+        return response
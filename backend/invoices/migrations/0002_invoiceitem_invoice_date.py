@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_item_dates(apps, schema_editor):
+    Invoice = apps.get_model('invoices', 'Invoice')
+    InvoiceItem = apps.get_model('invoices', 'InvoiceItem')
+    InvoiceItem.objects.update(
+        invoice_date=Subquery(
+            Invoice.objects.filter(pk=OuterRef('invoice_id')).values('invoice_date')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='invoice_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_item_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='invoiceitem',
+            name='invoice_date',
+            field=models.DateField(editable=False),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0002_invoiceitem_invoice_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='company',
+            name='invoice_number_format',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.CreateModel(
+            name='InvoiceNumberCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(blank=True, max_length=7)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='number_counters', to='invoices.company')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='invoicenumbercounter',
+            constraint=models.UniqueConstraint(fields=('company', 'period'), name='unique_number_counter_period'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0004_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(blank=True, max_length=254)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('sent', 'Sent'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='invoices.invoice')),
+            ],
+            options={
+                'verbose_name_plural': 'Invoice deliveries',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
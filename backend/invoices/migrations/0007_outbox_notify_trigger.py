@@ -0,0 +1,51 @@
+from django.db import migrations
+
+# Publish every outbox event on the invoice_events channel for the SSE feed
+# (see invoices/events.py). NOTIFY payloads are capped at 8000 bytes, so
+# oversized events are announced by id only.
+CREATE_TRIGGER = """
+CREATE OR REPLACE FUNCTION invoices_notify_outbox_event() RETURNS trigger AS $$
+DECLARE
+    message text;
+BEGIN
+    message := json_build_object(
+        'id', NEW.id,
+        'type', NEW.event_type,
+        'created_at', NEW.created_at,
+        'data', NEW.payload
+    )::text;
+    IF octet_length(message) > 7900 THEN
+        message := json_build_object('id', NEW.id)::text;
+    END IF;
+    PERFORM pg_notify('invoice_events', message);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER invoices_outboxevent_notify
+AFTER INSERT ON invoices_outboxevent
+FOR EACH ROW EXECUTE FUNCTION invoices_notify_outbox_event();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS invoices_outboxevent_notify ON invoices_outboxevent;
+DROP FUNCTION IF EXISTS invoices_notify_outbox_event();
+"""
+
+
+def postgresql_only(sql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0006_webhook_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(postgresql_only(CREATE_TRIGGER), postgresql_only(DROP_TRIGGER)),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-19 09:58
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0007_outbox_notify_trigger'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.CheckConstraint(check=models.Q(('invoice_number__regex', '^\\s*$'), _negated=True), name='invoice_number_not_blank', violation_error_message='Invoice number cannot be empty'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.CheckConstraint(check=models.Q(('due_date__gte', models.F('invoice_date'))), name='invoice_due_date_after_invoice_date', violation_error_message='Due date cannot be before invoice date'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.CheckConstraint(check=models.Q(('subtotal__gte', 0)), name='invoice_subtotal_nonnegative', violation_error_message='Subtotal cannot be negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.CheckConstraint(check=models.Q(('tax_rate__gte', 0)), name='invoice_tax_rate_nonnegative', violation_error_message='Tax rate cannot be negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.CheckConstraint(check=models.Q(('tax_rate__lte', 100)), name='invoice_tax_rate_max', violation_error_message='Tax rate cannot exceed 100%%'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.CheckConstraint(check=models.Q(('tax_amount__gte', 0)), name='invoice_tax_amount_nonnegative', violation_error_message='Tax amount cannot be negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.CheckConstraint(check=models.Q(('total__gte', 0)), name='invoice_total_nonnegative', violation_error_message='Total cannot be negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.CheckConstraint(check=models.Q(('tax_amount__gte', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('subtotal'), '*', models.F('tax_rate')), '/', models.Value(100)), '-', models.Value(Decimal('0.01')))), ('tax_amount__lte', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('subtotal'), '*', models.F('tax_rate')), '/', models.Value(100)), '+', models.Value(Decimal('0.01'))))), name='invoice_tax_amount_matches_rate', violation_error_message="Tax amount calculation doesn't match tax rate"),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.CheckConstraint(check=models.Q(('total__gte', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('subtotal'), '+', models.F('tax_amount')), '-', models.Value(Decimal('0.01')))), ('total__lte', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('subtotal'), '+', models.F('tax_amount')), '+', models.Value(Decimal('0.01'))))), name='invoice_total_matches', violation_error_message="Total calculation doesn't match subtotal and tax"),
+        ),
+        migrations.AddConstraint(
+            model_name='invoiceitem',
+            constraint=models.CheckConstraint(check=models.Q(('description__regex', '^\\s*$'), _negated=True), name='item_description_not_blank', violation_error_message='Description cannot be empty'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoiceitem',
+            constraint=models.CheckConstraint(check=models.Q(('quantity__gt', 0)), name='item_quantity_positive', violation_error_message='Quantity must be greater than 0'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoiceitem',
+            constraint=models.CheckConstraint(check=models.Q(('quantity__lte', Decimal('999999.99'))), name='item_quantity_max', violation_error_message='Quantity cannot exceed 999,999.99'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoiceitem',
+            constraint=models.CheckConstraint(check=models.Q(('rate__gte', 0)), name='item_rate_nonnegative', violation_error_message='Rate cannot be negative'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoiceitem',
+            constraint=models.CheckConstraint(check=models.Q(('amount__gte', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('quantity'), '*', models.F('rate')), '-', models.Value(Decimal('0.005')))), ('amount__lte', django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('quantity'), '*', models.F('rate')), '+', models.Value(Decimal('0.005'))))), name='item_amount_matches', violation_error_message='Amount must equal quantity times rate'),
+        ),
+    ]
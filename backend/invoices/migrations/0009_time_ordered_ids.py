@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:04
+
+from django.db import migrations, models
+import invoices.ids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0008_check_constraints'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='client',
+            name='id',
+            field=models.UUIDField(default=invoices.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='company',
+            name='id',
+            field=models.UUIDField(default=invoices.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='id',
+            field=models.UUIDField(default=invoices.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='invoiceitem',
+            name='id',
+            field=models.UUIDField(default=invoices.ids.new_id, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
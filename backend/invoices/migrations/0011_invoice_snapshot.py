@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:07
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0010_invoice_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSnapshot',
+            fields=[
+                ('invoice', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='invoices.invoice')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('pdf', models.BinaryField(blank=True, null=True)),
+                ('captured_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+import invoices.ids
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0011_invoice_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringInvoice',
+            fields=[
+                ('id', models.UUIDField(default=invoices.ids.new_id, editable=False, primary_key=True, serialize=False)),
+                ('cadence', models.CharField(choices=[('weekly', 'Weekly'), ('monthly', 'Monthly'), ('quarterly', 'Quarterly'), ('yearly', 'Yearly')], default='monthly', max_length=10)),
+                ('start_date', models.DateField()),
+                ('next_run_date', models.DateField()),
+                ('run_count', models.PositiveIntegerField(default=0)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('payment_terms_days', models.PositiveSmallIntegerField(default=30)),
+                ('tax_rate', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('notes', models.TextField(blank=True)),
+                ('active', models.BooleanField(default=True)),
+                ('last_run_date', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['next_run_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecurringInvoiceItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(max_length=500)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['position', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='recurringinvoiceitem',
+            name='template',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='invoices.recurringinvoice'),
+        ),
+        migrations.AddField(
+            model_name='recurringinvoice',
+            name='client',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_invoices', to='invoices.client'),
+        ),
+        migrations.AddField(
+            model_name='recurringinvoice',
+            name='company',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_invoices', to='invoices.company'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='recurring',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to='invoices.recurringinvoice'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringinvoice',
+            index=models.Index(condition=models.Q(('active', True)), fields=['next_run_date'], name='recurring_due_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.UniqueConstraint(fields=('recurring', 'invoice_date'), name='unique_recurring_run'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:14
+
+from django.db import migrations, models
+
+# Buckets are rewritten on every write request and are worthless after a
+# crash, so skip the WAL for them
+SET_UNLOGGED = "ALTER TABLE invoices_ratelimitbucket SET UNLOGGED"
+SET_LOGGED = "ALTER TABLE invoices_ratelimitbucket SET LOGGED"
+
+
+def postgresql_only(sql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0012_recurring_invoices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated_at', models.DateTimeField()),
+                ('admitted', models.PositiveBigIntegerField(default=0)),
+                ('throttled', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(postgresql_only(SET_UNLOGGED), postgresql_only(SET_LOGGED)),
+    ]
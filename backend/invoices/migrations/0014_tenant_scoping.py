@@ -0,0 +1,121 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:21
+
+from django.db import migrations, models
+from django.db.migrations.exceptions import IrreversibleError
+import django.db.models.deletion
+from collections import defaultdict
+
+from invoices.partitioning import (
+    INVOICE_TABLE, NUMBER_CONSTRAINT, PARTITION_KEY, is_partitioned, track_invoice_numbers,
+)
+
+
+def assign_client_companies(apps, schema_editor):
+    """Give each client the company of its invoices, if they all belong to one"""
+    Client = apps.get_model('invoices', 'Client')
+    Invoice = apps.get_model('invoices', 'Invoice')
+    companies = defaultdict(set)
+    pairs = Invoice.objects.values_list('client_id', 'company_id').distinct().order_by()
+    for client_id, company_id in pairs.iterator(chunk_size=10_000):
+        companies[client_id].add(company_id)
+    by_company = defaultdict(list)
+    for client_id, company_ids in companies.items():
+        if len(company_ids) == 1:
+            by_company[company_ids.pop()].append(client_id)
+    for company_id, client_ids in by_company.items():
+        for start in range(0, len(client_ids), 5000):
+            Client.objects.filter(id__in=client_ids[start:start + 5000]).update(company_id=company_id)
+
+
+class UnlessPartitioned(migrations.SeparateDatabaseAndState):
+    """
+    Move invoice number uniqueness from the number to (company, number).
+
+    A table already converted by ``partition_invoices`` holds the old key
+    as (invoice_number, invoice_date) and can only take keys that include
+    invoice_date, so there the new key gets invoice_date too and the
+    ``invoices_invoicenumber`` table keeps numbers unique per company.
+    """
+
+    def __init__(self, operations):
+        super().__init__(database_operations=operations, state_operations=operations)
+
+    def partitioned(self, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return False
+        with schema_editor.connection.cursor() as cursor:
+            return is_partitioned(cursor, INVOICE_TABLE)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if not self.partitioned(schema_editor):
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, 'Invoice')
+        for name in schema_editor._constraint_names(model, ['invoice_number', PARTITION_KEY], unique=True, primary_key=False):
+            schema_editor.execute(f"ALTER TABLE {INVOICE_TABLE} DROP CONSTRAINT {schema_editor.quote_name(name)}")
+        like = schema_editor._create_index_name(INVOICE_TABLE, ['invoice_number'], suffix='_like')
+        schema_editor.execute(f"DROP INDEX IF EXISTS {schema_editor.quote_name(like)}")
+        schema_editor.execute(
+            f"ALTER TABLE {INVOICE_TABLE} ADD CONSTRAINT {NUMBER_CONSTRAINT} "
+            f"UNIQUE (company_id, invoice_number, {PARTITION_KEY})"
+        )
+        with schema_editor.connection.cursor() as cursor:
+            track_invoice_numbers(cursor)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if not self.partitioned(schema_editor):
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        raise IrreversibleError(
+            f"Invoice numbers of a partitioned {INVOICE_TABLE} can't go back to being unique across companies"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0013_rate_limit_buckets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='clients', to='invoices.company'),
+        ),
+        migrations.AlterField(
+            model_name='invoice',
+            name='company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='invoices', to='invoices.company'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['company', 'name'], name='client_company_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', '-created_at'], name='invoice_company_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'status'], name='invoice_company_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'invoice_date'], name='invoice_company_date_idx'),
+        ),
+        UnlessPartitioned([
+            migrations.AlterField(
+                model_name='invoice',
+                name='invoice_number',
+                field=models.CharField(max_length=50),
+            ),
+            migrations.AddConstraint(
+                model_name='invoice',
+                constraint=models.UniqueConstraint(fields=('company', 'invoice_number'), name='unique_company_invoice_number'),
+            ),
+        ]),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['invoice_number'], name='invoice_number_idx'),
+        ),
+        migrations.RunPython(assign_client_companies, migrations.RunPython.noop),
+    ]
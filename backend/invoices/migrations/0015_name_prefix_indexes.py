@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:40
+
+from django.db import migrations
+
+# Case-insensitive prefix matching for the typeahead endpoints
+# (UPPER(name) LIKE 'AB%'). text_pattern_ops makes LIKE usable with the
+# index under any collation. Clients are matched within a tenant or
+# across all of them, hence two indexes.
+CREATE_INDEXES = """
+CREATE INDEX company_name_prefix_idx ON invoices_company (UPPER(name) text_pattern_ops);
+CREATE INDEX client_company_name_prefix_idx ON invoices_client (company_id, UPPER(name) text_pattern_ops);
+CREATE INDEX client_name_prefix_idx ON invoices_client (UPPER(name) text_pattern_ops);
+"""
+DROP_INDEXES = """
+DROP INDEX IF EXISTS company_name_prefix_idx;
+DROP INDEX IF EXISTS client_company_name_prefix_idx;
+DROP INDEX IF EXISTS client_name_prefix_idx;
+"""
+
+
+def postgresql_only(sql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0014_tenant_scoping'),
+    ]
+
+    operations = [
+        migrations.RunPython(postgresql_only(CREATE_INDEXES), postgresql_only(DROP_INDEXES)),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0015_name_prefix_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='invoice_company_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='invoice_company_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='invoice',
+            name='invoice_company_date_idx',
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['company', '-created_at'], name='invoice_company_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['company', 'status'], name='invoice_company_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['company', 'invoice_date'], name='invoice_company_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', False)), fields=['deleted_at'], name='invoice_deleted_idx'),
+        ),
+    ]
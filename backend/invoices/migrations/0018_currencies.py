@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-19 10:37
+
+from django.db import migrations, models
+import invoices.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0017_product_catalog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('currency', models.CharField(max_length=3)),
+                ('date', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=20)),
+            ],
+            options={
+                'ordering': ['currency', 'date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='currency',
+            field=models.CharField(default=invoices.models.default_currency, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='recurringinvoice',
+            name='currency',
+            field=models.CharField(default=invoices.models.default_currency, max_length=3),
+        ),
+        migrations.AddConstraint(
+            model_name='invoice',
+            constraint=models.CheckConstraint(check=models.Q(('currency__regex', '^[A-Z]{3}$')), name='invoice_currency_code', violation_error_message='Currency must be a three-letter ISO 4217 code'),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.UniqueConstraint(fields=('currency', 'date'), name='unique_exchange_rate'),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.CheckConstraint(check=models.Q(('currency__regex', '^[A-Z]{3}$')), name='exchange_rate_currency_code'),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.CheckConstraint(check=models.Q(('rate__gt', 0)), name='exchange_rate_positive'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def assign_event_companies(apps, schema_editor):
+    """Copy each event's company from its payload"""
+    OutboxEvent = apps.get_model('invoices', 'OutboxEvent')
+    last_id = 0
+    while True:
+        events = list(OutboxEvent.objects.filter(id__gt=last_id).order_by('id').only('id', 'payload')[:5000])
+        if not events:
+            return
+        for event in events:
+            company = (event.payload or {}).get('company')
+            event.company_id = uuid.UUID(company) if company else None
+        OutboxEvent.objects.bulk_update(events, ['company_id'])
+        last_id = events[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0019_memberships'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='company',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='invoices.company'),
+        ),
+        migrations.AddField(
+            model_name='outboxevent',
+            name='company_id',
+            field=models.UUIDField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='webhookendpoint',
+            name='company',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='webhook_endpoints', to='invoices.company'),
+        ),
+        migrations.RunPython(assign_event_companies, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='outboxevent',
+            index=models.Index(fields=['company_id', 'id'], name='outbox_company_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:20
+
+from django.db import migrations
+
+# The typeahead endpoints match UPPER(name) COLLATE "C" LIKE 'AB%' and
+# order by the same expression and id. Unlike text_pattern_ops, a "C"
+# collation index serves both the prefix range and the order, so a
+# LIMIT stops after the first rows it reads.
+CREATE_INDEXES = """
+DROP INDEX IF EXISTS company_name_prefix_idx;
+DROP INDEX IF EXISTS client_company_name_prefix_idx;
+DROP INDEX IF EXISTS client_name_prefix_idx;
+CREATE INDEX company_name_prefix_idx ON invoices_company ((UPPER(name) COLLATE "C"), id);
+CREATE INDEX client_company_name_prefix_idx ON invoices_client (company_id, (UPPER(name) COLLATE "C"), id);
+CREATE INDEX client_name_prefix_idx ON invoices_client ((UPPER(name) COLLATE "C"), id);
+"""
+PATTERN_INDEXES = """
+DROP INDEX IF EXISTS company_name_prefix_idx;
+DROP INDEX IF EXISTS client_company_name_prefix_idx;
+DROP INDEX IF EXISTS client_name_prefix_idx;
+CREATE INDEX company_name_prefix_idx ON invoices_company (UPPER(name) text_pattern_ops);
+CREATE INDEX client_company_name_prefix_idx ON invoices_client (company_id, UPPER(name) text_pattern_ops);
+CREATE INDEX client_name_prefix_idx ON invoices_client (UPPER(name) text_pattern_ops);
+"""
+
+
+def postgresql_only(sql):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0020_tenant_events_jobs_webhooks'),
+    ]
+
+    operations = [
+        migrations.RunPython(postgresql_only(CREATE_INDEXES), postgresql_only(PATTERN_INDEXES)),
+    ]
@@ -1,8 +1,37 @@
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils import timezone
+from decimal import Decimal
+import re
+import secrets
 import uuid
 
+from .ids import new_id
+from .tenancy import TenantManager
+
+# Tolerances for the totals CHECK constraints
+TOTALS_TOLERANCE = models.Value(Decimal('0.01'))
+AMOUNT_ROUNDING = models.Value(Decimal('0.005'))
+
+def generate_webhook_secret():
+    return secrets.token_hex(32)
+
+_WHITESPACE = re.compile(r'\s+')
+
+def default_currency():
+    return settings.INVOICE_BASE_CURRENCY
+
+# ISO 4217 code, as stored on invoices and exchange rates
+CURRENCY_CODE = models.Q(currency__regex=r'^[A-Z]{3}$')
+
+def product_key(text):
+    """Normalized name that item descriptions are matched to products on"""
+    return _WHITESPACE.sub(' ', text).strip(' .,;:-').casefold()
+
 class Company(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=new_id, editable=False)
     name = models.CharField(max_length=200)
     address = models.TextField(blank=True)
     city = models.CharField(max_length=100, blank=True)
@@ -11,16 +40,41 @@ class Company(models.Model):
     country = models.CharField(max_length=100, blank=True)
     email = models.EmailField(blank=True)
     phone = models.CharField(max_length=20, blank=True)
+    # e.g. "INV-{YYYY}-{seq:05d}"; blank falls back to settings.INVOICE_NUMBER_FORMAT
+    invoice_number_format = models.CharField(max_length=50, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         verbose_name_plural = "Companies"
+        # Plus company_name_prefix_idx on UPPER(name) for /api/companies/suggest/
+        # (PostgreSQL only, migrations 0015 and 0021)
     
     def __str__(self):
         return self.name
 
+class Membership(models.Model):
+    """A user who may act for a company (see invoices/permissions.py)"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='company_memberships')
+    # Indexed by unique_company_membership
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='memberships', db_index=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'user'], name='unique_company_membership'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user} at {self.company}"
+
 class Client(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=new_id, editable=False)
+    # Tenant owning the client; null for clients shared by several companies
+    # before tenant scoping. Indexed by client_company_name_idx.
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='clients', db_index=False,
+    )
     name = models.CharField(max_length=200)
     address = models.TextField(blank=True)
     city = models.CharField(max_length=100, blank=True)
@@ -31,9 +85,29 @@ class Client(models.Model):
     phone = models.CharField(max_length=20, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # Scoped to the active tenant (see invoices/tenancy.py)
+    objects = TenantManager()
+    all_objects = models.Manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'name'], name='client_company_name_idx'),
+        ]
+        # Plus client_company_name_prefix_idx and client_name_prefix_idx on
+        # UPPER(name) for /api/clients/suggest/ (PostgreSQL only, migrations 0015 and 0021)
+    
     def __str__(self):
         return self.name
 
+# Condition of the partial indexes that leave out soft-deleted invoices
+LIVE = models.Q(deleted_at__isnull=True)
+
+class InvoiceManager(TenantManager):
+    """The active tenant's invoices, without soft-deleted ones (see invoices/deletion.py)"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
 class Invoice(models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
@@ -42,9 +116,12 @@ class Invoice(models.Model):
         ('overdue', 'Overdue'),
     ]
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    invoice_number = models.CharField(max_length=50, unique=True)
-    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='invoices')
+    id = models.UUIDField(primary_key=True, default=new_id, editable=False)
+    # Unique per company (unique_company_invoice_number), since each tenant
+    # numbers its own invoices
+    invoice_number = models.CharField(max_length=50)
+    # Indexed by the (company, ...) indexes below
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='invoices', db_index=False)
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='invoices')
     invoice_date = models.DateField()
     due_date = models.DateField()
@@ -53,27 +130,494 @@ class Invoice(models.Model):
     tax_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    # Amounts are in this currency; reports convert to INVOICE_BASE_CURRENCY
+    # (see invoices/currency.py)
+    currency = models.CharField(max_length=3, default=default_currency)
     notes = models.TextField(blank=True)
+    # Template this invoice was generated from (see invoices/recurring.py)
+    recurring = models.ForeignKey(
+        'RecurringInvoice', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='invoices', editable=False,
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when the invoice is deleted; purge_invoices removes it later
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    # Scoped to the active tenant and hiding deleted invoices; all_objects
+    # sees every row
+    objects = InvoiceManager()
+    all_objects = models.Manager()
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Admin date hierarchy and date-range filters
+            models.Index(fields=['invoice_date'], name='invoice_date_idx'),
+            # Tenant-scoped lists, stats and date ranges read only their
+            # company's entries, and only live invoices are indexed
+            models.Index(fields=['company', '-created_at'], name='invoice_company_created_idx', condition=LIVE),
+            models.Index(fields=['company', 'status'], name='invoice_company_status_idx', condition=LIVE),
+            models.Index(fields=['company', 'invoice_date'], name='invoice_company_date_idx', condition=LIVE),
+            # Deleted invoices awaiting purge, oldest first
+            models.Index(
+                fields=['deleted_at'], name='invoice_deleted_idx',
+                condition=models.Q(deleted_at__isnull=False),
+            ),
+            # Lookups by number alone (batch-get, admin search)
+            models.Index(fields=['invoice_number'], name='invoice_number_idx'),
+        ]
+        # Mirrors the serializer rules so trusted bulk paths can rely on the
+        # database; violations map back to these messages (invoices/constraints.py)
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'invoice_number'], name='unique_company_invoice_number'),
+            # One invoice per template and run date, so re-runs cannot duplicate
+            models.UniqueConstraint(fields=['recurring', 'invoice_date'], name='unique_recurring_run'),
+            models.CheckConstraint(
+                check=~models.Q(invoice_number__regex=r'^\s*$'),
+                name='invoice_number_not_blank',
+                violation_error_message="Invoice number cannot be empty",
+            ),
+            models.CheckConstraint(
+                check=CURRENCY_CODE,
+                name='invoice_currency_code',
+                violation_error_message="Currency must be a three-letter ISO 4217 code",
+            ),
+            models.CheckConstraint(
+                check=models.Q(due_date__gte=models.F('invoice_date')),
+                name='invoice_due_date_after_invoice_date',
+                violation_error_message="Due date cannot be before invoice date",
+            ),
+            models.CheckConstraint(
+                check=models.Q(subtotal__gte=0),
+                name='invoice_subtotal_nonnegative',
+                violation_error_message="Subtotal cannot be negative",
+            ),
+            models.CheckConstraint(
+                check=models.Q(tax_rate__gte=0),
+                name='invoice_tax_rate_nonnegative',
+                violation_error_message="Tax rate cannot be negative",
+            ),
+            models.CheckConstraint(
+                check=models.Q(tax_rate__lte=100),
+                name='invoice_tax_rate_max',
+                violation_error_message="Tax rate cannot exceed 100%%",
+            ),
+            models.CheckConstraint(
+                check=models.Q(tax_amount__gte=0),
+                name='invoice_tax_amount_nonnegative',
+                violation_error_message="Tax amount cannot be negative",
+            ),
+            models.CheckConstraint(
+                check=models.Q(total__gte=0),
+                name='invoice_total_nonnegative',
+                violation_error_message="Total cannot be negative",
+            ),
+            # Same 0.01 tolerance as InvoiceCreateSerializer.validate
+            models.CheckConstraint(
+                check=models.Q(
+                    tax_amount__gte=models.F('subtotal') * models.F('tax_rate') / 100 - TOTALS_TOLERANCE,
+                    tax_amount__lte=models.F('subtotal') * models.F('tax_rate') / 100 + TOTALS_TOLERANCE,
+                ),
+                name='invoice_tax_amount_matches_rate',
+                violation_error_message="Tax amount calculation doesn't match tax rate",
+            ),
+            models.CheckConstraint(
+                check=models.Q(
+                    total__gte=models.F('subtotal') + models.F('tax_amount') - TOTALS_TOLERANCE,
+                    total__lte=models.F('subtotal') + models.F('tax_amount') + TOTALS_TOLERANCE,
+                ),
+                name='invoice_total_matches',
+                violation_error_message="Total calculation doesn't match subtotal and tax",
+            ),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember stored values so saves can tell what changed
+        instance._loaded_invoice_date = instance.__dict__.get('invoice_date')
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+    
+    @property
+    def issued(self):
+        """Whether the stored invoice has left draft, freezing its content (see invoices/snapshots.py)"""
+        return getattr(self, '_loaded_status', 'draft') != 'draft'
+    
+    def clean(self):
+        if self.issued and self.status == 'draft':
+            raise ValidationError({'status': "An issued invoice cannot return to draft"})
+    
+    def save(self, *args, **kwargs):
+        # post_save receivers (the webhook outbox) write in the same transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            loaded_date = getattr(self, '_loaded_invoice_date', None)
+            if loaded_date is not None and loaded_date != self.invoice_date:
+                # Items carry invoice_date as their partition key
+                self.items.update(invoice_date=self.invoice_date)
+        self._loaded_invoice_date = self.invoice_date
+        self._loaded_status = self.status
     
     def __str__(self):
         return f"Invoice {self.invoice_number}"
 
+class Product(models.Model):
+    """A company's catalog entry that invoice items reference (see invoices/catalog.py)"""
+    # Integer key, so items carry (and reports group by) a small indexed id
+    id = models.BigAutoField(primary_key=True)
+    # Indexed by unique_company_product_key
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='products', db_index=False)
+    name = models.CharField(max_length=500)
+    # product_key(name), set on save
+    key = models.CharField(max_length=500, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Scoped to the active tenant (see invoices/tenancy.py)
+    objects = TenantManager()
+    all_objects = models.Manager()
+    
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'key'], name='unique_company_product_key'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.key = product_key(self.name)
+        super().save(*args, **kwargs)
+    
+    def __str__(self):
+        return self.name
+
 class InvoiceItem(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=new_id, editable=False)
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='items')
     description = models.CharField(max_length=500)
+    # Catalog entry matching the description; indexed by item_product_date_idx
+    product = models.ForeignKey(
+        Product, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='items', db_index=False,
+    )
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
     rate = models.DecimalField(max_digits=10, decimal_places=2)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # Denormalized from the parent invoice so items can be range-partitioned
+    # on the same key as invoices (see invoices/partitioning.py)
+    invoice_date = models.DateField(editable=False)
+    
+    def clean(self):
+        if self.invoice_id and self.invoice.issued:
+            raise ValidationError("Items of issued invoices cannot be changed")
+    
+    class Meta:
+        indexes = [
+            # Product reports: one product's items over a date range
+            models.Index(fields=['product', 'invoice_date'], name='item_product_date_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                check=~models.Q(description__regex=r'^\s*$'),
+                name='item_description_not_blank',
+                violation_error_message="Description cannot be empty",
+            ),
+            models.CheckConstraint(
+                check=models.Q(quantity__gt=0),
+                name='item_quantity_positive',
+                violation_error_message="Quantity must be greater than 0",
+            ),
+            models.CheckConstraint(
+                check=models.Q(quantity__lte=Decimal('999999.99')),
+                name='item_quantity_max',
+                violation_error_message="Quantity cannot exceed 999,999.99",
+            ),
+            models.CheckConstraint(
+                check=models.Q(rate__gte=0),
+                name='item_rate_nonnegative',
+                violation_error_message="Rate cannot be negative",
+            ),
+            # amount is quantity * rate rounded to cents, whichever way it was rounded
+            models.CheckConstraint(
+                check=models.Q(
+                    amount__gte=models.F('quantity') * models.F('rate') - AMOUNT_ROUNDING,
+                    amount__lte=models.F('quantity') * models.F('rate') + AMOUNT_ROUNDING,
+                ),
+                name='item_amount_matches',
+                violation_error_message="Amount must equal quantity times rate",
+            ),
+        ]
     
     def save(self, *args, **kwargs):
         self.amount = self.quantity * self.rate
+        self.invoice_date = self.invoice.invoice_date
         super().save(*args, **kwargs)
     
     def __str__(self):
-        return f"{self.description} - {self.invoice.invoice_number}"
\ No newline at end of file
+        return f"{self.description} - {self.invoice.invoice_number}"
+
+class RecurringInvoice(models.Model):
+    """Template for an invoice re-issued on a fixed cadence (see invoices/recurring.py)"""
+    CADENCE_CHOICES = [
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+        ('quarterly', 'Quarterly'),
+        ('yearly', 'Yearly'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=new_id, editable=False)
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='recurring_invoices')
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='recurring_invoices')
+    cadence = models.CharField(max_length=10, choices=CADENCE_CHOICES, default='monthly')
+    # Run dates are start_date + n cadences, so month-end schedules don't drift
+    start_date = models.DateField()
+    next_run_date = models.DateField()
+    run_count = models.PositiveIntegerField(default=0)
+    end_date = models.DateField(null=True, blank=True)
+    payment_terms_days = models.PositiveSmallIntegerField(default=30)
+    tax_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    currency = models.CharField(max_length=3, default=default_currency)
+    notes = models.TextField(blank=True)
+    active = models.BooleanField(default=True)
+    last_run_date = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['next_run_date']
+        indexes = [
+            models.Index(
+                fields=['next_run_date'], name='recurring_due_idx',
+                condition=models.Q(active=True),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_cadence_display()} invoice for {self.client_id}"
+
+class RecurringInvoiceItem(models.Model):
+    template = models.ForeignKey(RecurringInvoice, on_delete=models.CASCADE, related_name='items')
+    description = models.CharField(max_length=500)
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    rate = models.DecimalField(max_digits=10, decimal_places=2)
+    position = models.PositiveSmallIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['position', 'id']
+    
+    def __str__(self):
+        return self.description
+
+class InvoiceNumberCounter(models.Model):
+    """Next sequence value per company and numbering period (see invoices/numbering.py)"""
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='number_counters')
+    # '' for formats without a date component, else e.g. '2025' or '2025-03'
+    period = models.CharField(max_length=7, blank=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'period'], name='unique_number_counter_period'),
+        ]
+    
+    def __str__(self):
+        return f"{self.company} {self.period or '-'}: {self.next_value}"
+
+class InvoiceSnapshot(models.Model):
+    """
+    Frozen representation of a non-draft invoice (see invoices/snapshots.py):
+    the serialized JSON, including company and client details as they were
+    when it was issued, and the rendered PDF.
+    """
+    # No database FK: the invoice table may be partitioned, where id alone
+    # is not unique. Deletes still cascade through the ORM.
+    invoice = models.OneToOneField(
+        Invoice, on_delete=models.CASCADE, primary_key=True,
+        related_name='snapshot', db_constraint=False,
+    )
+    data = models.JSONField(encoder=DjangoJSONEncoder)
+    pdf = models.BinaryField(null=True, blank=True)
+    captured_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Snapshot of {self.invoice_id}"
+
+class InvoiceDelivery(models.Model):
+    """One attempt to email an invoice to its client (see invoices/emailing.py)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='deliveries')
+    recipient = models.EmailField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = "Invoice deliveries"
+    
+    def __str__(self):
+        return f"{self.invoice.invoice_number} -> {self.recipient or '?'} ({self.status})"
+
+class WebhookEndpoint(models.Model):
+    """A subscriber URL for invoice events (see invoices/webhooks.py)"""
+    # Company whose events it receives; null for staff endpoints receiving every company's
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, null=True, blank=True, related_name='webhook_endpoints',
+    )
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=100, default=generate_webhook_secret)
+    # Event types to deliver; empty means all
+    event_types = models.JSONField(default=list, blank=True)
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    # Scoped to the active tenant (see invoices/tenancy.py)
+    objects = TenantManager()
+    all_objects = models.Manager()
+    
+    def __str__(self):
+        return self.url
+
+class OutboxEvent(models.Model):
+    """An invoice change, written in the same transaction as the change itself"""
+    event_type = models.CharField(max_length=50)
+    # Not foreign keys: events must outlive (and not block) invoice deletes
+    invoice_id = models.UUIDField(db_index=True)
+    # The invoice's company, for streams and webhooks of one tenant;
+    # indexed by outbox_company_idx
+    company_id = models.UUIDField(null=True, blank=True)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set once the event has been fanned out to webhook deliveries
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(
+                fields=['id'], name='outbox_undispatched_idx',
+                condition=models.Q(dispatched_at__isnull=True),
+            ),
+            # A tenant's event stream replaying what it missed
+            models.Index(fields=['company_id', 'id'], name='outbox_company_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.invoice_id}"
+
+class WebhookDelivery(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ]
+    
+    endpoint = models.ForeignKey(WebhookEndpoint, on_delete=models.CASCADE, related_name='deliveries')
+    event = models.ForeignKey(OutboxEvent, on_delete=models.CASCADE, related_name='deliveries')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Round trip of the request that delivered (or last tried to deliver) the event
+    latency_ms = models.PositiveIntegerField(null=True, blank=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['event_id']
+        verbose_name_plural = "Webhook deliveries"
+        indexes = [
+            models.Index(
+                fields=['endpoint', 'next_attempt_at'], name='webhook_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.event} -> {self.endpoint} ({self.status})"
+
+class Job(models.Model):
+    """A unit of background work claimed by run_workers (see invoices/jobs.py)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Tenant the job was queued for and runs as; null for system jobs
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    # Higher values are claimed first
+    priority = models.SmallIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    # Scoped to the active tenant (see invoices/tenancy.py); workers run
+    # without one and claim every company's jobs
+    objects = TenantManager()
+    all_objects = models.Manager()
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Serves the claim query without touching finished jobs
+            models.Index(
+                fields=['-priority', 'run_at'], name='job_claim_idx',
+                condition=models.Q(status='queued'),
+            ),
+            models.Index(
+                fields=['locked_at'], name='job_running_idx',
+                condition=models.Q(status='running'),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.task} ({self.status})"
+
+class ExchangeRate(models.Model):
+    """Value of one unit of a currency in INVOICE_BASE_CURRENCY from a date on (see invoices/currency.py)"""
+    id = models.BigAutoField(primary_key=True)
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+    
+    class Meta:
+        ordering = ['currency', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'date'], name='unique_exchange_rate'),
+            models.CheckConstraint(check=CURRENCY_CODE, name='exchange_rate_currency_code'),
+            models.CheckConstraint(check=models.Q(rate__gt=0), name='exchange_rate_positive'),
+        ]
+    
+    def __str__(self):
+        return f"{self.currency} {self.rate} on {self.date}"
+
+class RateLimitBucket(models.Model):
+    """Token bucket of one API client for write requests (see invoices/admission.py)"""
+    key = models.CharField(max_length=100, primary_key=True)
+    tokens = models.FloatField()
+    updated_at = models.DateTimeField()
+    admitted = models.PositiveBigIntegerField(default=0)
+    throttled = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.key}: {self.tokens:.1f} tokens"
@@ -0,0 +1,118 @@
+"""
+Server-side invoice numbering.
+
+Numbers are drawn from a counter row per company and period, locked for
+the rest of the surrounding transaction. Allocate inside the same
+transaction that inserts the invoices: if it rolls back, so does the
+counter, which keeps the sequence gap-free. Numbers the company already
+uses, e.g. entered by hand in the same format, are skipped.
+
+Format placeholders: ``{YYYY}``, ``{YY}``, ``{MM}`` and ``{seq}`` (which
+accepts a format spec, e.g. ``{seq:05d}``). The counter restarts for every
+month when the format contains ``{MM}``, every year when it contains a
+year placeholder, and never otherwise.
+"""
+import datetime
+import string
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import Invoice, InvoiceNumberCounter
+from .partitioning import NUMBER_CONSTRAINT
+
+PLACEHOLDERS = {'YYYY', 'YY', 'MM', 'seq'}
+
+
+def number_format_for(company):
+    return company.invoice_number_format or settings.INVOICE_NUMBER_FORMAT
+
+
+def validate_number_format(value):
+    """Return an error message for an unusable format, or None"""
+    try:
+        fields = {name for _, name, _, _ in string.Formatter().parse(value) if name is not None}
+    except ValueError:
+        return "Invoice number format is invalid"
+    if fields - PLACEHOLDERS:
+        return f"Unknown placeholder(s): {', '.join(sorted(fields - PLACEHOLDERS))}"
+    if 'seq' not in fields:
+        return "Invoice number format must contain {seq}"
+    try:
+        sample = format_invoice_number(value, datetime.date(2000, 12, 31), 10 ** 9)
+    except ValueError:
+        return "Invoice number format is invalid"
+    if len(sample) > 50:
+        return "Invoice number format produces numbers longer than 50 characters"
+    return None
+
+
+def counter_period(number_format, day):
+    if '{MM' in number_format:
+        return f"{day:%Y-%m}"
+    if '{YY' in number_format:
+        return f"{day:%Y}"
+    return ''
+
+
+def format_invoice_number(number_format, day, seq):
+    return number_format.format(YYYY=f"{day:%Y}", YY=f"{day:%y}", MM=f"{day:%m}", seq=seq)
+
+
+def _reserve(company_id, period, count):
+    """Advance the counter by ``count`` and return the first reserved value"""
+    if connection.vendor == 'postgresql':
+        # One round trip; the upserted row stays locked until commit
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {InvoiceNumberCounter._meta.db_table} AS counter (company_id, period, next_value)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (company_id, period)
+                DO UPDATE SET next_value = counter.next_value + EXCLUDED.next_value - 1
+                RETURNING next_value
+                """,
+                [company_id, period, count + 1],
+            )
+            return cursor.fetchone()[0] - count
+
+    counter, _ = InvoiceNumberCounter.objects.select_for_update().get_or_create(
+        company_id=company_id, period=period,
+    )
+    first = counter.next_value
+    counter.next_value = first + count
+    counter.save(update_fields=['next_value'])
+    return first
+
+
+def allocate_invoice_numbers(company, count=1, invoice_date=None):
+    """Reserve the next ``count`` invoice numbers ``company`` doesn't use yet"""
+    if count < 1:
+        return []
+    number_format = number_format_for(company)
+    day = invoice_date or datetime.date.today()
+    period = counter_period(number_format, day)
+    numbers = []
+    with transaction.atomic():
+        while len(numbers) < count:
+            needed = count - len(numbers)
+            first = _reserve(company.pk, period, needed)
+            candidates = [format_invoice_number(number_format, day, seq) for seq in range(first, first + needed)]
+            # Deleted invoices keep their numbers too
+            taken = set(
+                Invoice.all_objects.filter(company_id=company.pk, invoice_number__in=candidates)
+                .values_list('invoice_number', flat=True)
+            )
+            numbers += [number for number in candidates if number not in taken]
+    return numbers
+
+
+def is_duplicate_invoice_number(error):
+    """Whether an IntegrityError came from the per-company invoice_number unique key"""
+    diag = getattr(error.__cause__, 'diag', None)
+    name = getattr(diag, 'constraint_name', None)
+    if name is not None:
+        return name == NUMBER_CONSTRAINT
+    # Other backends only name the columns, and CHECK constraints by name
+    message = str(error)
+    return 'UNIQUE' in message.upper() and 'invoice_number' in message
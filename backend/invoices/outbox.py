@@ -0,0 +1,81 @@
+"""
+Transactional outbox for invoice events.
+
+Every invoice change appends an ``OutboxEvent`` in the transaction that
+makes the change, so events exist exactly when the change committed.
+Single saves are captured by the ``post_save`` receiver below; code that
+changes invoices with ``QuerySet.update()`` must call ``record_events``
+itself. ``invoices.webhooks`` delivers the events to subscribers. Since
+every change passes through here, this is also where the affected
+tenants' caches are invalidated, once the change commits.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Invoice, OutboxEvent
+from .tenancy import invalidate_tenant_cache
+
+INVOICE_CREATED = 'invoice.created'
+INVOICE_UPDATED = 'invoice.updated'
+INVOICE_PAID = 'invoice.paid'
+INVOICE_OVERDUE = 'invoice.overdue'
+# Soft deletion and restore (see invoices/deletion.py)
+INVOICE_DELETED = 'invoice.deleted'
+INVOICE_RESTORED = 'invoice.restored'
+EVENT_TYPES = [INVOICE_CREATED, INVOICE_UPDATED, INVOICE_PAID, INVOICE_OVERDUE, INVOICE_DELETED, INVOICE_RESTORED]
+
+# Status transitions that get their own event type
+STATUS_EVENTS = {'paid': INVOICE_PAID, 'overdue': INVOICE_OVERDUE}
+
+
+def invoice_payload(invoice, previous_status=None):
+    return {
+        'id': str(invoice.id),
+        'invoice_number': invoice.invoice_number,
+        'company': str(invoice.company_id),
+        'client': str(invoice.client_id),
+        'status': invoice.status,
+        'previous_status': previous_status,
+        'invoice_date': invoice.invoice_date.isoformat(),
+        'due_date': invoice.due_date.isoformat(),
+        'total': str(invoice.total),
+        'currency': invoice.currency,
+        'updated_at': invoice.updated_at.isoformat() if invoice.updated_at else None,
+    }
+
+
+def event_type_for(created, previous_status, status):
+    if created:
+        return INVOICE_CREATED
+    if previous_status != status and status in STATUS_EVENTS:
+        return STATUS_EVENTS[status]
+    return INVOICE_UPDATED
+
+
+def _invalidate(company_ids):
+    for company_id in company_ids:
+        invalidate_tenant_cache(company_id)
+
+
+def record_events(invoices, previous_status=None, created=False, event_type=None):
+    """Append one event per invoice; call inside the transaction that changed them"""
+    company_ids = {invoice.company_id for invoice in invoices}
+    transaction.on_commit(lambda: _invalidate(company_ids))
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(
+            event_type=event_type or event_type_for(created, previous_status, invoice.status),
+            invoice_id=invoice.id,
+            company_id=invoice.company_id,
+            payload=invoice_payload(invoice, previous_status),
+        )
+        for invoice in invoices
+    ])
+
+
+@receiver(post_save, sender=Invoice, dispatch_uid='invoices.outbox.invoice_saved')
+def invoice_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous_status = None if created else getattr(instance, '_loaded_status', None)
+    record_events([instance], previous_status=previous_status, created=created)
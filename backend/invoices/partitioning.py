@@ -0,0 +1,408 @@
+"""
+PostgreSQL declarative partitioning for invoices and invoice items.
+
+Both tables are range-partitioned on ``invoice_date`` (items carry a
+denormalized copy of their invoice's date). A partitioned table can only
+enforce uniqueness on keys that include the partition column, so after
+conversion:
+
+* primary keys become ``(id, invoice_date)``,
+* the ``unique_company_invoice_number`` key becomes
+  ``(company_id, invoice_number, invoice_date)``. A trigger keeps every
+  ``(company_id, invoice_number)`` in the plain ``invoices_invoicenumber``
+  table, whose primary key still rejects a number repeated on another
+  date. Numbers of detached partitions stay taken,
+* items reference invoices through ``(invoice_id, invoice_date)`` with
+  ``ON UPDATE CASCADE``,
+* foreign keys from other tables into ``invoices_invoice`` are dropped and
+  enforced by the application only.
+
+``convert_to_partitioned`` refuses to run until the caller accepts these
+changes (``partition_invoices --convert --accept-schema-changes``).
+"""
+import datetime
+import gzip
+import logging
+import os
+import re
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+INVOICE_TABLE = 'invoices_invoice'
+ITEM_TABLE = 'invoices_invoiceitem'
+PARTITIONED_TABLES = (INVOICE_TABLE, ITEM_TABLE)
+PARTITION_KEY = 'invoice_date'
+INTERVALS = ('month', 'year')
+
+NUMBER_TABLE = 'invoices_invoicenumber'
+NUMBER_CONSTRAINT = 'unique_company_invoice_number'
+
+# Mirrors (company_id, invoice_number) of every invoice row in the same
+# transaction. A row moved to another partition is deleted and re-inserted,
+# in either order, so entries go only once no invoice holds them. The error
+# matches the one the unique key would raise (see is_duplicate_invoice_number).
+CREATE_NUMBER_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {NUMBER_TABLE} (
+    company_id uuid NOT NULL,
+    invoice_number varchar(50) NOT NULL,
+    invoice_id uuid NOT NULL,
+    CONSTRAINT {NUMBER_TABLE}_pkey PRIMARY KEY (company_id, invoice_number)
+);
+
+CREATE OR REPLACE FUNCTION invoices_track_invoice_number() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {NUMBER_TABLE} n
+        WHERE n.company_id = OLD.company_id AND n.invoice_number = OLD.invoice_number
+          AND n.invoice_id = OLD.id
+          AND NOT EXISTS (
+              SELECT 1 FROM {INVOICE_TABLE} i
+              WHERE i.id = OLD.id AND i.company_id = OLD.company_id AND i.invoice_number = OLD.invoice_number
+          );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {NUMBER_TABLE} (company_id, invoice_number, invoice_id)
+        VALUES (NEW.company_id, NEW.invoice_number, NEW.id)
+        ON CONFLICT (company_id, invoice_number) DO NOTHING;
+        IF NOT FOUND AND NOT EXISTS (
+            SELECT 1 FROM {NUMBER_TABLE} n
+            WHERE n.company_id = NEW.company_id AND n.invoice_number = NEW.invoice_number
+              AND n.invoice_id = NEW.id
+        ) THEN
+            RAISE EXCEPTION 'duplicate key value violates unique constraint "{NUMBER_CONSTRAINT}"'
+                USING ERRCODE = 'unique_violation', CONSTRAINT = '{NUMBER_CONSTRAINT}',
+                      DETAIL = 'Key (company_id, invoice_number)=(' || NEW.company_id || ', '
+                               || NEW.invoice_number || ') already exists.';
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS invoices_invoice_number_track ON {INVOICE_TABLE};
+CREATE TRIGGER invoices_invoice_number_track
+AFTER INSERT OR DELETE OR UPDATE OF company_id, invoice_number ON {INVOICE_TABLE}
+FOR EACH ROW EXECUTE FUNCTION invoices_track_invoice_number();
+"""
+
+DROP_NUMBER_TABLE = f"""
+DROP TRIGGER IF EXISTS invoices_invoice_number_track ON {INVOICE_TABLE};
+DROP FUNCTION IF EXISTS invoices_track_invoice_number();
+DROP TABLE IF EXISTS {NUMBER_TABLE};
+"""
+
+_RANGE_BOUND_RE = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def qn(name):
+    return connection.ops.quote_name(name)
+
+
+def interval_start(day, interval):
+    if interval == 'year':
+        return datetime.date(day.year, 1, 1)
+    return datetime.date(day.year, day.month, 1)
+
+
+def next_interval(start, interval):
+    if interval == 'year' or start.month == 12:
+        return datetime.date(start.year + 1, 1, 1)
+    return datetime.date(start.year, start.month + 1, 1)
+
+
+def add_intervals(day, interval, count):
+    start = interval_start(day, interval)
+    if interval == 'year':
+        return datetime.date(start.year + count, 1, 1)
+    months = start.year * 12 + start.month - 1 + count
+    return datetime.date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(table, start, interval):
+    if interval == 'year':
+        return f"{table}_p{start:%Y}"
+    return f"{table}_p{start:%Y_%m}"
+
+
+def default_partition_name(table):
+    return f"{table}_pdefault"
+
+
+def check_backend():
+    if connection.vendor != 'postgresql':
+        raise PartitioningError("Partitioning requires PostgreSQL")
+
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+    row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def list_partitions(cursor, table):
+    """Return ``(name, lower, upper)`` for each range partition, oldest first"""
+    cursor.execute(
+        """
+        SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass(%s)
+        """,
+        [table],
+    )
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = _RANGE_BOUND_RE.search(bound or '')
+        if match:
+            lower, upper = (datetime.date.fromisoformat(value) for value in match.groups())
+            partitions.append((name, lower, upper))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_partition(cursor, table, start, interval):
+    """Create the partition of ``table`` covering the interval at ``start``"""
+    name = partition_name(table, start, interval)
+    end = next_interval(start, interval)
+    try:
+        with transaction.atomic():
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {qn(name)} PARTITION OF {qn(table)} "
+                f"FOR VALUES FROM (%s) TO (%s)",
+                [start, end],
+            )
+    except DatabaseError as e:
+        # Typically rows for this range already sit in the default partition
+        raise PartitioningError(f"Could not create partition {name} [{start}, {end}): {e}")
+    return name
+
+
+def ensure_partitions(first_day, last_day, interval=None):
+    """Create any missing partitions covering ``first_day`` through ``last_day``"""
+    check_backend()
+    interval = interval or settings.INVOICE_PARTITION_INTERVAL
+    created = []
+    with connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(cursor, table):
+                raise PartitioningError(f"{table} is not partitioned; run partition_invoices --convert first")
+            existing = {lower for _, lower, _ in list_partitions(cursor, table)}
+            start = interval_start(first_day, interval)
+            while start <= last_day:
+                if start not in existing:
+                    created.append(create_partition(cursor, table, start, interval))
+                start = next_interval(start, interval)
+    if created:
+        logger.info(f"Created partitions: {', '.join(created)}")
+    return created
+
+
+def ensure_future_partitions(ahead=None, interval=None, today=None):
+    """Keep partitions ready for the next ``ahead`` intervals"""
+    interval = interval or settings.INVOICE_PARTITION_INTERVAL
+    ahead = settings.INVOICE_PARTITIONS_AHEAD if ahead is None else ahead
+    today = today or datetime.date.today()
+    return ensure_partitions(today, add_intervals(today, interval, ahead), interval)
+
+
+def _with_partition_key(definition):
+    """Append the partition key to the first column list of a key or index definition"""
+    start = definition.index('(')
+    depth = 0
+    for position in range(start, len(definition)):
+        if definition[position] == '(':
+            depth += 1
+        elif definition[position] == ')':
+            depth -= 1
+            if depth == 0:
+                columns = [column.strip() for column in definition[start + 1:position].split(',')]
+                if PARTITION_KEY in columns:
+                    return definition
+                return f"{definition[:position]}, {PARTITION_KEY}{definition[position:]}"
+    raise PartitioningError(f"Cannot parse column list in: {definition}")
+
+
+def _capture_schema(cursor, table):
+    """Collect the DDL needed to rebuild keys and indexes of ``table`` on a partitioned parent"""
+    cursor.execute(
+        """
+        SELECT conname, contype, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'f')
+        """,
+        [table],
+    )
+    statements = []
+    for name, kind, definition in cursor.fetchall():
+        if kind in ('p', 'u'):
+            definition = _with_partition_key(definition)
+        elif table == ITEM_TABLE and f"REFERENCES {INVOICE_TABLE}(" in definition:
+            definition = (
+                f"FOREIGN KEY (invoice_id, {PARTITION_KEY}) "
+                f"REFERENCES {qn(INVOICE_TABLE)} (id, {PARTITION_KEY}) "
+                f"ON UPDATE CASCADE DEFERRABLE INITIALLY DEFERRED"
+            )
+        statements.append(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}")
+
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(ix.indexrelid), ix.indisunique
+        FROM pg_index ix
+        WHERE ix.indrelid = to_regclass(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = ix.indexrelid)
+        """,
+        [table],
+    )
+    for definition, unique in cursor.fetchall():
+        statements.append(_with_partition_key(definition) if unique else definition)
+    return statements
+
+
+def _foreign_keys_into(cursor, table, exclude):
+    cursor.execute(
+        """
+        SELECT conrelid::regclass::text, conname
+        FROM pg_constraint
+        WHERE confrelid = to_regclass(%s) AND contype = 'f'
+        """,
+        [table],
+    )
+    return [(source, name) for source, name in cursor.fetchall() if source not in exclude]
+
+
+def track_invoice_numbers(cursor):
+    """Enforce unique (company_id, invoice_number) on the partitioned invoice table"""
+    cursor.execute(
+        f"SELECT company_id, invoice_number FROM {qn(INVOICE_TABLE)} "
+        f"GROUP BY company_id, invoice_number HAVING COUNT(*) > 1 LIMIT 5"
+    )
+    duplicates = cursor.fetchall()
+    if duplicates:
+        raise PartitioningError(
+            "Invoice numbers repeat within a company; renumber them first: "
+            + ', '.join(f"{number} (company {company_id})" for company_id, number in duplicates)
+        )
+    cursor.execute(CREATE_NUMBER_TABLE)
+    cursor.execute(
+        f"INSERT INTO {NUMBER_TABLE} (company_id, invoice_number, invoice_id) "
+        f"SELECT company_id, invoice_number, id FROM {qn(INVOICE_TABLE)} ON CONFLICT DO NOTHING"
+    )
+
+
+def convert_to_partitioned(interval=None, ahead=None, accept_schema_changes=False):
+    """
+    Rebuild the invoice and item tables as partitioned tables.
+
+    Runs in a single transaction holding ACCESS EXCLUSIVE locks on both
+    tables, so schedule it in a maintenance window. Raises unless
+    ``accept_schema_changes``, naming the foreign keys it would drop.
+    """
+    check_backend()
+    interval = interval or settings.INVOICE_PARTITION_INTERVAL
+    ahead = settings.INVOICE_PARTITIONS_AHEAD if ahead is None else ahead
+    if interval not in INTERVALS:
+        raise PartitioningError(f"Unknown partition interval: {interval}")
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        if is_partitioned(cursor, INVOICE_TABLE):
+            raise PartitioningError(f"{INVOICE_TABLE} is already partitioned")
+        if not accept_schema_changes:
+            foreign_keys = _foreign_keys_into(cursor, INVOICE_TABLE, exclude=PARTITIONED_TABLES)
+            raise PartitioningError(
+                "Converting drops the foreign keys into invoices_invoice ("
+                + (', '.join(f"{name} on {source}" for source, name in foreign_keys) or 'none')
+                + "), which the application then enforces alone, and adds invoice_date to the primary "
+                "and unique keys, with invoice numbers kept unique per company by a trigger on "
+                f"{NUMBER_TABLE}. Pass --accept-schema-changes to go ahead."
+            )
+        cursor.execute(f"LOCK TABLE {qn(INVOICE_TABLE)}, {qn(ITEM_TABLE)} IN ACCESS EXCLUSIVE MODE")
+
+        cursor.execute(f"SELECT MIN({PARTITION_KEY}) FROM {qn(INVOICE_TABLE)}")
+        today = datetime.date.today()
+        first_day = cursor.fetchone()[0] or today
+        last_day = add_intervals(today, interval, ahead)
+
+        schema = {table: _capture_schema(cursor, table) for table in PARTITIONED_TABLES}
+        dropped_fks = _foreign_keys_into(cursor, INVOICE_TABLE, exclude=PARTITIONED_TABLES)
+        for source, name in dropped_fks:
+            logger.warning(f"Dropping foreign key {name} on {source}; it cannot reference a partitioned table")
+            cursor.execute(f"ALTER TABLE {qn(source)} DROP CONSTRAINT {qn(name)}")
+
+        for table in PARTITIONED_TABLES:
+            legacy = f"{table}_legacy"
+            cursor.execute(f"ALTER TABLE {qn(table)} RENAME TO {qn(legacy)}")
+            cursor.execute(
+                f"CREATE TABLE {qn(table)} (LIKE {qn(legacy)} INCLUDING DEFAULTS "
+                f"INCLUDING CONSTRAINTS INCLUDING STORAGE) PARTITION BY RANGE ({PARTITION_KEY})"
+            )
+            cursor.execute(
+                f"CREATE TABLE {qn(default_partition_name(table))} PARTITION OF {qn(table)} DEFAULT"
+            )
+            start = interval_start(first_day, interval)
+            while start <= last_day:
+                create_partition(cursor, table, start, interval)
+                start = next_interval(start, interval)
+
+        # Load data before building indexes, then drop the old heaps
+        for table in PARTITIONED_TABLES:
+            cursor.execute(f"INSERT INTO {qn(table)} SELECT * FROM {qn(table + '_legacy')}")
+        for table in reversed(PARTITIONED_TABLES):
+            cursor.execute(f"DROP TABLE {qn(table + '_legacy')}")
+        for table in PARTITIONED_TABLES:
+            for statement in schema[table]:
+                cursor.execute(statement)
+        track_invoice_numbers(cursor)
+
+    logger.info(f"Partitioned {', '.join(PARTITIONED_TABLES)} by {interval} from {first_day} to {last_day}")
+    return dropped_fks
+
+
+def partitions_before(cutoff):
+    """Pair up invoice and item partitions whose whole range ends on or before ``cutoff``"""
+    check_backend()
+    with connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(cursor, table):
+                raise PartitioningError(f"{table} is not partitioned")
+        invoices = {lower: (name, upper) for name, lower, upper in list_partitions(cursor, INVOICE_TABLE)}
+        items = {lower: name for name, lower, _ in list_partitions(cursor, ITEM_TABLE)}
+    return [
+        (lower, upper, name, items.get(lower))
+        for lower, (name, upper) in sorted(invoices.items())
+        if upper <= cutoff
+    ]
+
+
+def export_partition(table, directory):
+    """Write a partition to ``<directory>/<table>.csv.gz`` and return the path"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{table}.csv.gz")
+    with connection.cursor() as cursor, gzip.open(path, 'wb') as fh:
+        cursor.copy_expert(f"COPY {qn(table)} TO STDOUT WITH (FORMAT csv, HEADER)", fh)
+    return path
+
+
+def detach_period(invoice_partition, item_partition, drop=False):
+    """Detach (and optionally drop) one period's invoice and item partitions"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        if item_partition:
+            cursor.execute(f"ALTER TABLE {qn(ITEM_TABLE)} DETACH PARTITION {qn(item_partition)}")
+            # The detached items still point at the invoice parent; release them
+            cursor.execute(
+                "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f' "
+                "AND confrelid = to_regclass(%s)",
+                [item_partition, INVOICE_TABLE],
+            )
+            for (name,) in cursor.fetchall():
+                cursor.execute(f"ALTER TABLE {qn(item_partition)} DROP CONSTRAINT {qn(name)}")
+        cursor.execute(f"ALTER TABLE {qn(INVOICE_TABLE)} DETACH PARTITION {qn(invoice_partition)}")
+        if drop:
+            if item_partition:
+                cursor.execute(f"DROP TABLE {qn(item_partition)}")
+            cursor.execute(f"DROP TABLE {qn(invoice_partition)}")
@@ -0,0 +1,174 @@
+"""
+Server-side invoice PDF rendering.
+
+A small, dependency-free PDF writer that lays out an invoice with the
+standard Helvetica fonts. It mirrors the content of the frontend
+``InvoicePDF`` component closely enough for email attachments and
+archives. Input is the ``InvoiceSerializer`` representation, so rendering
+needs no database access and output is deterministic for a given invoice.
+"""
+import textwrap
+import zlib
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 50
+LINE_HEIGHT = 14
+
+# x positions of the item table columns
+COLUMNS = {'description': MARGIN, 'quantity': 360, 'rate': 430, 'amount': 510}
+DESCRIPTION_WIDTH = 55
+
+
+def _escape(text):
+    text = str(text).encode('cp1252', 'replace').decode('cp1252')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _money(value):
+    return f"{float(value):,.2f}"
+
+
+class _Canvas:
+    """Collects text operations and breaks pages as the cursor runs out of room"""
+
+    def __init__(self):
+        self.pages = []
+        self.new_page()
+
+    def new_page(self):
+        self.ops = []
+        self.pages.append(self.ops)
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def ensure_room(self, lines=1):
+        if self.y - lines * LINE_HEIGHT < MARGIN:
+            self.new_page()
+
+    def text(self, x, value, size=10, bold=False):
+        font = 'F2' if bold else 'F1'
+        self.ops.append(f"BT /{font} {size} Tf {x} {self.y} Td ({_escape(value)}) Tj ET")
+
+    def line(self):
+        self.ops.append(f"{MARGIN} {self.y + 4} m {PAGE_WIDTH - MARGIN} {self.y + 4} l S")
+
+    def advance(self, lines=1):
+        self.y -= lines * LINE_HEIGHT
+
+
+def _party_lines(details):
+    details = details or {}
+    locality = ', '.join(filter(None, [details.get('city'), details.get('state'), details.get('zip_code')]))
+    lines = [details.get('name', '')]
+    lines += (details.get('address') or '').splitlines()
+    lines += [locality, details.get('country'), details.get('email'), details.get('phone')]
+    return [line for line in lines if line]
+
+
+def _draw(canvas, data):
+    canvas.text(MARGIN, 'INVOICE', size=22, bold=True)
+    canvas.text(400, f"# {data.get('invoice_number', '')}", size=12, bold=True)
+    canvas.advance(2)
+    canvas.text(400, f"Date: {data.get('invoice_date', '')}")
+    canvas.advance()
+    canvas.text(400, f"Due: {data.get('due_date', '')}")
+    canvas.advance(2)
+
+    company = _party_lines(data.get('company_details'))
+    client = _party_lines(data.get('client_details'))
+    canvas.text(MARGIN, 'From', bold=True)
+    canvas.text(320, 'Bill To', bold=True)
+    canvas.advance()
+    for index in range(max(len(company), len(client))):
+        canvas.ensure_room()
+        if index < len(company):
+            canvas.text(MARGIN, company[index])
+        if index < len(client):
+            canvas.text(320, client[index])
+        canvas.advance()
+    canvas.advance()
+
+    def table_header():
+        for column, label in (('description', 'Description'), ('quantity', 'Qty'),
+                              ('rate', 'Rate'), ('amount', 'Amount')):
+            canvas.text(COLUMNS[column], label, bold=True)
+        canvas.advance()
+        canvas.line()
+
+    canvas.ensure_room(3)
+    table_header()
+    for item in data.get('items', []):
+        description = textwrap.wrap(item.get('description', ''), DESCRIPTION_WIDTH) or ['']
+        if canvas.y - len(description) * LINE_HEIGHT < MARGIN:
+            canvas.new_page()
+            table_header()
+        canvas.text(COLUMNS['quantity'], item.get('quantity', ''))
+        canvas.text(COLUMNS['rate'], _money(item.get('rate', 0)))
+        canvas.text(COLUMNS['amount'], _money(item.get('amount', 0)))
+        for line in description:
+            canvas.text(COLUMNS['description'], line)
+            canvas.advance()
+
+    canvas.ensure_room(4)
+    canvas.line()
+    canvas.advance()
+    for label, value, bold in (
+        ('Subtotal', data.get('subtotal', 0), False),
+        (f"Tax ({data.get('tax_rate', 0)}%)", data.get('tax_amount', 0), False),
+        (f"Total ({data['currency']})" if data.get('currency') else 'Total', data.get('total', 0), True),
+    ):
+        canvas.text(COLUMNS['rate'] - 30, label, bold=bold)
+        canvas.text(COLUMNS['amount'], _money(value), bold=bold)
+        canvas.advance()
+
+    notes = (data.get('notes') or '').strip()
+    if notes:
+        canvas.advance()
+        canvas.ensure_room(2)
+        canvas.text(MARGIN, 'Notes', bold=True)
+        canvas.advance()
+        for paragraph in notes.splitlines():
+            for line in textwrap.wrap(paragraph, 95) or ['']:
+                canvas.ensure_room()
+                canvas.text(MARGIN, line)
+                canvas.advance()
+
+
+def render_invoice_pdf(data):
+    """Render a serialized invoice (``InvoiceSerializer(...).data``) to PDF bytes"""
+    canvas = _Canvas()
+    _draw(canvas, data)
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    page_refs = []
+    for ops in canvas.pages:
+        stream = zlib.compress('\n'.join(ops).encode('cp1252'))
+        objects.append(
+            b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream"
+        )
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+            % (PAGE_WIDTH, PAGE_HEIGHT, content_ref)
+        )
+        page_refs.append(len(objects))
+    kids = b' '.join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_refs))
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
@@ -0,0 +1,173 @@
+"""
+Streaming ZIP archives of invoice PDFs.
+
+``stream_pdf_archive(invoice_ids)`` yields a ZIP file piece by piece as
+the PDFs become available, so neither the archive nor the full set of
+PDFs is ever held in memory or written to disk:
+
+- Issued invoices reuse the PDF stored with their snapshot (see
+  invoices/snapshots.py), or are rendered from the snapshot data.
+- Drafts, and issued invoices without a snapshot, are rendered from
+  their live data.
+- Rendering runs on a process pool (``INVOICE_PDF_WORKERS``), since
+  ``render_invoice_pdf`` is pure Python and CPU bound. At most two
+  renders per worker are outstanding at a time.
+
+Entries are written in the order PDFs become ready, not invoice order,
+and named after the invoice number. Numbers are only unique per company
+and are sanitized for file names, so a name already in the archive gets
+a ``_2``, ``_3``... suffix.
+The ZIP goes to a non-seekable sink, so ``zipfile`` writes each entry's
+sizes after its data and the sink can be drained after every entry.
+
+Under ASGI, Django would collect a sync iterator into a list before
+sending anything, so ``astream_pdf_archive`` wraps the same generator as
+an async iterator that advances it one entry at a time in Django's sync
+thread.
+"""
+import io
+import multiprocessing
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .emailing import chunked
+from .models import Invoice, InvoiceSnapshot
+from .pdf import render_invoice_pdf
+from .snapshots import serialize_invoice
+
+# Invoices loaded from the database per query
+CHUNK_SIZE = 200
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def render_pool():
+    """The process pool for PDF rendering, or None to render in this process"""
+    global _pool
+    if settings.INVOICE_PDF_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: workers must not inherit the parent's database connections
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.INVOICE_PDF_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def _load(invoice_ids):
+    """Split a chunk into stored PDFs and data still to render: ([(number, pdf)], [(number, data)])"""
+    stored, to_render = [], []
+    snapshots = (
+        InvoiceSnapshot.objects.filter(invoice_id__in=invoice_ids)
+        .exclude(invoice__status='draft')
+        .values_list('invoice_id', 'data', 'pdf')
+    )
+    covered = set()
+    for invoice_id, data, pdf in snapshots:
+        covered.add(invoice_id)
+        if pdf:
+            stored.append((data['invoice_number'], bytes(pdf)))
+        else:
+            to_render.append((data['invoice_number'], data))
+    live = (
+        Invoice.objects.filter(id__in=[invoice_id for invoice_id in invoice_ids if invoice_id not in covered])
+        .select_related('company', 'client')
+        .prefetch_related('items')
+    )
+    to_render += [(invoice.invoice_number, serialize_invoice(invoice)) for invoice in live]
+    return stored, to_render
+
+
+def invoice_pdfs(invoice_ids, pool=None):
+    """Yield ``(invoice_number, pdf bytes)`` for the invoices as each one is ready"""
+    pending = {}
+    window = 2 * settings.INVOICE_PDF_WORKERS
+
+    def finished():
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield pending.pop(future), future.result()
+
+    try:
+        for batch in chunked(invoice_ids, CHUNK_SIZE):
+            stored, to_render = _load(batch)
+            yield from stored
+            for number, data in to_render:
+                if pool is None:
+                    yield number, render_invoice_pdf(data)
+                    continue
+                while len(pending) >= window:
+                    yield from finished()
+                pending[pool.submit(render_invoice_pdf, data)] = number
+        while pending:
+            yield from finished()
+    finally:
+        # The client went away: don't render what nobody will receive
+        for future in pending:
+            future.cancel()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable buffer emptied by ``drain()``"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def archive_name(invoice_number, taken):
+    """A file name for the invoice's PDF that isn't in ``taken``; adds it there"""
+    stem = re.sub(r'[^A-Za-z0-9._-]+', '_', invoice_number)
+    name, copy = f'{stem}.pdf', 1
+    while name in taken:
+        copy += 1
+        name = f'{stem}_{copy}.pdf'
+    taken.add(name)
+    return name
+
+
+def stream_pdf_archive(invoice_ids):
+    """Yield the bytes of a ZIP holding one PDF per invoice"""
+    sink = _Sink()
+    names = set()
+    # PDF content streams are already deflated
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for number, pdf in invoice_pdfs(invoice_ids, render_pool()):
+            info = zipfile.ZipInfo(archive_name(number, names), date_time=time.localtime()[:6])
+            archive.writestr(info, pdf)
+            yield sink.drain()
+    yield sink.drain()
+
+
+async def astream_pdf_archive(invoice_ids):
+    """``stream_pdf_archive`` as an async iterator, for ASGI"""
+    pieces = stream_pdf_archive(invoice_ids)
+    step = sync_to_async(next)
+    try:
+        while True:
+            piece = await step(pieces, None)
+            if piece is None:
+                return
+            yield piece
+    finally:
+        await sync_to_async(pieces.close)()
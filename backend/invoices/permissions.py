@@ -0,0 +1,90 @@
+"""
+Who may act for which tenant.
+
+``TenantMember`` is the default permission of the API. Staff may use any
+company, or none to see every company's rows. A user who is a
+``Membership`` of some company acts for one of them: the one named in the
+``INVOICE_TENANT_HEADER`` header, or their only company when the header
+is left out. A user of several companies must name one, so scoping never
+silently turns off. Naming a company always takes a membership of it.
+
+Requests no membership applies to (anonymous, or a user of no company)
+and that name no company are let through unscoped, so a single-company
+deployment and the bundled frontend work without logging in. Set
+``INVOICE_TENANT_REQUIRED`` to refuse them instead, and to make staff
+name a company too.
+
+``TenantOptional`` lets members call an endpoint without naming a
+company, for the views that list or create the user's companies.
+``TenantScoped`` refuses unscoped requests from anyone but staff, for
+endpoints whose unscoped rows would reach every company. The event
+stream, a plain Django view, calls ``tenant_for`` itself.
+"""
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+from .logs import annotate
+from .models import Membership
+from .tenancy import adopt, current_tenant
+
+
+def tenant_for(user, company_id, required=True):
+    """
+    The company ``user`` acts for, given the one the request names (or
+    None): ``(company id or None, None)``, or ``(None, reason)`` when denied
+    """
+    if user.is_staff:
+        if company_id is None and required and settings.INVOICE_TENANT_REQUIRED:
+            return None, f"The {settings.INVOICE_TENANT_HEADER} header is required"
+        return company_id, None
+    if not user.is_authenticated:
+        if company_id is not None or settings.INVOICE_TENANT_REQUIRED:
+            return None, "Authentication credentials were not provided."
+        return None, None
+    memberships = Membership.objects.filter(user=user)
+    if company_id is not None:
+        if memberships.filter(company_id=company_id).exists():
+            return company_id, None
+        return None, "You are not a member of this company"
+    companies = list(memberships.values_list('company_id', flat=True)[:2])
+    if not companies:
+        if settings.INVOICE_TENANT_REQUIRED:
+            return None, "You are not a member of any company"
+        return None, None
+    if not required:
+        return None, None
+    if len(companies) != 1:
+        return None, f"Name one of your companies in the {settings.INVOICE_TENANT_HEADER} header"
+    return companies[0], None
+
+
+class TenantMember(BasePermission):
+    tenant_required = True
+
+    def has_permission(self, request, view):
+        if not request.path.startswith(settings.INVOICE_TENANT_PATH):
+            return True
+        named = current_tenant()
+        company_id, denied = tenant_for(request.user, named, self.tenant_required)
+        if denied:
+            self.message = denied
+            return False
+        if company_id != named:
+            adopt(company_id)
+            annotate(tenant=str(company_id))
+        return True
+
+
+class TenantOptional(TenantMember):
+    tenant_required = False
+
+
+class TenantScoped(TenantMember):
+
+    def has_permission(self, request, view):
+        if not super().has_permission(request, view):
+            return False
+        if current_tenant() is None and not request.user.is_staff:
+            self.message = f"Name a company in the {settings.INVOICE_TENANT_HEADER} header"
+            return False
+        return True
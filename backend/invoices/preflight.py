@@ -0,0 +1,78 @@
+"""
+Dry-run validation of invoice payloads.
+
+``validate_batch(payloads)`` applies the ``InvoiceCreateSerializer`` rules
+to many ``create-from-form`` payloads without writing anything. All
+payloads run through a single list serializer, so the field set is
+built once instead of once per payload. ``invoice_number`` uniqueness is
+checked against the other payloads and, with one ``IN`` query, against
+the database. Numbers are unique per company: the active tenant's, else
+the company named by ``company_name``, as ``create-from-form`` resolves
+it. Soft-deleted invoices still hold their numbers. Numbers that would
+be allocated server-side (omitted) are not checked.
+"""
+from collections import defaultdict
+
+from .models import Invoice
+from .serializers import InvoiceCreateSerializer
+from .tenancy import current_tenant
+
+DUPLICATE_MESSAGE = "Invoice number already exists"
+REPEATED_MESSAGE = "Invoice number is repeated in this batch (payload {index})"
+
+
+def _invoice_number(payload):
+    number = payload.get('invoice_number') if isinstance(payload, dict) else None
+    return number.strip() if isinstance(number, str) and number.strip() else None
+
+
+def _company_name(payload):
+    name = payload.get('company_name') if isinstance(payload, dict) else None
+    return name.strip() if isinstance(name, str) else None
+
+
+def _existing(keys):
+    """The ``(company, invoice_number)`` keys that are already taken"""
+    numbers = {number for _, number in keys}
+    if not numbers:
+        return set()
+    # all_objects: soft-deleted invoices keep their numbers until purged
+    company_id = current_tenant()
+    if company_id is not None:
+        taken = Invoice.all_objects.filter(
+            company_id=company_id, invoice_number__in=numbers,
+        ).values_list('invoice_number', flat=True)
+        return {(None, number) for number in taken}
+    taken = Invoice.all_objects.filter(
+        invoice_number__in=numbers, company__name__in={company for company, _ in keys},
+    ).values_list('company__name', 'invoice_number')
+    return set(taken)
+
+
+def validate_batch(payloads):
+    """Return ``{index: errors}`` for the payloads that would be rejected"""
+    serializer = InvoiceCreateSerializer(data=payloads, many=True)
+    errors = {}
+    if not serializer.is_valid():
+        errors = {index: dict(item_errors) for index, item_errors in enumerate(serializer.errors) if item_errors}
+
+    scoped = current_tenant() is not None
+    positions = defaultdict(list)
+    for index, payload in enumerate(payloads):
+        number = _invoice_number(payload)
+        if number is not None:
+            positions[(None if scoped else _company_name(payload), number)].append(index)
+    existing = _existing(list(positions))
+
+    for key, indexes in positions.items():
+        messages = {index: [] for index in indexes}
+        if key in existing:
+            for index in indexes:
+                messages[index].append(DUPLICATE_MESSAGE)
+        for index in indexes[1:]:
+            messages[index].append(REPEATED_MESSAGE.format(index=indexes[0]))
+        for index, number_errors in messages.items():
+            if number_errors:
+                payload_errors = errors.setdefault(index, {})
+                payload_errors['invoice_number'] = list(payload_errors.get('invoice_number', [])) + number_errors
+    return errors
@@ -0,0 +1,121 @@
+"""
+Per-request profiling artifacts.
+
+``ProfilingMiddleware`` (invoices.middleware) runs a flagged request under
+cProfile while ``QueryRecorder`` times every SQL statement and notes the
+line of project code that issued it. Each profiled request is written to
+its own directory under ``INVOICE_PROFILING_DIR``:
+
+- ``meta.json``: method, path, status, total and SQL time, query count
+- ``profile.pstats``: load with ``pstats.Stats`` or snakeviz
+- ``sql.log``: every statement with its duration and origin
+
+``python manage.py profile_report`` lists the slowest recent requests.
+"""
+import json
+import os
+import re
+import time
+import traceback
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+PROJECT_ROOT = str(settings.BASE_DIR)
+# Frames from the profiling code itself are never a query's origin
+_SKIP_FILES = (__file__, os.path.join(os.path.dirname(__file__), 'middleware.py'))
+
+
+_DB_LAYER = os.path.join('django', 'db', '')
+
+
+def _origin():
+    """
+    Innermost stack frame in project code. Queries issued entirely inside a
+    library (e.g. a DRF generic view) fall back to the innermost frame
+    above Django's database layer.
+    """
+    fallback = None
+    for frame in reversed(traceback.extract_stack()):
+        filename = frame.filename
+        if filename in _SKIP_FILES or _DB_LAYER in filename:
+            continue
+        location = f"{filename}:{frame.lineno} in {frame.name}"
+        if filename.startswith(PROJECT_ROOT) and 'site-packages' not in filename:
+            return f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.lineno} in {frame.name}"
+        if fallback is None and 'site-packages' in filename:
+            fallback = location.split('site-packages' + os.sep, 1)[1]
+    return fallback or '(unknown)'
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` that times statements and records their origin"""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': self.alias,
+                'sql': sql,
+                'many': many,
+                'ms': round((time.perf_counter() - started) * 1000, 3),
+                'origin': _origin(),
+            })
+
+
+def artifact_dir():
+    return Path(settings.INVOICE_PROFILING_DIR)
+
+
+def write_artifact(request, response, profiler, recorders, duration):
+    """Write one profiled request; returns the artifact id"""
+    queries = [query for recorder in recorders for query in recorder.queries]
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-')[:60] or 'root'
+    artifact_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{request.method.lower()}-{slug}-{uuid.uuid4().hex[:8]}"
+    directory = artifact_dir() / artifact_id
+    directory.mkdir(parents=True, exist_ok=True)
+
+    profiler.dump_stats(str(directory / 'profile.pstats'))
+    with open(directory / 'sql.log', 'w') as log:
+        for index, query in enumerate(queries, start=1):
+            log.write(f"-- #{index} {query['ms']:.3f} ms [{query['alias']}] {query['origin']}\n")
+            log.write(f"{query['sql']};\n\n")
+    meta = {
+        'id': artifact_id,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'sql_count': len(queries),
+        'sql_ms': round(sum(query['ms'] for query in queries), 3),
+        'slowest_sql': sorted(queries, key=lambda query: query['ms'], reverse=True)[:5],
+        'created_at': time.time(),
+    }
+    with open(directory / 'meta.json', 'w') as f:
+        json.dump(meta, f, indent=2)
+    return artifact_id
+
+
+def load_artifacts(since=None):
+    """Metadata of stored profiles, newest first"""
+    directory = artifact_dir()
+    if not directory.is_dir():
+        return []
+    artifacts = []
+    for meta_path in directory.glob('*/meta.json'):
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if since is None or meta.get('created_at', 0) >= since:
+            meta['directory'] = str(meta_path.parent)
+            artifacts.append(meta)
+    return sorted(artifacts, key=lambda meta: meta.get('created_at', 0), reverse=True)
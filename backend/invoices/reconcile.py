@@ -0,0 +1,120 @@
+"""
+Reconciling stored invoice totals with their items.
+
+``subtotal``, ``tax_amount`` and ``total`` are stored on the invoice, so
+item edits through ``QuerySet.update()`` or SQL can leave them stale.
+``reconcile_totals`` walks all invoices in primary key order, ``chunk_size``
+at a time. For each chunk the database sums the item amounts (one grouped
+query, exact ``numeric`` arithmetic) and the expected tax and total are
+recomputed with ``Decimal``:
+
+- subtotal = sum of item amounts (exact)
+- tax_amount = subtotal × tax_rate / 100, rounded half up to the cent
+- total = subtotal + tax_amount
+
+Tax and total may differ from the expected value by ``tolerance``, like
+the ``invoice_tax_amount_matches_rate`` and ``invoice_total_matches``
+constraints allow; pass 0 for an exact check. With ``repair``, the
+mismatched drafts of a chunk are corrected with one bulk update in the
+chunk's transaction, which also records ``invoice.updated`` events.
+Issued invoices are only reported: they must keep matching the document
+their snapshot records (see invoices/snapshots.py).
+"""
+from dataclasses import dataclass
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Invoice
+from .outbox import record_events
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+
+def tax_for(subtotal, tax_rate):
+    return (subtotal * tax_rate / 100).quantize(CENT, ROUND_HALF_UP)
+
+
+@dataclass
+class Mismatch:
+    invoice_id: object
+    invoice_number: str
+    status: str
+    stored: tuple
+    expected: tuple
+
+
+@dataclass
+class ChunkResult:
+    invoices: int
+    items: int
+    mismatches: list
+    last_id: object
+    repaired: int = 0
+
+
+def _check_chunk(after, chunk_size, tolerance):
+    invoices = Invoice.objects.order_by('id')
+    if after is not None:
+        invoices = invoices.filter(id__gt=after)
+    # Bound the chunk by id first, so the grouped query below only
+    # aggregates the chunk's own items
+    ids = list(invoices.values_list('id', flat=True)[:chunk_size])
+    if not ids:
+        return ChunkResult(0, 0, [], after)
+    rows = (
+        invoices.filter(id__lte=ids[-1])
+        .annotate(items_total=Sum('items__amount'), item_count=Count('items'))
+        .values_list(
+            'id', 'invoice_number', 'status', 'subtotal', 'tax_rate', 'tax_amount', 'total', 'items_total', 'item_count',
+        )
+    )
+    mismatches, items = [], 0
+    for invoice_id, number, status, subtotal, tax_rate, tax_amount, total, items_total, item_count in rows:
+        items += item_count
+        expected_subtotal = (items_total or ZERO).quantize(CENT)
+        expected_tax = tax_for(expected_subtotal, tax_rate)
+        if (
+            subtotal != expected_subtotal
+            or abs(tax_amount - expected_tax) > tolerance
+            or abs(total - (subtotal + tax_amount)) > tolerance
+        ):
+            mismatches.append(Mismatch(
+                invoice_id, number, status,
+                (subtotal, tax_amount, total),
+                (expected_subtotal, expected_tax, expected_subtotal + expected_tax),
+            ))
+    return ChunkResult(len(ids), items, mismatches, ids[-1])
+
+
+def _repair(mismatches):
+    """Correct the drafts among ``mismatches``; returns how many were repaired"""
+    expected = {mismatch.invoice_id: mismatch.expected for mismatch in mismatches if mismatch.status == 'draft'}
+    if not expected:
+        return 0
+    # Locked and filtered again, in case one was issued since it was checked
+    invoices = list(Invoice.objects.select_for_update().filter(id__in=expected, status='draft'))
+    now = timezone.now()
+    for invoice in invoices:
+        invoice.subtotal, invoice.tax_amount, invoice.total = expected[invoice.id]
+        invoice.updated_at = now
+    Invoice.objects.bulk_update(invoices, ['subtotal', 'tax_amount', 'total', 'updated_at'])
+    record_events(invoices, previous_status='draft')
+    return len(invoices)
+
+
+def reconcile_totals(chunk_size=10_000, tolerance=CENT, repair=False):
+    """Check every invoice; yields one ``ChunkResult`` per chunk"""
+    after = None
+    while True:
+        with transaction.atomic():
+            result = _check_chunk(after, chunk_size, tolerance)
+            if result.mismatches and repair:
+                result.repaired = _repair(result.mismatches)
+        if not result.invoices:
+            return
+        yield result
+        after = result.last_id
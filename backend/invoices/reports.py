@@ -0,0 +1,89 @@
+"""
+Aggregated reports.
+
+``product_report`` sums quantity and revenue per catalog product and
+period. It groups by the items' integer ``product_id`` and truncated
+``invoice_date``, read from ``item_product_date_idx``, never by the
+free-text description. Product names are fetched afterwards for the
+products in the result. Only issued invoices count by default, since
+drafts are not revenue. Deleted invoices never count.
+
+Revenue is summed per currency as well, and each sum is converted to the
+base currency once, at the rate on the first day of its period (see
+invoices/currency.py).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek, TruncYear
+
+from .currency import rate_table
+from .models import InvoiceItem, Product
+from .reconcile import CENT
+from .tenancy import current_tenant
+
+PERIODS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+    'year': TruncYear,
+}
+ISSUED_STATUSES = ('sent', 'paid', 'overdue')
+
+
+def product_report(period='month', start=None, end=None, statuses=ISSUED_STATUSES):
+    """Rows of product, period, quantity, revenue and item count, by period then revenue"""
+    items = InvoiceItem.objects.filter(
+        product__isnull=False,
+        invoice__status__in=statuses,
+        invoice__deleted_at__isnull=True,
+    )
+    company_id = current_tenant()
+    if company_id is not None:
+        items = items.filter(invoice__company_id=company_id)
+    # On the items' own date, so partitions outside the range are skipped
+    if start is not None:
+        items = items.filter(invoice_date__gte=start)
+    if end is not None:
+        items = items.filter(invoice_date__lte=end)
+    sums = (
+        items.annotate(period=PERIODS[period]('invoice_date'))
+        .values('period', 'product_id', currency=F('invoice__currency'))
+        .annotate(quantity=Sum('quantity'), revenue=Sum('amount'), items=Count('id'))
+        .order_by()
+    )
+    table = rate_table()
+    rows = {}
+    for row in sums:
+        key = (row['period'], row['product_id'])
+        if key not in rows:
+            rows[key] = {'quantity': Decimal(0), 'revenue': Decimal(0), 'items': 0, 'unconverted': defaultdict(Decimal)}
+        merged = rows[key]
+        merged['quantity'] += row['quantity']
+        merged['items'] += row['items']
+        revenue = table.convert(row['revenue'], row['currency'], row['period'])
+        if revenue is None:
+            merged['unconverted'][row['currency']] += row['revenue']
+        else:
+            merged['revenue'] += revenue
+    order = sorted(rows.items(), key=lambda entry: (entry[0][0], -entry[1]['revenue'], entry[0][1]))
+    names = dict(Product.all_objects.filter(id__in={product_id for _, product_id in rows}).values_list('id', 'name'))
+    return [
+        {
+            'product': product_id,
+            'name': names.get(product_id),
+            'period': period_start.isoformat(),
+            'quantity': str(row['quantity'].quantize(CENT)),
+            'revenue': str(row['revenue'].quantize(CENT)),
+            'currency': settings.INVOICE_BASE_CURRENCY,
+            # Revenue in currencies without exchange rates, left out of 'revenue'
+            'unconverted_revenue': {
+                currency: str(amount.quantize(CENT)) for currency, amount in sorted(row['unconverted'].items())
+            },
+            'items': row['items'],
+        }
+        for (period_start, product_id), row in order
+    ]
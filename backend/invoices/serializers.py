@@ -1,124 +1,135 @@
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
-from .models import Company, Client, Invoice, InvoiceItem
+from .bulk import create_invoice_items
+from .constraints import violation_errors
+from .models import (
+    Company, Client, Invoice, InvoiceItem, Job, Product, RecurringInvoice, RecurringInvoiceItem, WebhookEndpoint,
+)
+from .numbering import allocate_invoice_numbers, is_duplicate_invoice_number, validate_number_format
+from .outbox import EVENT_TYPES
+from .tenancy import current_tenant
+from .validation import (
+    RuleValidationMixin, at_least, at_most, custom, greater_than, max_length, non_empty, not_blank,
+)
+from .webhooks import url_error
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
-class CompanySerializer(serializers.ModelSerializer):
+# Allowed difference between submitted and recomputed totals
+TOTALS_TOLERANCE = Decimal('0.01')
+
+def _party_rules(label):
+    return {
+        'name': [max_length(200, f"{label} name cannot exceed 200 characters", f"{label} name")],
+        'city': [max_length(100, "City cannot exceed 100 characters", f"{label} city")],
+        'state': [max_length(100, "State cannot exceed 100 characters", f"{label} state")],
+        'zip_code': [max_length(20, "ZIP code cannot exceed 20 characters", f"{label} zip code")],
+        'country': [max_length(100, "Country cannot exceed 100 characters", f"{label} country")],
+        'phone': [max_length(20, "Phone number cannot exceed 20 characters", f"{label} phone")],
+    }
+
+INVOICE_NUMBER_RULES = [
+    max_length(50, "Invoice number cannot exceed 50 characters", "Invoice number"),
+    not_blank("Invoice number cannot be empty", "Empty invoice number provided"),
+]
+
+# Same check as the invoice_currency_code constraint
+CURRENCY_RULES = [
+    custom(
+        lambda value: None if re.fullmatch(r'[A-Z]{3}', value) else "Currency must be a three-letter ISO 4217 code",
+        "Invalid currency",
+    ),
+]
+
+class TenantCompanyField(serializers.PrimaryKeyRelatedField):
+    """A company id, which must be the active tenant's when there is one"""
+    
+    def get_queryset(self):
+        company_id = current_tenant()
+        return Company.objects.filter(pk=company_id) if company_id else Company.objects.all()
+
+class CompanySerializer(RuleValidationMixin, serializers.ModelSerializer):
+    rules = {
+        **_party_rules("Company"),
+        'invoice_number_format': [
+            custom(lambda value: validate_number_format(value) if value else None, "Invalid invoice number format"),
+        ],
+    }
+    
     class Meta:
         model = Company
         fields = '__all__'
+
+class ClientSerializer(RuleValidationMixin, serializers.ModelSerializer):
+    rules = _party_rules("Client")
     
-    def validate_name(self, value):
-        if len(value) > 200:
-            logger.warning(f"Company name exceeds 200 characters: {len(value)} characters")
-            raise serializers.ValidationError("Company name cannot exceed 200 characters")
-        return value
-    
-    def validate_city(self, value):
-        if len(value) > 100:
-            logger.warning(f"Company city exceeds 100 characters: {len(value)} characters")
-            raise serializers.ValidationError("City cannot exceed 100 characters")
-        return value
-    
-    def validate_state(self, value):
-        if len(value) > 100:
-            logger.warning(f"Company state exceeds 100 characters: {len(value)} characters")
-            raise serializers.ValidationError("State cannot exceed 100 characters")
-        return value
-    
-    def validate_zip_code(self, value):
-        if len(value) > 20:
-            logger.warning(f"Company zip code exceeds 20 characters: {len(value)} characters")
-            raise serializers.ValidationError("ZIP code cannot exceed 20 characters")
-        return value
-    
-    def validate_country(self, value):
-        if len(value) > 100:
-            logger.warning(f"Company country exceeds 100 characters: {len(value)} characters")
-            raise serializers.ValidationError("Country cannot exceed 100 characters")
-        return value
+    company = TenantCompanyField(required=False, allow_null=True)
     
-    def validate_phone(self, value):
-        if len(value) > 20:
-            logger.warning(f"Company phone exceeds 20 characters: {len(value)} characters")
-            raise serializers.ValidationError("Phone number cannot exceed 20 characters")
-        return value
-
-class ClientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Client
         fields = '__all__'
-    
-    def validate_name(self, value):
-        if len(value) > 200:
-            logger.warning(f"Client name exceeds 200 characters: {len(value)} characters")
-            raise serializers.ValidationError("Client name cannot exceed 200 characters")
-        return value
-    
-    def validate_city(self, value):
-        if len(value) > 100:
-            logger.warning(f"Client city exceeds 100 characters: {len(value)} characters")
-            raise serializers.ValidationError("City cannot exceed 100 characters")
-        return value
-    
-    def validate_state(self, value):
-        if len(value) > 100:
-            logger.warning(f"Client state exceeds 100 characters: {len(value)} characters")
-            raise serializers.ValidationError("State cannot exceed 100 characters")
-        return value
-    
-    def validate_zip_code(self, value):
-        if len(value) > 20:
-            logger.warning(f"Client zip code exceeds 20 characters: {len(value)} characters")
-            raise serializers.ValidationError("ZIP code cannot exceed 20 characters")
-        return value
-    
-    def validate_country(self, value):
-        if len(value) > 100:
-            logger.warning(f"Client country exceeds 100 characters: {len(value)} characters")
-            raise serializers.ValidationError("Country cannot exceed 100 characters")
-        return value
-    
-    def validate_phone(self, value):
-        if len(value) > 20:
-            logger.warning(f"Client phone exceeds 20 characters: {len(value)} characters")
-            raise serializers.ValidationError("Phone number cannot exceed 20 characters")
-        return value
 
-class InvoiceItemSerializer(serializers.ModelSerializer):
+class InvoiceItemSerializer(RuleValidationMixin, serializers.ModelSerializer):
+    rules = {
+        'description': [
+            max_length(500, "Description cannot exceed 500 characters", "Invoice item description"),
+            not_blank("Description cannot be empty", "Empty description provided for invoice item"),
+        ],
+        'quantity': [
+            greater_than(0, "Quantity must be greater than 0", "Invalid quantity provided"),
+            at_most('999999.99', "Quantity cannot exceed 999,999.99", "Quantity exceeds maximum allowed"),
+        ],
+        'rate': [
+            at_least(0, "Rate cannot be negative", "Negative rate provided"),
+            at_most('99999999.99', "Rate cannot exceed 99,999,999.99", "Rate exceeds maximum allowed"),
+        ],
+    }
+    
     class Meta:
         model = InvoiceItem
-        fields = ['id', 'description', 'quantity', 'rate', 'amount']
-    
-    def validate_description(self, value):
-        if len(value) > 500:
-            logger.warning(f"Invoice item description exceeds 500 characters: {len(value)} characters")
-            raise serializers.ValidationError("Description cannot exceed 500 characters")
-        if not value.strip():
-            logger.warning("Empty description provided for invoice item")
-            raise serializers.ValidationError("Description cannot be empty")
-        return value
+        # product is linked from the description (see invoices/catalog.py)
+        fields = ['id', 'description', 'quantity', 'rate', 'amount', 'product']
+        read_only_fields = ['product']
+
+class ProductSerializer(RuleValidationMixin, serializers.ModelSerializer):
+    rules = {
+        'name': [
+            max_length(500, "Product name cannot exceed 500 characters", "Product name"),
+            not_blank("Product name cannot be empty", "Empty product name provided"),
+        ],
+    }
     
-    def validate_quantity(self, value):
-        if value <= 0:
-            logger.warning(f"Invalid quantity provided: {value}")
-            raise serializers.ValidationError("Quantity must be greater than 0")
-        if value > 999999.99:
-            logger.warning(f"Quantity exceeds maximum allowed: {value}")
-            raise serializers.ValidationError("Quantity cannot exceed 999,999.99")
-        return value
+    # The company is the request's tenant when there is one
+    company = TenantCompanyField(required=False)
     
-    def validate_rate(self, value):
-        if value < 0:
-            logger.warning(f"Negative rate provided: {value}")
-            raise serializers.ValidationError("Rate cannot be negative")
-        if value > 99999999.99:
-            logger.warning(f"Rate exceeds maximum allowed: {value}")
-            raise serializers.ValidationError("Rate cannot exceed 99,999,999.99")
-        return value
+    class Meta:
+        model = Product
+        fields = ['id', 'company', 'name', 'key', 'created_at']
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(RuleValidationMixin, serializers.ModelSerializer):
+    rules = {
+        'invoice_number': INVOICE_NUMBER_RULES,
+        'currency': CURRENCY_RULES,
+        'subtotal': [
+            at_least(0, "Subtotal cannot be negative", "Negative subtotal provided"),
+            at_most('99999999.99', "Subtotal cannot exceed 99,999,999.99", "Subtotal exceeds maximum allowed"),
+        ],
+        'tax_rate': [
+            at_least(0, "Tax rate cannot be negative", "Negative tax rate provided"),
+            at_most(100, "Tax rate cannot exceed 100%", "Tax rate exceeds 100%%"),
+        ],
+        'total': [
+            at_least(0, "Total cannot be negative", "Negative total provided"),
+            at_most('99999999.99', "Total cannot exceed 99,999,999.99", "Total exceeds maximum allowed"),
+        ],
+    }
+    
+    company = TenantCompanyField()
     items = InvoiceItemSerializer(many=True)
     company_details = CompanySerializer(source='company', read_only=True)
     client_details = ClientSerializer(source='client', read_only=True)
@@ -128,78 +139,115 @@ class InvoiceSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'invoice_number', 'company', 'client', 'invoice_date', 
             'due_date', 'status', 'subtotal', 'tax_rate', 'tax_amount', 
-            'total', 'notes', 'items', 'company_details', 'client_details',
+            'total', 'currency', 'notes', 'items', 'company_details', 'client_details',
             'created_at', 'updated_at'
         ]
-    
-    def validate_invoice_number(self, value):
-        if len(value) > 50:
-            logger.warning(f"Invoice number exceeds 50 characters: {len(value)} characters - '{value}'")
-            raise serializers.ValidationError("Invoice number cannot exceed 50 characters")
-        if not value.strip():
-            logger.warning("Empty invoice number provided")
-            raise serializers.ValidationError("Invoice number cannot be empty")
-        
-        # Check for uniqueness if this is a new invoice or if the number changed
-        instance = getattr(self, 'instance', None)
-        if instance is None or instance.invoice_number != value:
-            if Invoice.objects.filter(invoice_number=value).exists():
-                logger.warning(f"Duplicate invoice number attempted: {value}")
-                raise serializers.ValidationError("Invoice number must be unique")
-        return value
-    
-    def validate_subtotal(self, value):
-        if value < 0:
-            logger.warning(f"Negative subtotal provided: {value}")
-            raise serializers.ValidationError("Subtotal cannot be negative")
-        if value > 99999999.99:
-            logger.warning(f"Subtotal exceeds maximum allowed: {value}")
-            raise serializers.ValidationError("Subtotal cannot exceed 99,999,999.99")
-        return value
-    
-    def validate_tax_rate(self, value):
-        if value < 0:
-            logger.warning(f"Negative tax rate provided: {value}")
-            raise serializers.ValidationError("Tax rate cannot be negative")
-        if value > 100:
-            logger.warning(f"Tax rate exceeds 100%: {value}")
-            raise serializers.ValidationError("Tax rate cannot exceed 100%")
-        return value
-    
-    def validate_total(self, value):
-        if value < 0:
-            logger.warning(f"Negative total provided: {value}")
-            raise serializers.ValidationError("Total cannot be negative")
-        if value > 99999999.99:
-            logger.warning(f"Total exceeds maximum allowed: {value}")
-            raise serializers.ValidationError("Total cannot exceed 99,999,999.99")
-        return value
+        extra_kwargs = {
+            # Uniqueness is enforced by the database at save time instead of a
+            # pre-check query; omit the number to have one allocated
+            'invoice_number': {'required': False, 'validators': []},
+        }
     
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        invoice = Invoice.objects.create(**validated_data)
         
-        for item_data in items_data:
-            InvoiceItem.objects.create(invoice=invoice, **item_data)
+        with self._checked_write(validated_data.get('invoice_number')):
+            if not validated_data.get('invoice_number'):
+                validated_data['invoice_number'] = allocate_invoice_numbers(
+                    validated_data['company'], invoice_date=validated_data['invoice_date']
+                )[0]
+            invoice = Invoice.objects.create(**validated_data)
+            create_invoice_items(invoice, items_data)
         
         return invoice
     
+    def validate(self, data):
+        if self.instance is not None and self.instance.issued:
+            self._check_issued(self.instance, data)
+        return data
+    
+    def _check_issued(self, invoice, data):
+        """
+        Only the status of an issued invoice may change, so it keeps
+        matching its snapshot (see invoices/snapshots.py). Unchanged items
+        are dropped from ``data`` so they aren't rewritten.
+        """
+        if data.get('status') == 'draft':
+            logger.warning("Attempt to return issued invoice %s to draft", invoice.invoice_number)
+            raise serializers.ValidationError({'status': ["An issued invoice cannot return to draft"]})
+        changed = [
+            field for field, value in data.items()
+            if field not in ('status', 'items') and getattr(invoice, field) != value
+        ]
+        if 'items' in data:
+            # Compared in any order: item ids (UUIDv4 with INVOICE_ID_VERSION=4)
+            # don't record the order items were added in
+            submitted = sorted(
+                (item['description'], item['quantity'], item['rate'], item['amount']) for item in data.pop('items')
+            )
+            stored = sorted(invoice.items.values_list('description', 'quantity', 'rate', 'amount'))
+            if submitted != stored:
+                changed.append('items')
+        if changed:
+            logger.warning("Attempt to edit %s of issued invoice %s", ', '.join(changed), invoice.invoice_number)
+            raise serializers.ValidationError(
+                {field: ["Issued invoices cannot be edited, only their status"] for field in changed}
+            )
+    
     def update(self, instance, validated_data):
-        items_data = validated_data.pop('items', [])
-        
-        # Update invoice fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        # None when the request leaves the items as they are
+        items_data = validated_data.pop('items', None)
         
-        # Update items
-        instance.items.all().delete()
-        for item_data in items_data:
-            InvoiceItem.objects.create(invoice=instance, **item_data)
+        with self._checked_write(validated_data.get('invoice_number')):
+            # Update invoice fields
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
+            
+            # Update items
+            if items_data is not None:
+                instance.items.all().delete()
+                create_invoice_items(instance, items_data)
         
         return instance
+    
+    @contextmanager
+    def _checked_write(self, invoice_number):
+        """
+        Run a write atomically, reporting a duplicate number or a CHECK
+        constraint violation as a validation error
+        """
+        try:
+            with transaction.atomic():
+                yield
+        except IntegrityError as e:
+            if is_duplicate_invoice_number(e):
+                logger.warning("Duplicate invoice number attempted: %s", invoice_number)
+                raise serializers.ValidationError({'invoice_number': ["Invoice number must be unique"]})
+            errors = violation_errors(e)
+            if errors is None:
+                raise
+            logger.warning("Invoice write rejected by database constraint: %s", errors)
+            raise serializers.ValidationError(errors)
 
-class InvoiceCreateSerializer(serializers.Serializer):
+class InvoiceCreateSerializer(RuleValidationMixin, serializers.Serializer):
+    # Item fields are checked by InvoiceItemSerializer; uniqueness of the
+    # invoice number is checked by the database on insert
+    rules = {
+        'invoice_number': INVOICE_NUMBER_RULES,
+        'currency': CURRENCY_RULES,
+        'company_name': [
+            max_length(200, "Company name cannot exceed 200 characters", "Company name"),
+            not_blank("Company name cannot be empty", "Empty company name provided"),
+        ],
+        'client_name': [
+            max_length(200, "Client name cannot exceed 200 characters", "Client name"),
+            not_blank("Client name cannot be empty", "Empty client name provided"),
+        ],
+        'items': [non_empty("Invoice must have at least one item", "No items provided for invoice")],
+    }
+    rule_log_level = logging.ERROR
+    
     # Company details with validation
     company_name = serializers.CharField(max_length=200)
     company_address = serializers.CharField(required=False, allow_blank=True)
@@ -220,64 +268,21 @@ class InvoiceCreateSerializer(serializers.Serializer):
     client_email = serializers.EmailField(required=False, allow_blank=True)
     client_phone = serializers.CharField(max_length=20, required=False, allow_blank=True)
     
-    # Invoice details with validation
-    invoice_number = serializers.CharField(max_length=50)
+    # Invoice details with validation; the number is allocated server-side when omitted
+    invoice_number = serializers.CharField(max_length=50, required=False)
     invoice_date = serializers.DateField()
     due_date = serializers.DateField()
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
     tax_rate = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, max_value=100)
     tax_amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
     total = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    # INVOICE_BASE_CURRENCY when omitted
+    currency = serializers.CharField(max_length=3, required=False)
     notes = serializers.CharField(required=False, allow_blank=True)
     
     # Items
     items = InvoiceItemSerializer(many=True)
     
-    def validate_invoice_number(self, value):
-        if len(value) > 50:
-            logger.error(f"Invoice number validation failed: {len(value)} characters (max 50) - '{value}'")
-            raise serializers.ValidationError("Invoice number cannot exceed 50 characters")
-        if not value.strip():
-            logger.error("Empty invoice number provided")
-            raise serializers.ValidationError("Invoice number cannot be empty")
-        if Invoice.objects.filter(invoice_number=value).exists():
-            logger.error(f"Duplicate invoice number attempted: {value}")
-            raise serializers.ValidationError("Invoice number already exists")
-        return value
-    
-    def validate_company_name(self, value):
-        if len(value) > 200:
-            logger.error(f"Company name validation failed: {len(value)} characters (max 200)")
-            raise serializers.ValidationError("Company name cannot exceed 200 characters")
-        if not value.strip():
-            logger.error("Empty company name provided")
-            raise serializers.ValidationError("Company name cannot be empty")
-        return value
-    
-    def validate_client_name(self, value):
-        if len(value) > 200:
-            logger.error(f"Client name validation failed: {len(value)} characters (max 200)")
-            raise serializers.ValidationError("Client name cannot exceed 200 characters")
-        if not value.strip():
-            logger.error("Empty client name provided")
-            raise serializers.ValidationError("Client name cannot be empty")
-        return value
-    
-    def validate_items(self, value):
-        if not value:
-            logger.error("No items provided for invoice")
-            raise serializers.ValidationError("Invoice must have at least one item")
-        
-        for idx, item in enumerate(value):
-            if len(item.get('description', '')) > 500:
-                logger.error(f"Item {idx+1} description exceeds 500 characters: {len(item.get('description', ''))}")
-                raise serializers.ValidationError(f"Item {idx+1} description cannot exceed 500 characters")
-            if not item.get('description', '').strip():
-                logger.error(f"Item {idx+1} has empty description")
-                raise serializers.ValidationError(f"Item {idx+1} description cannot be empty")
-        
-        return value
-    
     def validate(self, data):
         # Cross-field validation
         if data['invoice_date'] > data['due_date']:
@@ -290,17 +295,96 @@ class InvoiceCreateSerializer(serializers.Serializer):
         calculated_tax = (calculated_subtotal * data['tax_rate']) / 100
         calculated_total = calculated_subtotal + calculated_tax
         
-        # Allow small rounding differences (within 0.01)
-        if abs(calculated_subtotal - data['subtotal']) > 0.01:
+        # Allow small rounding differences (within one cent)
+        if abs(calculated_subtotal - data['subtotal']) > TOTALS_TOLERANCE:
             logger.error(f"Subtotal mismatch: calculated {calculated_subtotal}, provided {data['subtotal']}")
             raise serializers.ValidationError("Subtotal calculation doesn't match items")
         
-        if abs(calculated_tax - data['tax_amount']) > 0.01:
+        if abs(calculated_tax - data['tax_amount']) > TOTALS_TOLERANCE:
             logger.error(f"Tax amount mismatch: calculated {calculated_tax}, provided {data['tax_amount']}")
             raise serializers.ValidationError("Tax amount calculation doesn't match tax rate")
         
-        if abs(calculated_total - data['total']) > 0.01:
+        if abs(calculated_total - data['total']) > TOTALS_TOLERANCE:
             logger.error(f"Total mismatch: calculated {calculated_total}, provided {data['total']}")
             raise serializers.ValidationError("Total calculation doesn't match subtotal and tax")
         
-        return data
\ No newline at end of file
+        return data
+
+class RecurringInvoiceItemSerializer(RuleValidationMixin, serializers.ModelSerializer):
+    rules = InvoiceItemSerializer.rules
+    
+    class Meta:
+        model = RecurringInvoiceItem
+        fields = ['id', 'description', 'quantity', 'rate', 'position']
+        extra_kwargs = {'position': {'required': False}}
+
+class RecurringInvoiceSerializer(RuleValidationMixin, serializers.ModelSerializer):
+    rules = {
+        'tax_rate': InvoiceSerializer.rules['tax_rate'],
+        'currency': CURRENCY_RULES,
+        'items': [non_empty("Recurring invoice must have at least one item", "Recurring invoice without items")],
+    }
+    
+    company = TenantCompanyField()
+    items = RecurringInvoiceItemSerializer(many=True)
+    
+    class Meta:
+        model = RecurringInvoice
+        fields = [
+            'id', 'company', 'client', 'cadence', 'start_date', 'end_date',
+            'payment_terms_days', 'tax_rate', 'currency', 'notes', 'active', 'items',
+            'next_run_date', 'run_count', 'last_run_date', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['next_run_date', 'run_count', 'last_run_date']
+    
+    def validate(self, data):
+        if data.get('end_date') and data['end_date'] < data['start_date']:
+            raise serializers.ValidationError({'end_date': "End date cannot be before start date"})
+        return data
+    
+    def create(self, validated_data):
+        items_data = validated_data.pop('items')
+        with transaction.atomic():
+            template = RecurringInvoice.objects.create(
+                next_run_date=validated_data['start_date'], **validated_data
+            )
+            RecurringInvoiceItem.objects.bulk_create([
+                RecurringInvoiceItem(template=template, **{'position': position, **item})
+                for position, item in enumerate(items_data)
+            ])
+        return template
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'company', 'task', 'payload', 'status', 'priority', 'attempts', 'max_attempts',
+            'run_at', 'result', 'last_error', 'locked_by', 'finished_at',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+class WebhookEndpointSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = WebhookEndpoint
+        fields = ['id', 'company', 'url', 'secret', 'event_types', 'active', 'created_at']
+        # The company is the request's tenant; only the response to the
+        # request creating the endpoint shows the secret
+        read_only_fields = ['company']
+        extra_kwargs = {'secret': {'required': False, 'write_only': True}}
+    
+    def validate_url(self, value):
+        error = url_error(value)
+        if error:
+            logger.warning("Rejected webhook URL %s: %s", value, error)
+            raise serializers.ValidationError(error)
+        return value
+    
+    def validate_event_types(self, value):
+        if not isinstance(value, list):
+            raise serializers.ValidationError("Event types must be a list")
+        unknown = [event_type for event_type in value if event_type not in EVENT_TYPES]
+        if unknown:
+            logger.warning("Unknown webhook event types: %s", unknown)
+            raise serializers.ValidationError(f"Unknown event types: {', '.join(map(str, unknown))}")
+        return value
@@ -0,0 +1,107 @@
+"""
+Snapshots of issued invoices.
+
+When an invoice leaves ``draft`` its serialized representation (and, with
+``INVOICE_SNAPSHOT_PDF``, its PDF) is stored in ``InvoiceSnapshot``, once.
+Detail
+reads and PDF exports of non-draft invoices are then served from the
+snapshot without joining company, client and items or re-running
+``InvoiceSerializer``. Company and client details stay as they were when
+the invoice was issued, even if those rows are edited later.
+
+Snapshots are captured after the transaction that changed the invoice
+commits, once its items are final. Saves through the ORM are picked up by
+the ``post_save`` receiver below; code that changes status with
+``QuerySet.update()`` must call ``capture_on_commit`` itself.
+
+A snapshot is never rewritten. Only the status of an issued invoice can
+change afterwards (``InvoiceSerializer`` and the admin refuse other edits,
+and it can't return to draft), and ``reconcile_totals --repair`` leaves
+issued invoices alone. Status and ``updated_at`` are always read live.
+"""
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Invoice, InvoiceSnapshot
+from .pdf import render_invoice_pdf
+from .serializers import InvoiceSerializer
+
+def serialize_invoice(invoice):
+    """``InvoiceSerializer`` output as plain JSON values"""
+    return json.loads(json.dumps(InvoiceSerializer(invoice).data, cls=DjangoJSONEncoder))
+
+
+def capture_snapshots(invoice_ids):
+    """Snapshot the given non-draft invoices that have none yet; returns how many were written"""
+    invoices = list(
+        Invoice.objects.filter(id__in=invoice_ids, snapshot__isnull=True)
+        .exclude(status='draft')
+        .select_related('company', 'client')
+        .prefetch_related('items')
+    )
+    if not invoices:
+        return 0
+    now = timezone.now()
+    snapshots = []
+    for invoice in invoices:
+        data = serialize_invoice(invoice)
+        pdf = render_invoice_pdf(data) if settings.INVOICE_SNAPSHOT_PDF else None
+        snapshots.append(InvoiceSnapshot(invoice=invoice, data=data, pdf=pdf, captured_at=now))
+    # A concurrent capture of the same invoice keeps whichever came first
+    InvoiceSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True)
+    return len(snapshots)
+
+
+def capture_on_commit(invoice_ids):
+    invoice_ids = list(invoice_ids)
+    if invoice_ids:
+        transaction.on_commit(lambda: capture_snapshots(invoice_ids))
+
+
+def snapshot_data(invoice_id, company_id=None):
+    """
+    The stored representation of a non-draft invoice with its live status,
+    or None when it is a draft, deleted, has no snapshot yet or belongs to
+    another company than ``company_id``. One query, no PDF.
+    """
+    snapshots = InvoiceSnapshot.objects.filter(invoice_id=invoice_id, invoice__deleted_at__isnull=True)
+    if company_id is not None:
+        snapshots = snapshots.filter(invoice__company_id=company_id)
+    snapshot = (
+        snapshots
+        .exclude(invoice__status='draft')
+        .select_related('invoice')
+        .only('data', 'invoice__status', 'invoice__updated_at')
+        .first()
+    )
+    if snapshot is None:
+        return None
+    data = dict(snapshot.data)
+    data['status'] = snapshot.invoice.status
+    data['updated_at'] = serializers.DateTimeField().to_representation(snapshot.invoice.updated_at)
+    return data
+
+
+def invoice_pdf(invoice):
+    """PDF bytes for an invoice: the stored copy for issued invoices, else a fresh render"""
+    if invoice.status != 'draft':
+        pdf = InvoiceSnapshot.objects.filter(invoice_id=invoice.id).values_list('pdf', flat=True).first()
+        if pdf:
+            return bytes(pdf)
+    return render_invoice_pdf(serialize_invoice(invoice))
+
+
+@receiver(post_save, sender=Invoice, dispatch_uid='invoices.snapshots.invoice_saved')
+def invoice_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or instance.status == 'draft':
+        return
+    # Invoice.save() updates _loaded_status after post_save, so this is the stored status
+    if created or getattr(instance, '_loaded_status', 'draft') == 'draft':
+        capture_on_commit([instance.id])
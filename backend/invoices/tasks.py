@@ -0,0 +1,21 @@
+"""Background tasks run by the job queue (see invoices/jobs.py)"""
+from django.db import connection
+
+from .emailing import send_invoice_batch
+from .jobs import task
+from .partitioning import INVOICE_TABLE, ensure_future_partitions, is_partitioned
+
+
+@task('ensure_invoice_partitions')
+def ensure_invoice_partitions(ahead=None):
+    """Create upcoming invoice partitions when the tables are partitioned"""
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor, INVOICE_TABLE):
+            return {'created': []}
+    return {'created': ensure_future_partitions(ahead=ahead)}
+
+
+@task('send_invoice_emails')
+def send_invoice_emails(invoice_ids):
+    """Email one batch of invoices to their clients"""
+    return send_invoice_batch(invoice_ids)
@@ -0,0 +1,82 @@
+"""
+Tenant scoping by company.
+
+One deployment serves many companies. ``TenantMiddleware`` (invoices.middleware)
+reads the company id from the ``INVOICE_TENANT_HEADER`` request header and
+activates it for the rest of the request. ``TenantMember``
+(invoices.permissions) then checks that the user is a member of that
+company, or picks the user's only company when the header is left out.
+While a tenant is active:
+
+- ``Invoice.objects`` and ``Client.objects`` (``TenantManager``) only see
+  that company's rows, so list views, lookups and stats are scoped
+  without each view remembering to filter. The filter leads with
+  ``company_id``, which the ``(company_id, ...)`` indexes serve.
+- ``tenant_cache_key`` namespaces cached values per company, and
+  ``invalidate_tenant_cache`` bumps one company's namespace version, so
+  one tenant's writes never evict another tenant's cache entries.
+
+Without a tenant (staff requests without the header, requests no membership
+applies to, management commands, background jobs) the managers are
+unscoped. With ``INVOICE_TENANT_REQUIRED``, API requests must act for a
+tenant. Querysets built at import time (e.g. a view's class
+level ``queryset``) are not scoped: build them in ``get_queryset()``.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import models
+
+_tenant = contextvars.ContextVar('invoices_tenant', default=None)
+
+
+def current_tenant():
+    """Company id of the active tenant, or None"""
+    return _tenant.get()
+
+
+@contextmanager
+def activate(company_id):
+    token = _tenant.set(company_id)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+def adopt(company_id):
+    """Make ``company_id`` the tenant for the rest of the request; the request's ``activate()`` undoes it"""
+    _tenant.set(company_id)
+
+
+class TenantManager(models.Manager):
+    """Default manager that filters by the active tenant's ``company_id``"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        company_id = current_tenant()
+        if company_id is not None:
+            queryset = queryset.filter(company_id=company_id)
+        return queryset
+
+
+def _namespace(company_id):
+    return f"invoices:tenant:{company_id or 'all'}"
+
+
+def tenant_cache_key(name, company_id=None):
+    """Cache key for ``name`` in the (active) tenant's current namespace version"""
+    namespace = _namespace(company_id or current_tenant())
+    version = cache.get_or_set(f"{namespace}:version", 1, timeout=None)
+    return f"{namespace}:v{version}:{name}"
+
+
+def invalidate_tenant_cache(company_id):
+    """Drop cached values of one company, and of the unscoped namespace that includes it"""
+    for namespace in (_namespace(company_id), _namespace(None)):
+        try:
+            cache.incr(f"{namespace}:version")
+        except ValueError:
+            # No version yet, so nothing was cached under it
+            pass
@@ -1,3 +1,283 @@
-from django.test import TestCase
+import datetime
+import json
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+
+from . import recurring
+from .deletion import soft_delete
+from .models import Client, Company, Invoice, InvoiceItem, Membership, RecurringInvoice, RecurringInvoiceItem
+from .numbering import allocate_invoice_numbers, is_duplicate_invoice_number
+from .preflight import DUPLICATE_MESSAGE, validate_batch
+from .reconcile import reconcile_totals
+from .tenancy import activate
+
+
+def invoice_payload(invoice_number=None, company='Acme', invoice_date='2026-03-01'):
+    """A valid create-from-form payload; no invoice_number lets the server number it"""
+    payload = {
+        'company_name': company,
+        'client_name': 'Bob',
+        'invoice_date': invoice_date,
+        'due_date': invoice_date,
+        'subtotal': '10.50',
+        'tax_rate': '10.00',
+        'tax_amount': '1.05',
+        'total': '11.55',
+        'items': [{'description': 'Widget', 'quantity': '1.50', 'rate': '7.00', 'amount': '10.50'}],
+    }
+    if invoice_number is not None:
+        payload['invoice_number'] = invoice_number
+    return payload
+
+
+def make_invoice(company, client, invoice_number, invoice_date=datetime.date(2026, 3, 1), **fields):
+    return Invoice.all_objects.create(
+        company=company, client=client, invoice_number=invoice_number,
+        invoice_date=invoice_date, due_date=invoice_date, **fields,
+    )
+
+
+class ApiTestCase(TestCase):
+
+    def create(self, payload, **headers):
+        return self.client.post(
+            '/api/invoices/create-from-form/', json.dumps(payload), content_type='application/json', **headers,
+        )
+
+    def login(self, username, staff=False):
+        user = User.objects.create(username=username, is_staff=staff)
+        self.client.force_login(user)
+        return user
+
+
+class InvoiceNumberingTests(ApiTestCase):
+
+    def setUp(self):
+        self.acme = Company.objects.create(name='Acme')
+        self.client_row = Client.objects.create(name='Bob', company=self.acme)
+
+    def test_allocates_consecutive_numbers(self):
+        numbers = allocate_invoice_numbers(self.acme, 3, datetime.date(2026, 3, 1))
+        self.assertEqual(numbers, ['INV-2026-00001', 'INV-2026-00002', 'INV-2026-00003'])
+
+    def test_skips_numbers_taken_by_hand(self):
+        make_invoice(self.acme, self.client_row, 'INV-2026-00001')
+        deleted_at = datetime.datetime(2026, 3, 2, tzinfo=datetime.timezone.utc)
+        make_invoice(self.acme, self.client_row, 'INV-2026-00003', deleted_at=deleted_at)
+        numbers = allocate_invoice_numbers(self.acme, 3, datetime.date(2026, 3, 1))
+        self.assertEqual(numbers, ['INV-2026-00002', 'INV-2026-00004', 'INV-2026-00005'])
+
+    def test_manual_next_number_does_not_block_auto_numbering(self):
+        self.assertEqual(self.create(invoice_payload('INV-2026-00001')).status_code, 201)
+        numbers = []
+        for _ in range(3):
+            response = self.create(invoice_payload())
+            self.assertEqual(response.status_code, 201, response.content)
+            numbers.append(response.json()['data']['invoice_number'])
+        self.assertEqual(numbers, ['INV-2026-00002', 'INV-2026-00003', 'INV-2026-00004'])
+
+    def test_numbers_are_unique_per_company(self):
+        self.assertEqual(self.create(invoice_payload('N-1')).status_code, 201)
+        self.assertEqual(self.create(invoice_payload('N-1', company='Beta')).status_code, 201)
+        response = self.create(invoice_payload('N-1'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('invoice_number', response.json()['errors'])
+
+    def test_duplicate_detection_ignores_check_constraints(self):
+        first = make_invoice(self.acme, self.client_row, 'N-1')
+        second = make_invoice(self.acme, self.client_row, 'N-2')
+        with self.assertRaises(IntegrityError) as duplicate, transaction.atomic():
+            Invoice.all_objects.filter(pk=second.pk).update(invoice_number='N-1')
+        self.assertTrue(is_duplicate_invoice_number(duplicate.exception))
+        with self.assertRaises(IntegrityError) as blank, transaction.atomic():
+            Invoice.all_objects.filter(pk=first.pk).update(invoice_number='  ')
+        self.assertFalse(is_duplicate_invoice_number(blank.exception))
+
+
+class TenantScopingTests(ApiTestCase):
+
+    def setUp(self):
+        self.assertEqual(self.create(invoice_payload('A-1')).status_code, 201)
+        self.assertEqual(self.create(invoice_payload('B-1', company='Beta')).status_code, 201)
+        self.acme = Company.objects.get(name='Acme')
+        self.beta = Company.objects.get(name='Beta')
+
+    def invoice_numbers(self, **headers):
+        response = self.client.get('/api/invoices/', **headers)
+        self.assertEqual(response.status_code, 200)
+        return sorted(invoice['invoice_number'] for invoice in response.json())
+
+    def test_anonymous_requests_are_unscoped_without_memberships(self):
+        self.assertEqual(self.invoice_numbers(), ['A-1', 'B-1'])
+
+    def test_naming_a_company_takes_a_membership(self):
+        response = self.client.get('/api/invoices/', HTTP_X_COMPANY_ID=str(self.acme.id))
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(INVOICE_TENANT_REQUIRED=True)
+    def test_tenant_required_refuses_unscoped_requests(self):
+        self.assertEqual(self.client.get('/api/invoices/').status_code, 403)
+
+    def test_member_sees_only_their_company(self):
+        user = self.login('alice')
+        Membership.objects.create(user=user, company=self.acme)
+        self.assertEqual(self.invoice_numbers(), ['A-1'])
+        self.assertEqual(self.invoice_numbers(HTTP_X_COMPANY_ID=str(self.acme.id)), ['A-1'])
+        response = self.client.get('/api/invoices/', HTTP_X_COMPANY_ID=str(self.beta.id))
+        self.assertEqual(response.status_code, 403)
+        other = Invoice.all_objects.get(invoice_number='B-1')
+        self.assertEqual(self.client.get(f'/api/invoices/{other.id}/').status_code, 404)
+
+    def test_member_of_several_companies_must_name_one(self):
+        user = self.login('alice')
+        Membership.objects.create(user=user, company=self.acme)
+        Membership.objects.create(user=user, company=self.beta)
+        self.assertEqual(self.client.get('/api/invoices/').status_code, 403)
+        self.assertEqual(self.invoice_numbers(HTTP_X_COMPANY_ID=str(self.beta.id)), ['B-1'])
+
+    def test_staff_may_act_for_any_company(self):
+        self.login('staff', staff=True)
+        self.assertEqual(self.invoice_numbers(), ['A-1', 'B-1'])
+        self.assertEqual(self.invoice_numbers(HTTP_X_COMPANY_ID=str(self.beta.id)), ['B-1'])
+
+    def test_managers_follow_the_active_tenant(self):
+        with activate(self.acme.id):
+            self.assertEqual(list(Invoice.objects.values_list('invoice_number', flat=True)), ['A-1'])
+            self.assertEqual(Invoice.all_objects.count(), 2)
+
+
+class RecurringInvoiceTests(TestCase):
+    today = datetime.date(2026, 3, 15)
+
+    def setUp(self):
+        self.templates = []
+        for name in ('Acme', 'Beta'):
+            company = Company.objects.create(name=name)
+            client = Client.objects.create(name='Bob', company=company)
+            template = RecurringInvoice.objects.create(
+                company=company, client=client, cadence='monthly',
+                start_date=datetime.date(2026, 1, 1), next_run_date=datetime.date(2026, 1, 1),
+            )
+            RecurringInvoiceItem.objects.create(template=template, description='Hosting', quantity=1, rate=20)
+            self.templates.append(template)
+
+    def generated(self, template):
+        return Invoice.all_objects.filter(recurring=template).count()
+
+    def test_generates_missed_runs_once(self):
+        self.assertEqual(recurring.generate_due_invoices(self.today), (2, 6))
+        self.assertEqual(recurring.generate_due_invoices(self.today), (0, 0))
+        for template in self.templates:
+            template.refresh_from_db()
+            self.assertEqual(self.generated(template), 3)
+            self.assertEqual(template.next_run_date, datetime.date(2026, 4, 1))
+
+    def test_deleted_run_is_not_reissued(self):
+        recurring.generate_due_invoices(self.today)
+        template = self.templates[0]
+        soft_delete(Invoice.all_objects.filter(recurring=template, invoice_date=datetime.date(2026, 2, 1)))
+        # As if the run had never advanced
+        RecurringInvoice.objects.filter(id=template.id).update(next_run_date=datetime.date(2026, 1, 1), run_count=0)
+        recurring.generate_due_invoices(self.today)
+        self.assertEqual(self.generated(template), 3)
+
+    def test_skips_numbers_entered_by_hand(self):
+        acme = self.templates[0]
+        make_invoice(acme.company, acme.client, 'INV-2026-00001')
+        recurring.generate_due_invoices(self.today)
+        numbers = Invoice.all_objects.filter(recurring=acme).order_by('invoice_date')
+        self.assertEqual(
+            list(numbers.values_list('invoice_number', flat=True)),
+            ['INV-2026-00002', 'INV-2026-00003', 'INV-2026-00004'],
+        )
+
+    def test_failing_company_does_not_block_the_others(self):
+        acme, beta = self.templates
+        make_invoice(acme.company, acme.client, 'TAKEN')
+        allocate = recurring.allocate_invoice_numbers
+
+        def colliding(company, count, invoice_date):
+            if company.pk == acme.company_id:
+                return ['TAKEN'] * count
+            return allocate(company, count, invoice_date)
+
+        with mock.patch.object(recurring, 'allocate_invoice_numbers', colliding):
+            recurring.generate_due_invoices(self.today)
+            recurring.generate_due_invoices(self.today)
+        self.assertEqual(self.generated(acme), 0)
+        self.assertEqual(self.generated(beta), 3)
+        acme.refresh_from_db()
+        self.assertEqual(acme.next_run_date, datetime.date(2026, 1, 1))
+
+        recurring.generate_due_invoices(self.today)
+        self.assertEqual(self.generated(acme), 3)
+
+
+class PreflightTests(ApiTestCase):
+
+    def setUp(self):
+        self.assertEqual(self.create(invoice_payload('A-1')).status_code, 201)
+        self.assertEqual(self.create(invoice_payload('A-2')).status_code, 201)
+        self.acme = Company.objects.get(name='Acme')
+
+    def test_reports_existing_and_repeated_numbers(self):
+        errors = validate_batch([
+            invoice_payload('A-1'),
+            invoice_payload('A-9'),
+            invoice_payload('A-9'),
+            invoice_payload('A-1', company='Beta'),
+        ])
+        self.assertEqual(sorted(errors), [0, 2])
+        self.assertEqual(errors[0]['invoice_number'], [DUPLICATE_MESSAGE])
+        self.assertIn('repeated', errors[2]['invoice_number'][0])
+
+    def test_deleted_invoices_keep_their_numbers(self):
+        soft_delete(Invoice.objects.filter(invoice_number='A-1'))
+        with activate(self.acme.id):
+            errors = validate_batch([invoice_payload('A-1'), invoice_payload('A-3')])
+        self.assertEqual(list(errors), [0])
+
+    def test_endpoint_checks_against_the_tenant(self):
+        self.login('staff', staff=True)
+        response = self.client.post(
+            '/api/invoices/validate-batch/', json.dumps([invoice_payload('A-2'), invoice_payload('A-3')]),
+            content_type='application/json', HTTP_X_COMPANY_ID=str(self.acme.id),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['invalid'], 1)
+        self.assertEqual(Invoice.all_objects.count(), 2)
+
+
+class SoftDeleteTests(ApiTestCase):
+
+    def test_deleted_invoice_is_hidden_and_keeps_its_number(self):
+        self.assertEqual(self.create(invoice_payload('A-1')).status_code, 201)
+        invoice = Invoice.objects.get()
+        self.assertEqual(self.client.delete(f'/api/invoices/{invoice.id}/').status_code, 204)
+        self.assertEqual(Invoice.objects.count(), 0)
+        self.assertIsNotNone(Invoice.all_objects.get().deleted_at)
+        self.assertEqual(self.create(invoice_payload('A-1')).status_code, 400)
+
+
+class ReconcileTests(TestCase):
+
+    def test_repairs_drafts_and_leaves_issued_invoices(self):
+        company = Company.objects.create(name='Acme')
+        client = Client.objects.create(name='Bob', company=company)
+        totals = {'subtotal': Decimal('5.00'), 'tax_amount': Decimal('0.00'), 'total': Decimal('5.00')}
+        draft = make_invoice(company, client, 'D-1', **totals)
+        issued = make_invoice(company, client, 'S-1', status='sent', **totals)
+        for invoice in (draft, issued):
+            InvoiceItem.objects.create(invoice=invoice, description='Widget', quantity=2, rate=3, amount=6)
+
+        results = list(reconcile_totals(repair=True))
+        self.assertEqual(sum(len(result.mismatches) for result in results), 2)
+        self.assertEqual(sum(result.repaired for result in results), 1)
+        draft.refresh_from_db()
+        issued.refresh_from_db()
+        self.assertEqual(draft.total, Decimal('6.00'))
+        self.assertEqual(issued.total, Decimal('5.00'))
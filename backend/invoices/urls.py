@@ -1,11 +1,25 @@
 from django.urls import path
-from . import views
+from . import events, views
 
 urlpatterns = [
     path('companies/', views.CompanyListCreateView.as_view(), name='company-list-create'),
+    path('companies/suggest/', views.suggest_companies, name='company-suggest'),
     path('clients/', views.ClientListCreateView.as_view(), name='client-list-create'),
+    path('clients/suggest/', views.suggest_clients, name='client-suggest'),
     path('invoices/', views.InvoiceListView.as_view(), name='invoice-list'),
     path('invoices/<uuid:pk>/', views.InvoiceDetailView.as_view(), name='invoice-detail'),
     path('invoices/create-from-form/', views.create_invoice_from_form, name='create-invoice-from-form'),
+    path('invoices/validate-batch/', views.validate_invoice_batch, name='invoice-validate-batch'),
+    path('invoices/batch-get/', views.batch_get_invoices, name='invoice-batch-get'),
+    path('invoices/pdf-archive/', views.invoice_pdf_archive, name='invoice-pdf-archive'),
+    path('invoices/send/', views.send_invoices, name='invoice-send'),
+    path('products/', views.ProductListCreateView.as_view(), name='product-list-create'),
+    path('reports/products/', views.products_report, name='products-report'),
+    path('recurring-invoices/', views.RecurringInvoiceListCreateView.as_view(), name='recurring-invoice-list-create'),
     path('stats/', views.invoice_stats, name='invoice-stats'),
+    path('admission/', views.admission_stats, name='admission-stats'),
+    path('events/', events.event_stream, name='event-stream'),
+    path('webhooks/', views.WebhookEndpointListCreateView.as_view(), name='webhook-endpoint-list-create'),
+    path('jobs/', views.JobListView.as_view(), name='job-list'),
+    path('jobs/<uuid:pk>/', views.JobDetailView.as_view(), name='job-detail'),
 ]
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""
+Declarative field rules for the invoice serializers.
+
+A serializer lists its checks in a ``rules`` table instead of one
+``validate_<field>`` method per field::
+
+    rules = {
+        'name': [max_length(200, "Company name cannot exceed 200 characters", "Company name")],
+        'quantity': [greater_than(0, "Quantity must be greater than 0", "Invalid quantity provided")],
+    }
+
+The table is compiled once per serializer class into one check function
+per field. ``RuleValidationMixin.to_internal_value`` then validates a
+payload in a single pass over a field plan built once per serializer
+instance, so a ``many=True`` child serializer reuses the same plan for
+every item. Log records are only built for failing values, and formatted
+lazily by the logging framework.
+"""
+import logging
+from collections.abc import Mapping
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils.functional import cached_property
+from rest_framework.fields import SkipField, get_error_detail, set_value
+from rest_framework.serializers import ValidationError
+from rest_framework.settings import api_settings
+
+logger = logging.getLogger('invoices.serializers')
+
+
+class Rule:
+    """One check: ``test(value)`` is true when ``value`` is invalid"""
+    __slots__ = ('test', 'message', 'log', 'log_arg')
+
+    def __init__(self, test, message, log, log_arg=None):
+        self.test = test
+        self.message = message
+        self.log = log
+        self.log_arg = log_arg
+
+
+def max_length(limit, message, subject):
+    return Rule(lambda value: len(value) > limit, message,
+                f"{subject} exceeds {limit} characters: %s characters", len)
+
+
+def not_blank(message, log):
+    return Rule(lambda value: not value.strip(), message, log)
+
+
+def greater_than(limit, message, log):
+    limit = Decimal(limit)
+    return Rule(lambda value: value <= limit, message, f"{log}: %s", str)
+
+
+def at_least(limit, message, log):
+    limit = Decimal(limit)
+    return Rule(lambda value: value < limit, message, f"{log}: %s", str)
+
+
+def at_most(limit, message, log):
+    limit = Decimal(limit)
+    return Rule(lambda value: value > limit, message, f"{log}: %s", str)
+
+
+def non_empty(message, log):
+    return Rule(lambda value: not value, message, log)
+
+
+def custom(check, log):
+    """``check(value)`` returns an error message, or None when the value is valid"""
+    return Rule(check, None, f"{log}: '%s'", str)
+
+
+def compile_rules(rules, level):
+    """Turn a rules table into ``{field: check(value) -> value}``"""
+    def compile_field(field_rules):
+        field_rules = tuple(field_rules)
+
+        def check(value):
+            if value is None:
+                return value
+            for rule in field_rules:
+                failed = rule.test(value)
+                if failed:
+                    if rule.log_arg is None:
+                        logger.log(level, rule.log)
+                    else:
+                        logger.log(level, rule.log, rule.log_arg(value))
+                    # custom rules return their own message
+                    raise ValidationError(rule.message or failed)
+            return value
+        return check
+
+    return {field: compile_field(field_rules) for field, field_rules in rules.items()}
+
+
+class RuleValidationMixin:
+    """
+    Serializer mixin that validates fields against the class ``rules`` table.
+
+    Error collection matches DRF's ``Serializer.to_internal_value``: every
+    field is checked and all field errors are reported together. Fields
+    without rules still get their ``validate_<field>`` method, if any.
+    """
+    rules = {}
+    rule_log_level = logging.WARNING
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._compiled_rules = compile_rules(cls.rules, cls.rule_log_level)
+
+    @cached_property
+    def _validation_plan(self):
+        plan = []
+        for field in self._writable_fields:
+            check = self._compiled_rules.get(field.field_name)
+            if check is None:
+                check = getattr(self, 'validate_' + field.field_name, None)
+            plan.append((field, field.field_name, field.source_attrs, check))
+        return plan
+
+    def to_internal_value(self, data):
+        if not isinstance(data, Mapping):
+            message = self.error_messages['invalid'].format(datatype=type(data).__name__)
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='invalid')
+
+        ret = {}
+        errors = {}
+        for field, name, source_attrs, check in self._validation_plan:
+            try:
+                value = field.run_validation(field.get_value(data))
+                if check is not None:
+                    value = check(value)
+            except ValidationError as exc:
+                errors[name] = exc.detail
+            except DjangoValidationError as exc:
+                errors[name] = get_error_detail(exc)
+            except SkipField:
+                pass
+            else:
+                set_value(ret, source_attrs, value)
+        if errors:
+            raise ValidationError(errors)
+        return ret
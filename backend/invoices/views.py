@@ -1,84 +1,223 @@
 from django.shortcuts import render
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Collate, TruncMonth, Upper
+from django.utils.cache import patch_cache_control
+from collections import defaultdict
+import datetime
+import hashlib
 import logging
+import uuid
 
 from rest_framework import generics, status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from django.shortcuts import get_object_or_404
-from .models import Company, Client, Invoice, InvoiceItem
+from .models import Company, Client, Invoice, InvoiceItem, Job, Membership, Product, RecurringInvoice, WebhookEndpoint
 from .serializers import (
     CompanySerializer, ClientSerializer, InvoiceSerializer, 
-    InvoiceCreateSerializer
+    InvoiceCreateSerializer, JobSerializer, ProductSerializer, RecurringInvoiceSerializer, WebhookEndpointSerializer
 )
+from .admission import metrics as admission_metrics
+from .bulk import build_invoice_items
+from .catalog import link_products
+from .constraints import violation_errors
+from .currency import rates_version, to_base
+from .deletion import soft_delete
+from .numbering import allocate_invoice_numbers, is_duplicate_invoice_number
+from .emailing import chunked
+from .jobs import enqueue
+from .logs import annotate, log_enabled, log_event, timed
+from .pdf_archive import astream_pdf_archive, stream_pdf_archive
+from .permissions import TenantOptional, TenantScoped
+from .preflight import validate_batch
+from .reports import ISSUED_STATUSES, PERIODS, product_report
+from .snapshots import snapshot_data
+from .tenancy import current_tenant, tenant_cache_key
 
 logger = logging.getLogger(__name__)
 
+def member_companies(request):
+    """Companies the user may act for: all of them for staff, and while no membership applies"""
+    if request.user.is_staff:
+        return Company.objects.all()
+    if request.user.is_authenticated:
+        companies = Company.objects.filter(memberships__user=request.user)
+        if settings.INVOICE_TENANT_REQUIRED or companies.exists():
+            return companies
+    return Company.objects.all()
+
 class CompanyListCreateView(generics.ListCreateAPIView):
-    queryset = Company.objects.all()
+    # Lists the user's companies, so it works before one is picked
+    permission_classes = [TenantOptional]
     serializer_class = CompanySerializer
+    
+    def get_queryset(self):
+        return member_companies(self.request)
+    
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            company = serializer.save()
+            # A logged-in creator becomes a member, so they can act for it
+            if self.request.user.is_authenticated:
+                Membership.objects.create(user=self.request.user, company=company)
+
+# Invoice and client querysets are built per request so they are scoped
+# to the request's tenant (see invoices/tenancy.py)
 
 class ClientListCreateView(generics.ListCreateAPIView):
-    queryset = Client.objects.all()
     serializer_class = ClientSerializer
+    
+    def get_queryset(self):
+        return Client.objects.all()
+    
+    def perform_create(self, serializer):
+        if current_tenant() is not None:
+            serializer.save(company_id=current_tenant())
+        else:
+            serializer.save()
+
+class ProductListCreateView(generics.ListCreateAPIView):
+    serializer_class = ProductSerializer
+    
+    def get_queryset(self):
+        return Product.objects.all()
+    
+    def perform_create(self, serializer):
+        company_id = current_tenant() or getattr(serializer.validated_data.get('company'), 'pk', None)
+        if company_id is None:
+            raise ValidationError({'company': ["This field is required."]})
+        try:
+            with transaction.atomic():
+                serializer.save(company_id=company_id)
+        except IntegrityError:
+            # unique_company_product_key: the name normalizes to an existing product's
+            raise ValidationError({'name': ["A product with this name already exists"]})
 
 class InvoiceListView(generics.ListAPIView):
-    queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
+    
+    def get_queryset(self):
+        return Invoice.objects.all()
 
 class InvoiceDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
+    
+    def get_queryset(self):
+        return Invoice.objects.all()
+    
+    def retrieve(self, request, *args, **kwargs):
+        # Issued invoices are served from their snapshot (see invoices/snapshots.py)
+        data = snapshot_data(kwargs['pk'], company_id=current_tenant())
+        if data is not None:
+            return Response(data)
+        return super().retrieve(request, *args, **kwargs)
+    
+    def perform_destroy(self, instance):
+        # Items and snapshot stay until purge_invoices (see invoices/deletion.py)
+        soft_delete(Invoice.objects.filter(pk=instance.pk))
+
+class RecurringInvoiceListCreateView(generics.ListCreateAPIView):
+    serializer_class = RecurringInvoiceSerializer
+    
+    def get_queryset(self):
+        queryset = RecurringInvoice.objects.prefetch_related('items')
+        if current_tenant() is not None:
+            queryset = queryset.filter(company_id=current_tenant())
+        return queryset
+
+class WebhookEndpointListCreateView(generics.ListCreateAPIView):
+    # A tenant's endpoints receive its events; staff without a tenant
+    # manage endpoints receiving every company's
+    permission_classes = [TenantScoped]
+    serializer_class = WebhookEndpointSerializer
+    
+    def get_queryset(self):
+        return WebhookEndpoint.objects.all()
+    
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        endpoint = serializer.save(company_id=current_tenant())
+        # secret is write-only; the creator sees it this once
+        return Response({**serializer.data, 'secret': endpoint.secret}, status=status.HTTP_201_CREATED)
+
+class JobListView(generics.ListAPIView):
+    serializer_class = JobSerializer
+    
+    def get_queryset(self):
+        queryset = Job.objects.all()
+        for param in ('status', 'task'):
+            value = self.request.query_params.get(param)
+            if value:
+                queryset = queryset.filter(**{param: value})
+        return queryset[:100]
+
+class JobDetailView(generics.RetrieveAPIView):
+    serializer_class = JobSerializer
+    
+    def get_queryset(self):
+        return Job.objects.all()
 
 @csrf_exempt
 @api_view(['POST'])
 def create_invoice_from_form(request):
     """Create invoice from frontend form data with comprehensive validation"""
     try:
-        logger.info(f"Received invoice creation request from IP: {request.META.get('REMOTE_ADDR', 'unknown')}")
-        logger.info(f"Request data keys: {list(request.data.keys())}")
-        
-        # Log field lengths for debugging
-        if 'invoice_number' in request.data:
-            logger.info(f"Invoice number length: {len(request.data['invoice_number'])} characters")
-        if 'company_name' in request.data:
-            logger.info(f"Company name length: {len(request.data['company_name'])} characters")
-        if 'client_name' in request.data:
-            logger.info(f"Client name length: {len(request.data['client_name'])} characters")
-        
-        # Log item descriptions for validation
         items = request.data.get('items', [])
-        for idx, item in enumerate(items):
-            if 'description' in item:
-                logger.info(f"Item {idx+1} description length: {len(item['description'])} characters")
+        annotate(item_count=len(items) if isinstance(items, list) else 0)
+        # Field lengths for debugging; only measured when the event is written
+        if log_enabled('invoice.form_received', logging.DEBUG):
+            log_event(
+                'invoice.form_received', logging.DEBUG,
+                keys=list(request.data.keys()),
+                lengths={
+                    field: len(request.data[field])
+                    for field in ('invoice_number', 'company_name', 'client_name')
+                    if isinstance(request.data.get(field), str)
+                },
+                description_lengths=[
+                    len(item['description']) for item in items
+                    if isinstance(item, dict) and isinstance(item.get('description'), str)
+                ],
+            )
         
         serializer = InvoiceCreateSerializer(data=request.data)
         
-        if serializer.is_valid():
+        with timed('validation'):
+            is_valid = serializer.is_valid()
+        if is_valid:
             data = serializer.validated_data
-            logger.info(f"Validation successful for invoice: {data['invoice_number']}")
             
             # Get or create company with overflow protection
             try:
-                company, created = Company.objects.get_or_create(
-                    name=data['company_name'],
-                    defaults={
-                        'address': data.get('company_address', ''),
-                        'city': data.get('company_city', ''),
-                        'state': data.get('company_state', ''),
-                        'zip_code': data.get('company_zip_code', ''),
-                        'country': data.get('company_country', ''),
-                        'email': data.get('company_email', ''),
-                        'phone': data.get('company_phone', ''),
-                    }
-                )
-                if created:
-                    logger.info(f"Created new company: {company.name}")
+                if current_tenant() is not None:
+                    # Invoices created for a tenant always belong to it
+                    company, created = Company.objects.get(pk=current_tenant()), False
                 else:
-                    logger.info(f"Using existing company: {company.name}")
+                    company, created = Company.objects.get_or_create(
+                        name=data['company_name'],
+                        defaults={
+                            'address': data.get('company_address', ''),
+                            'city': data.get('company_city', ''),
+                            'state': data.get('company_state', ''),
+                            'zip_code': data.get('company_zip_code', ''),
+                            'country': data.get('company_country', ''),
+                            'email': data.get('company_email', ''),
+                            'phone': data.get('company_phone', ''),
+                        }
+                    )
+                annotate(company_id=company.id, company_created=created)
             except Exception as e:
-                logger.error(f"Company creation failed: {str(e)}")
+                logger.error("Company creation failed: %s", e)
                 return Response(
                     {"success": False, "message": f"Company data validation failed: {str(e)}"}, 
                     status=status.HTTP_400_BAD_REQUEST
@@ -86,7 +225,9 @@ def create_invoice_from_form(request):
             
             # Get or create client with overflow protection
             try:
+                # Clients belong to the invoicing company, so tenants never share one
                 client, created = Client.objects.get_or_create(
+                    company=company,
                     name=data['client_name'],
                     defaults={
                         'address': data.get('client_address', ''),
@@ -98,73 +239,75 @@ def create_invoice_from_form(request):
                         'phone': data.get('client_phone', ''),
                     }
                 )
-                if created:
-                    logger.info(f"Created new client: {client.name}")
-                else:
-                    logger.info(f"Using existing client: {client.name}")
+                annotate(client_id=client.id, client_created=created)
             except Exception as e:
-                logger.error(f"Client creation failed: {str(e)}")
+                logger.error("Client creation failed: %s", e)
                 return Response(
                     {"success": False, "message": f"Client data validation failed: {str(e)}"}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Create invoice with validation
+            # Create invoice and items in one transaction so a failure leaves no
+            # partial invoice and no gap in server-allocated numbers
+            stage = "Invoice"
             try:
-                invoice = Invoice.objects.create(
-                    invoice_number=data['invoice_number'],
-                    company=company,
-                    client=client,
-                    invoice_date=data['invoice_date'],
-                    due_date=data['due_date'],
-                    subtotal=data['subtotal'],
-                    tax_rate=data['tax_rate'],
-                    tax_amount=data['tax_amount'],
-                    total=data['total'],
-                    notes=data.get('notes', ''),
-                )
-                logger.info(f"Created invoice: {invoice.invoice_number} with ID: {invoice.id}")
-            except Exception as e:
-                logger.error(f"Invoice creation failed: {str(e)}")
+                with timed('db'), transaction.atomic():
+                    invoice_number = data.get('invoice_number') or allocate_invoice_numbers(
+                        company, invoice_date=data['invoice_date']
+                    )[0]
+                    invoice = Invoice.objects.create(
+                        invoice_number=invoice_number,
+                        company=company,
+                        client=client,
+                        invoice_date=data['invoice_date'],
+                        due_date=data['due_date'],
+                        subtotal=data['subtotal'],
+                        tax_rate=data['tax_rate'],
+                        tax_amount=data['tax_amount'],
+                        total=data['total'],
+                        currency=data.get('currency') or settings.INVOICE_BASE_CURRENCY,
+                        notes=data.get('notes', ''),
+                    )
+                    annotate(invoice_id=invoice.id, invoice_number=invoice.invoice_number)
+                    
+                    stage = "Invoice items"
+                    InvoiceItem.objects.bulk_create(link_products(build_invoice_items(invoice, data['items'])))
+            except IntegrityError as e:
+                if stage == "Invoice" and is_duplicate_invoice_number(e):
+                    log_event('invoice.duplicate_number', logging.WARNING, invoice_number=data.get('invoice_number'))
+                    return Response(
+                        {"success": False, "message": "Validation failed",
+                         "errors": {"invoice_number": ["Invoice number already exists"]}},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                errors = violation_errors(e)
+                if errors is not None:
+                    log_event('invoice.constraint_violation', logging.WARNING, stage=stage, errors=errors)
+                    return Response(
+                        {"success": False, "message": "Validation failed", "errors": errors},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                logger.error("%s creation failed: %s", stage, e)
                 return Response(
-                    {"success": False, "message": f"Invoice creation failed: {str(e)}"}, 
+                    {"success": False, "message": f"{stage} creation failed: {str(e)}"}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            # Create invoice items with validation
-            try:
-                created_items = []
-                for idx, item_data in enumerate(data['items']):
-                    item = InvoiceItem.objects.create(
-                        invoice=invoice,
-                        description=item_data['description'],
-                        quantity=item_data['quantity'],
-                        rate=item_data['rate'],
-                        amount=item_data['amount'],
-                    )
-                    created_items.append(item)
-                    logger.info(f"Created item {idx+1}: {item.description[:50]}...")
             except Exception as e:
-                logger.error(f"Invoice item creation failed: {str(e)}")
-                # Clean up created invoice if items fail
-                invoice.delete()
+                logger.error("%s creation failed: %s", stage, e)
                 return Response(
-                    {"success": False, "message": f"Invoice items creation failed: {str(e)}"}, 
+                    {"success": False, "message": f"{stage} creation failed: {str(e)}"}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            response_serializer = InvoiceSerializer(invoice)
-            logger.info(f"Successfully created invoice {invoice.invoice_number} with {len(created_items)} items")
+            with timed('serialize'):
+                response_data = InvoiceSerializer(invoice).data
             
             return Response(
-                {"success": True, "data": response_serializer.data}, 
+                {"success": True, "data": response_data}, 
                 status=status.HTTP_201_CREATED
             )
         
-        # Log validation errors in detail
-        logger.error(f"Validation failed for invoice creation:")
-        for field, errors in serializer.errors.items():
-            logger.error(f"  {field}: {errors}")
+        log_event('invoice.validation_failed', logging.WARNING, errors=serializer.errors)
         
         return Response(
             {"success": False, "message": "Validation failed", "errors": serializer.errors}, 
@@ -172,23 +315,299 @@ def create_invoice_from_form(request):
         )
         
     except Exception as error:
-        logger.error(f'Unexpected error in create_invoice_from_form: {error}', exc_info=True)
+        logger.error("Unexpected error in create_invoice_from_form: %s", error, exc_info=True)
         return Response(
             {"success": False, "message": f"Internal server error: {str(error)}"}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
-@api_view(['GET'])
-def invoice_stats(request):
-    """Get basic invoice statistics"""
-    total_invoices = Invoice.objects.count()
-    draft_invoices = Invoice.objects.filter(status='draft').count()
-    paid_invoices = Invoice.objects.filter(status='paid').count()
-    total_revenue = sum(invoice.total for invoice in Invoice.objects.filter(status='paid'))
+@api_view(['POST'])
+def validate_invoice_batch(request):
+    """Check many create-from-form payloads without saving anything"""
+    payloads = request.data.get('invoices') if isinstance(request.data, dict) else request.data
+    if not isinstance(payloads, list) or not payloads:
+        return Response(
+            {"success": False, "message": "Provide a non-empty list of invoices"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(payloads) > settings.INVOICE_VALIDATE_BATCH_MAX:
+        return Response(
+            {"success": False, "message": f"Cannot validate more than {settings.INVOICE_VALIDATE_BATCH_MAX} invoices at once"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    annotate(payload_count=len(payloads))
+    
+    with timed('validation'):
+        errors = validate_batch(payloads)
+    annotate(invalid_count=len(errors))
+    return Response({
+        "success": True,
+        "count": len(payloads),
+        "valid": len(payloads) - len(errors),
+        "invalid": len(errors),
+        "errors": [{"index": index, "errors": errors[index]} for index in sorted(errors)],
+    })
+
+@api_view(['POST'])
+def batch_get_invoices(request):
+    """Fetch many invoices by id and/or invoice number in one round trip"""
+    ids = request.data.get('ids', [])
+    invoice_numbers = request.data.get('invoice_numbers', [])
+    if not isinstance(ids, list) or not isinstance(invoice_numbers, list):
+        return Response(
+            {"success": False, "message": "ids and invoice_numbers must be lists"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not ids and not invoice_numbers:
+        return Response(
+            {"success": False, "message": "Provide ids or invoice_numbers"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(ids) + len(invoice_numbers) > settings.INVOICE_BATCH_GET_MAX:
+        return Response(
+            {"success": False, "message": f"Cannot fetch more than {settings.INVOICE_BATCH_GET_MAX} invoices at once"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Each id with its canonical form (the key in data), or None if invalid
+    keys = []
+    for value in ids:
+        try:
+            keys.append((value, str(uuid.UUID(str(value)))))
+        except ValueError:
+            keys.append((value, None))
+    uuids = {key for value, key in keys if key}
+    invoice_numbers = [str(number) for number in invoice_numbers]
+    
+    # One query for invoices with company and client, one for all their items
+    invoices = (
+        Invoice.objects.filter(Q(id__in=uuids) | Q(invoice_number__in=invoice_numbers))
+        .select_related('company', 'client')
+        .prefetch_related('items')
+        .order_by()
+    )
+    found = {row['id']: row for row in InvoiceSerializer(invoices, many=True).data}
+    # Numbers are unique per company, so unscoped requests may match several
+    number_to_ids = defaultdict(list)
+    for invoice_id, row in sorted(found.items()):
+        number_to_ids[row['invoice_number']].append(invoice_id)
     
     return Response({
-        'total_invoices': total_invoices,
-        'draft_invoices': draft_invoices,
-        'paid_invoices': paid_invoices,
-        'total_revenue': float(total_revenue),
+        "success": True,
+        "data": found,
+        "invoice_numbers": {number: number_to_ids[number] for number in invoice_numbers if number in number_to_ids},
+        "not_found": {
+            "ids": [value for value, key in keys if key not in found],
+            "invoice_numbers": [number for number in invoice_numbers if number not in number_to_ids],
+        },
+    })
+
+@api_view(['GET'])
+def invoice_pdf_archive(request):
+    """Stream a ZIP of the PDFs of a client's invoices and/or a date range"""
+    filters = {}
+    try:
+        if request.query_params.get('client'):
+            filters['client_id'] = uuid.UUID(request.query_params['client'])
+        if request.query_params.get('from'):
+            filters['invoice_date__gte'] = datetime.date.fromisoformat(request.query_params['from'])
+        if request.query_params.get('to'):
+            filters['invoice_date__lte'] = datetime.date.fromisoformat(request.query_params['to'])
+    except ValueError:
+        return Response(
+            {"success": False, "message": "client must be an id, from and to dates as YYYY-MM-DD"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not filters:
+        return Response(
+            {"success": False, "message": "Provide client, from and/or to"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    invoice_ids = list(
+        Invoice.objects.filter(**filters).order_by('invoice_date', 'invoice_number')
+        .values_list('id', flat=True)[:settings.INVOICE_PDF_ARCHIVE_MAX + 1]
+    )
+    if len(invoice_ids) > settings.INVOICE_PDF_ARCHIVE_MAX:
+        return Response(
+            {"success": False, "message": f"Cannot archive more than {settings.INVOICE_PDF_ARCHIVE_MAX} invoices at once"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not invoice_ids:
+        return Response(
+            {"success": False, "message": "No invoices match"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    annotate(invoice_count=len(invoice_ids))
+    
+    name = '-'.join(['invoices'] + [request.query_params[key] for key in ('from', 'to') if request.query_params.get(key)])
+    # Under ASGI a sync iterator would be buffered whole before sending
+    if isinstance(request._request, ASGIRequest):
+        archive = astream_pdf_archive(invoice_ids)
+    else:
+        archive = stream_pdf_archive(invoice_ids)
+    response = StreamingHttpResponse(archive, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{name}.zip"'
+    return response
+
+@api_view(['POST'])
+def send_invoices(request):
+    """Queue invoices to be emailed to their clients in batches"""
+    invoice_ids = request.data.get('invoice_ids')
+    if not isinstance(invoice_ids, list) or not invoice_ids:
+        return Response(
+            {"success": False, "message": "invoice_ids must be a non-empty list"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Only existing invoices the request can see: the tenant's own when
+    # there is one, and the email jobs run as the tenant too
+    uuids = {}
+    not_found = []
+    for value in invoice_ids:
+        try:
+            uuids.setdefault(uuid.UUID(str(value)), value)
+        except ValueError:
+            not_found.append(value)
+    existing = set(Invoice.objects.filter(id__in=uuids).values_list('id', flat=True))
+    not_found += [value for invoice_id, value in uuids.items() if invoice_id not in existing]
+    invoice_ids = [invoice_id for invoice_id in uuids if invoice_id in existing]
+    if not invoice_ids:
+        return Response(
+            {"success": False, "message": "No invoices match", "not_found": not_found},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    jobs = [
+        enqueue('send_invoice_emails', {'invoice_ids': [str(invoice_id) for invoice_id in batch]})
+        for batch in chunked(invoice_ids, settings.INVOICE_EMAIL_BATCH_SIZE)
+    ]
+    logger.info("Queued %d invoice(s) for email in %d job(s)", len(invoice_ids), len(jobs))
+    return Response(
+        {"success": True, "jobs": [str(job.id) for job in jobs], "not_found": not_found},
+        status=status.HTTP_202_ACCEPTED
+    )
+
+# Returned by the typeahead endpoints, enough to fill in the invoice form
+PARTY_FIELDS = ('id', 'name', 'address', 'city', 'state', 'zip_code', 'country', 'email', 'phone')
+
+def _suggest(request, queryset, kind):
+    """Up to ``limit`` rows whose name starts with ``q`` (case-insensitive), by upper-cased name"""
+    prefix = request.query_params.get('q', '').strip()
+    try:
+        limit = int(request.query_params.get('limit', settings.INVOICE_SUGGEST_LIMIT))
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= settings.INVOICE_SUGGEST_MAX_LIMIT:
+        return Response(
+            {"success": False, "message": f"limit must be between 1 and {settings.INVOICE_SUGGEST_MAX_LIMIT}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if not prefix:
+        return Response({"success": True, "data": []})
+    
+    def matches():
+        # UPPER(name) COLLATE "C" LIKE 'PREFIX%', in that order, is read
+        # straight off the *_name_prefix_idx indexes
+        name_upper = Upper('name')
+        if connection.vendor == 'postgresql':
+            name_upper = Collate(name_upper, 'C')
+        return list(
+            queryset.alias(name_upper=name_upper)
+            .filter(name_upper__startswith=prefix.upper())
+            .order_by('name_upper', 'id')
+            .values(*PARTY_FIELDS)[:limit]
+        )
+    
+    # Keystrokes repeat the same prefixes; hash them into a key any cache backend accepts
+    digest = hashlib.sha1(prefix.upper().encode()).hexdigest()
+    key = tenant_cache_key(f"suggest:{kind}:{limit}:{digest}")
+    response = Response({
+        "success": True,
+        "data": cache.get_or_set(key, matches, settings.INVOICE_SUGGEST_CACHE_TTL),
     })
+    patch_cache_control(response, private=True, max_age=settings.INVOICE_SUGGEST_CACHE_TTL)
+    return response
+
+@api_view(['GET'])
+def suggest_clients(request):
+    """Clients of the tenant whose name starts with ``q``"""
+    return _suggest(request, Client.objects.all(), 'clients')
+
+@api_view(['GET'])
+@permission_classes([TenantOptional])
+def suggest_companies(request):
+    """The user's companies whose name starts with ``q``"""
+    user = request.user
+    kind = f'companies:user-{user.pk}' if user.is_authenticated and not user.is_staff else 'companies'
+    return _suggest(request, member_companies(request), kind)
+
+@api_view(['GET'])
+def products_report(request):
+    """Quantity and revenue per catalog product and period"""
+    period = request.query_params.get('period', 'month')
+    statuses = request.query_params.get('status')
+    statuses = tuple(sorted(statuses.split(','))) if statuses else ISSUED_STATUSES
+    try:
+        start = request.query_params.get('from')
+        end = request.query_params.get('to')
+        start = datetime.date.fromisoformat(start) if start else None
+        end = datetime.date.fromisoformat(end) if end else None
+    except ValueError:
+        start = end = period = None
+    valid_statuses = {value for value, _ in Invoice.STATUS_CHOICES}
+    if period not in PERIODS or not set(statuses) <= valid_statuses:
+        return Response(
+            {"success": False, "message": (
+                f"period must be one of {', '.join(PERIODS)}, status a comma-separated list of "
+                f"{', '.join(sorted(valid_statuses))}, from and to dates as YYYY-MM-DD"
+            )},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    # Cached per tenant until its next invoice change
+    key = tenant_cache_key(f"reports:products:{period}:{start}:{end}:{','.join(statuses)}:rates-v{rates_version()}")
+    data = cache.get_or_set(
+        key, lambda: product_report(period, start, end, statuses), settings.INVOICE_REPORT_CACHE_TTL,
+    )
+    return Response({"success": True, "period": period, "data": data})
+
+@api_view(['GET'])
+def invoice_stats(request):
+    """Get basic invoice statistics"""
+    # Keyed by the rates version too, so loading new rates re-converts
+    key = tenant_cache_key(f"stats:rates-v{rates_version()}")
+    return Response(cache.get_or_set(key, _compute_stats, settings.INVOICE_STATS_CACHE_TTL))
+
+def _compute_stats():
+    # One pass over the tenant's rows, grouped by currency and month; each
+    # month's paid total is converted once (see invoices/currency.py)
+    groups = (
+        Invoice.objects.annotate(month=TruncMonth('invoice_date'))
+        .values('currency', 'month')
+        .annotate(
+            total_invoices=Count('id'),
+            draft_invoices=Count('id', filter=Q(status='draft')),
+            paid_invoices=Count('id', filter=Q(status='paid')),
+            revenue=Sum('total', filter=Q(status='paid')),
+        )
+        .order_by()
+    )
+    stats = {'total_invoices': 0, 'draft_invoices': 0, 'paid_invoices': 0}
+    revenue = []
+    for group in groups:
+        for counter in stats:
+            stats[counter] += group[counter]
+        revenue.append((group['currency'], group['month'], group['revenue']))
+    total, unconverted = to_base(revenue)
+    stats['total_revenue'] = float(total)
+    stats['currency'] = settings.INVOICE_BASE_CURRENCY
+    # Paid totals in currencies without exchange rates, left out of total_revenue
+    stats['unconverted_revenue'] = {currency: float(amount) for currency, amount in sorted(unconverted.items())}
+    return stats
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admission_stats(request):
+    """Admitted, throttled and shed write requests (staff only)"""
+    return Response(admission_metrics())
@@ -0,0 +1,102 @@
+"""
+Warming a web worker before it takes traffic.
+
+A cold worker pays on its first requests for importing the views and
+everything they pull in, resolving the URLconf, building serializer
+fields (which reads every model's ``_meta``) and connecting to the
+database. Workers are started and stopped often by the autoscaler, so
+this shows up as latency right after every scale-out.
+
+- ``preload()`` does the import-time work once. ``invoice_backend.wsgi``
+  and ``invoice_backend.asgi`` call it when ``INVOICE_PRELOAD`` is on;
+  with gunicorn's ``preload_app`` (gunicorn.conf.py) that is in the
+  master, before workers fork, so every worker starts with it done and
+  shares the memory copy-on-write.
+- ``warm_connections()`` opens the worker's database connections. It must
+  run after the fork (gunicorn's ``post_worker_init``), since a
+  connection can't be shared between processes.
+"""
+import gc
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.urls import get_resolver
+from django.utils.translation import trans_real
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from .logs import log_event
+
+logger = logging.getLogger(__name__)
+
+
+def serializer_classes():
+    """The serializers of the invoices app"""
+    from . import serializers
+
+    return [
+        value for value in vars(serializers).values()
+        if isinstance(value, type) and issubclass(value, BaseSerializer) and value.__module__ == serializers.__name__
+    ]
+
+
+def _build_fields(serializer):
+    # Nested serializers build their own fields lazily; walk into them too
+    for field in serializer.fields.values():
+        if isinstance(field, ListSerializer):
+            field = field.child
+        if isinstance(field, BaseSerializer):
+            _build_fields(field)
+
+
+def preload():
+    """Import and build what the first requests would; returns timings in ms per step"""
+    timings = {}
+
+    def step(name, started):
+        timings[name] = round((time.perf_counter() - started) * 1000, 3)
+        return time.perf_counter()
+
+    started = time.perf_counter()
+    # Imports every view module (and the serializers, models and helpers
+    # they use) and compiles the URL patterns
+    get_resolver().reverse_dict
+    started = step('urls', started)
+    for serializer_class in serializer_classes():
+        try:
+            _build_fields(serializer_class())
+        except Exception:
+            # A serializer that needs arguments still got its module imported
+            logger.debug("Could not build fields of %s", serializer_class.__name__, exc_info=True)
+    started = step('serializers', started)
+    # Loads the translation catalog behind DRF's validation messages
+    if settings.USE_I18N:
+        trans_real.translation(settings.LANGUAGE_CODE)
+    step('translations', started)
+
+    # Nothing above should have connected, but never hand a connection to forked workers
+    connections.close_all()
+    # Keep the garbage collector from touching (and so copying) the
+    # preloaded objects in every worker
+    gc.freeze()
+    log_event('worker.preloaded', timings=timings)
+    return timings
+
+
+def warm_connections():
+    """Connect to every configured database; returns the time taken in ms per alias
+
+    Only useful with persistent connections (``CONN_MAX_AGE`` > 0), and only
+    the calling thread's connection is warmed: with gunicorn's sync workers
+    that is the thread serving requests, with threaded or async workers each
+    thread still connects on its first request.
+    """
+    timings = {}
+    for alias in connections:
+        started = time.perf_counter()
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT 1")
+        timings[alias] = round((time.perf_counter() - started) * 1000, 3)
+    log_event('worker.connections_warmed', timings=timings)
+    return timings
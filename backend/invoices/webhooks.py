@@ -0,0 +1,261 @@
+"""
+Webhook delivery of outbox events.
+
+The dispatcher runs in two steps:
+
+1. ``fan_out`` turns new ``OutboxEvent`` rows into one ``WebhookDelivery``
+   per subscribed endpoint. An endpoint of a company only gets that
+   company's events; one without a company (staff only) gets them all.
+2. ``deliver_due`` POSTs due deliveries to each endpoint in batches of up
+   to ``WEBHOOK_BATCH_SIZE`` events, oldest first.
+
+Requests carry ``X-Invoice-Signature: t=<unix time>,v1=<hex>``, where the
+hex digest is HMAC-SHA256 over ``"<t>.<body>"`` keyed with the endpoint
+secret. Failed batches are retried with exponential backoff until
+``WEBHOOK_MAX_ATTEMPTS`` is reached.
+
+Endpoint URLs must resolve to public addresses (``resolve``), checked
+when an endpoint is registered and again before every request, so
+invoice data is never posted to hosts inside the network. A request
+connects to the address that was checked, sending the host name in the
+Host header and for TLS (SNI and certificate), so the name can't resolve
+elsewhere in between. Redirects are not followed: a 30x is a failed
+delivery.
+"""
+import datetime
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import json
+import logging
+import socket
+import ssl
+import time
+import urllib.parse
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent, WebhookDelivery, WebhookEndpoint
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = 'X-Invoice-Signature'
+
+
+def sign(secret, timestamp, body):
+    message = f"{timestamp}.".encode() + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def signature_header(secret, body, timestamp=None):
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    return f"t={timestamp},v1={sign(secret, timestamp, body)}"
+
+
+def verify_signature(secret, header, body, tolerance=300):
+    """Check a signature header as a receiver would"""
+    try:
+        parts = dict(part.split('=', 1) for part in header.split(','))
+        timestamp = int(parts['t'])
+    except (KeyError, ValueError):
+        return False
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(parts.get('v1', ''), sign(secret, timestamp, body))
+
+
+def resolve(url):
+    """``(address to connect to, None)`` for ``url``, or ``(None, why it can't receive webhooks)``"""
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return None, "URL must be http or https with a host"
+    if settings.WEBHOOK_ALLOW_PRIVATE_URLS:
+        return parsed.hostname, None
+    try:
+        infos = socket.getaddrinfo(parsed.hostname, parsed.port or None, type=socket.SOCK_STREAM)
+        addresses = [info[4][0] for info in infos]
+    except (socket.gaierror, UnicodeError, ValueError):
+        return None, f"Could not resolve {parsed.hostname}"
+    for address in addresses:
+        # Drop an IPv6 zone id (fe80::1%eth0)
+        if not ipaddress.ip_address(address.split('%', 1)[0]).is_global:
+            return None, f"{parsed.hostname} resolves to a non-public address"
+    return addresses[0], None
+
+
+def url_error(url):
+    """Why ``url`` can't receive webhooks, or None"""
+    return resolve(url)[1]
+
+
+class PinnedHTTPConnection(http.client.HTTPConnection):
+    """Connects to ``address`` while ``host`` goes in the Host header"""
+
+    def __init__(self, host, address, **kwargs):
+        super().__init__(host, **kwargs)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+
+
+class PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """Connects to ``address``; TLS still verifies the certificate for ``host``"""
+
+    def __init__(self, host, address, **kwargs):
+        self.ssl_context = ssl.create_default_context()
+        super().__init__(host, context=self.ssl_context, **kwargs)
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock = self.ssl_context.wrap_socket(sock, server_hostname=self.host)
+
+
+def retry_delay(attempts):
+    delay = settings.WEBHOOK_RETRY_BACKOFF * 2 ** max(attempts - 1, 0)
+    return datetime.timedelta(seconds=min(delay, settings.WEBHOOK_RETRY_MAX_DELAY))
+
+
+def fan_out(limit=1000):
+    """Create deliveries for undispatched events; returns the number of events handled"""
+    endpoints = list(WebhookEndpoint.all_objects.filter(active=True))
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(dispatched_at__isnull=True)
+            .order_by('id')[:limit]
+        )
+        if not events:
+            return 0
+        WebhookDelivery.objects.bulk_create([
+            WebhookDelivery(endpoint=endpoint, event=event)
+            for event in events
+            for endpoint in endpoints
+            # A company's endpoints only get its own events
+            if endpoint.company_id in (None, event.company_id)
+            and (not endpoint.event_types or event.event_type in endpoint.event_types)
+        ])
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(dispatched_at=timezone.now())
+    return len(events)
+
+
+def _claim_batch(endpoint):
+    """
+    Lease the endpoint's oldest pending deliveries so concurrent dispatchers
+    skip them. Events go out in order: nothing is sent while an older event
+    for the same endpoint is waiting for its retry (or is in flight).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        pending = (
+            WebhookDelivery.objects.select_for_update(skip_locked=True)
+            .filter(endpoint=endpoint, status='pending')
+            .select_related('event')
+            .order_by('event_id')[:settings.WEBHOOK_BATCH_SIZE]
+        )
+        batch = []
+        for delivery in pending:
+            if delivery.next_attempt_at > now:
+                break
+            batch.append(delivery)
+        lease = now + datetime.timedelta(seconds=settings.WEBHOOK_TIMEOUT * 2)
+        WebhookDelivery.objects.filter(id__in=[delivery.id for delivery in batch]).update(next_attempt_at=lease)
+    return batch
+
+
+def post_batch(endpoint, deliveries):
+    """POST one batch; returns ``(status code or None, error, latency in ms)``"""
+    # Checked again here, as the host may resolve elsewhere by now
+    address, error = resolve(endpoint.url)
+    if error:
+        return None, error, 0
+    body = json.dumps({
+        'events': [
+            {
+                'id': delivery.event.id,
+                'type': delivery.event.event_type,
+                'created_at': delivery.event.created_at.isoformat(),
+                'data': delivery.event.payload,
+            }
+            for delivery in deliveries
+        ],
+    }, separators=(',', ':')).encode()
+    url = urllib.parse.urlsplit(endpoint.url)
+    connection_class = PinnedHTTPSConnection if url.scheme == 'https' else PinnedHTTPConnection
+    connection = connection_class(url.hostname, address, port=url.port, timeout=settings.WEBHOOK_TIMEOUT)
+    started = time.monotonic()
+    try:
+        path = urllib.parse.urlunsplit(('', '', url.path or '/', url.query, ''))
+        connection.request('POST', path, body=body, headers={
+            'Content-Type': 'application/json',
+            'User-Agent': 'invoice-generator-webhooks',
+            SIGNATURE_HEADER: signature_header(endpoint.secret, body),
+        })
+        response = connection.getresponse()
+        status_code, error = response.status, ''
+        if not 200 <= status_code < 300:
+            error = f"HTTP {status_code}: {response.reason}"
+    except Exception as e:
+        status_code, error = None, str(e)
+    finally:
+        connection.close()
+    return status_code, error, int((time.monotonic() - started) * 1000)
+
+
+def deliver_batch(endpoint, deliveries):
+    status_code, error, latency_ms = post_batch(endpoint, deliveries)
+    now = timezone.now()
+    delivered = status_code is not None and 200 <= status_code < 300
+    for delivery in deliveries:
+        delivery.attempts += 1
+        delivery.response_status = status_code
+        delivery.latency_ms = latency_ms
+        if delivered:
+            delivery.status = 'delivered'
+            delivery.delivered_at = now
+            delivery.last_error = ''
+        elif delivery.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            delivery.status = 'failed'
+            delivery.last_error = error
+        else:
+            delivery.next_attempt_at = now + retry_delay(delivery.attempts)
+            delivery.last_error = error
+    WebhookDelivery.objects.bulk_update(deliveries, [
+        'status', 'attempts', 'next_attempt_at', 'last_error', 'response_status',
+        'latency_ms', 'delivered_at',
+    ])
+    if delivered:
+        logger.info("Delivered %d event(s) to %s in %dms", len(deliveries), endpoint.url, latency_ms)
+    else:
+        logger.warning("Delivery of %d event(s) to %s failed: %s", len(deliveries), endpoint.url, error)
+    return delivered
+
+
+def deliver_due():
+    """Send one batch to every endpoint with due deliveries; returns events sent"""
+    sent = 0
+    endpoint_ids = (
+        WebhookDelivery.objects.filter(status='pending', next_attempt_at__lte=timezone.now())
+        .values_list('endpoint_id', flat=True).distinct()
+    )
+    for endpoint in WebhookEndpoint.all_objects.filter(id__in=list(endpoint_ids)):
+        batch = _claim_batch(endpoint)
+        if batch and deliver_batch(endpoint, batch):
+            sent += len(batch)
+    return sent
+
+
+def dispatch():
+    """Fan out and deliver until nothing is due; returns (events fanned out, events delivered)"""
+    fanned = delivered = 0
+    while True:
+        new_events = fan_out()
+        sent = deliver_due()
+        fanned += new_events
+        delivered += sent
+        if not new_events and not sent:
+            return fanned, delivered
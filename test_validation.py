@@ -6,10 +6,14 @@ Tests field length constraints and validation on both frontend and backend
 
 import requests
 import json
+import os
 import time
 from datetime import datetime, timedelta
 
 BASE_URL = "http://localhost:8000/api"
+# Anonymous by default; with INVOICE_TENANT_REQUIRED, set these to a staff
+# user, since the tests create invoices for several companies
+AUTH = (os.environ['API_USERNAME'], os.environ.get('API_PASSWORD', '')) if os.environ.get('API_USERNAME') else None
 
 def test_invoice_creation_with_constraints():
     """Test invoice creation with various field length constraints"""
@@ -325,7 +329,7 @@ def send_request(data):
         }
         
         print(f"   Sending request to: {url}")
-        response = requests.post(url, json=data, headers=headers, timeout=30)
+        response = requests.post(url, json=data, headers=headers, auth=AUTH, timeout=30)
         
         print(f"   Response status: {response.status_code}")
         